@@ -1,9 +1,18 @@
-from bluemarz.core.models import AssignmentSpec, AgentSpec, SessionSpec, ToolSpec, SessionMessage, SessionFile, MessageRole, RunResultType, RunResult, ToolCall, ToolCallResult
+from bluemarz.core.models import AssignmentSpec, AgentSpec, SessionSpec, ToolSpec, SessionMessage, SessionFile, MessageRole, RunResultType, RunResult, ToolCall, ToolCallResult, PartialAssignmentRunResult, PartialResultReason, RaceAssignmentRunResult, AsyncToolMode, ContextBudget, ContextReport, TokenUsage, AssignmentProfile, ProfileEntry, ProfileEntryType
 from bluemarz.core.interfaces import Agent, Session, ToolDefinition, SyncTool, AsyncTool, AssignmentExecutor, SyncToolExecutor
 from bluemarz.core.assignments import Assignment, AssignmentRunResult
+from bluemarz.core.templates import AssignmentTemplate, get_assignment_template
+from bluemarz.core.snapshot import AssignmentSnapshot, set_snapshot_secret
+from bluemarz.core.scheduler import AssignmentScheduler, AssignmentHandle, Priority
+from bluemarz.core.race import RaceAssignment
+from bluemarz.core.tool_runtime import AsyncToolRuntime, ToolJobQueue
+from bluemarz.core.usage import UsageAggregator, set_usage_aggregator, get_usage_aggregator
 from bluemarz.core.class_registry import ai_agent, ai_session, assignment_executor, sync_tool_executor
-from bluemarz.core.spec_registry import get_assignment_by_id, save_assignment, set_assignment_registry, InMemmoryRegistry, StaticInMemmoryRegistry, SpecRegistry
+from bluemarz.core.spec_registry import get_assignment_by_id, get_assignments_by_ids, save_assignment, save_assignments, aget_assignment_by_id, aget_assignments_by_ids, asave_assignment, set_assignment_registry, InMemmoryRegistry, StaticInMemmoryRegistry, SqliteSpecRegistry, SpecRegistry, AsyncSpecRegistry, AsyncSpecRegistryAdapter
+from bluemarz.core.registry_loader import ReloadableRegistry, UrlRegistryLoader
 from bluemarz.core.middleware import api_key_middleware
+from bluemarz.utils.tracing import Span, SpanExporter, NoOpSpanExporter, InMemorySpanExporter, OtlpSpanExporter, OtlpHttpSpanExporter, set_span_exporter, get_span_exporter
+from bluemarz.utils.metrics import MetricsRegistry, Counter, Gauge, Histogram, get_metrics_registry, generate_latest
 
 import bluemarz.core.models as models
 
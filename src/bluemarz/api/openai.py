@@ -1,4 +1,10 @@
 from bluemarz.lib.openai.components import OpenAiAssistant, OpenAiAssistantNativeSession, OpenAiAssistantTool, OpenAiAssistantAndThreadExecutor
+from bluemarz.lib.openai.message_store import MessageStore, InMemoryMessageStore, SqliteMessageStore, set_message_store
+from bluemarz.lib.openai.session_pool import SessionPool, set_session_pool
+from bluemarz.lib.openai.session_writer import SessionWriter, RunAwaitingToolOutputs
+from bluemarz.lib.openai.chat import OpenAiChatAgent, OpenAiChatSession, OpenAiChatExecutor, ChatSessionStore, InMemoryChatSessionStore, SqliteChatSessionStore, set_chat_session_store
+from bluemarz.lib.openai.batch import BatchAssignmentRunner, BatchJob, BatchResult
+from bluemarz.lib.openai.client import set_base_url
 
 from bluemarz.lib.openai.components import init as _init
 
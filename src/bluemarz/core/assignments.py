@@ -1,7 +1,14 @@
 import asyncio
+from datetime import datetime, timezone
+import time
 from typing import Any
 
 from bluemarz.core import class_registry
+from bluemarz.core.exceptions import InvalidDefinition
+from bluemarz.core.snapshot import AssignmentSnapshot, parameters_digest
+from bluemarz.core.templates import AssignmentTemplate, get_assignment_template
+from bluemarz.core.usage import get_usage_aggregator
+from bluemarz.utils import metrics, tracing
 from bluemarz.core.interfaces import (
     Agent,
     AssignmentExecutor,
@@ -13,11 +20,18 @@ from bluemarz.core.interfaces import (
 from bluemarz.core.models import (
     AddFileResult,
     AddMessageResult,
+    AssignmentProfile,
     AssignmentRunResult,
+    AsyncToolMode,
+    PartialAssignmentRunResult,
+    PartialResultReason,
+    ProfileEntry,
+    ProfileEntryType,
     RunResult,
     RunResultType,
     SessionMessage,
     SessionFile,
+    TokenUsage,
     ToolCall,
     ToolCallResult,
     ToolSpec,
@@ -33,6 +47,24 @@ logging.basicConfig(
     format="[%(levelname) 5s/%(asctime)s] %(name)s: %(message)s", level=logging.INFO
 )
 
+_assignments_in_flight = metrics.get_metrics_registry().gauge(
+    "bluemarz_assignments_in_flight", "Assignments running until a breakpoint"
+)
+_assignments = metrics.get_metrics_registry().counter(
+    "bluemarz_assignments_total",
+    "Assignments run until a breakpoint, by how they stopped",
+    ["result"],
+)
+_assignment_build = metrics.get_metrics_registry().histogram(
+    "bluemarz_assignment_build_seconds", "Time to build an assignment"
+)
+_tool_call_duration = metrics.get_metrics_registry().histogram(
+    "bluemarz_tool_call_duration_seconds", "Duration of sync tool calls", ["tool"]
+)
+_tool_call_errors = metrics.get_metrics_registry().counter(
+    "bluemarz_tool_call_errors_total", "Sync tool calls that raised", ["tool"]
+)
+
 
 class Assignment:
     agent: Agent
@@ -42,6 +74,16 @@ class Assignment:
     run_id: str | None
     last_result: RunResult | None
     params: dict[str, Any]
+    build_timings: dict[str, float]
+    async_tool_mode: AsyncToolMode
+    template_id: str | None
+    pending_tool_call_ids: list[str]
+    tenant: str | None
+    max_total_tokens: int | None
+    usage_by_run: dict[str, TokenUsage]
+    profiling: bool
+    profile: AssignmentProfile | None
+    _cancelled_run_ids: set[str]
 
     def __init__(
         self, agent: Agent, session: Session, run_id: str | None = None, **kwargs
@@ -51,7 +93,25 @@ class Assignment:
         self.run_id = run_id
         self.executor = class_registry.get_executor(agent, session)
         self.last_tools_submitted = []
+        self.last_result = None
         self.params = kwargs
+        self.async_tool_mode = AsyncToolMode.CANCEL
+        self.template_id = None
+        self.pending_tool_call_ids = []
+        self.tenant = None
+        self.max_total_tokens = None
+        self.usage_by_run = {}
+        self.profiling = False
+        self.profile = None
+        self.build_timings = {}
+        self._cancelled_run_ids = set()
+
+    @property
+    def usage(self) -> TokenUsage | None:
+        """Tokens spent by the runs of this assignment, summed across tool rounds."""
+        if not self.usage_by_run:
+            return None
+        return sum(self.usage_by_run.values(), TokenUsage())
 
     async def _validate_assignment(self) -> None:
         await self.executor.validate_assignment(
@@ -64,6 +124,9 @@ class Assignment:
     async def add_file(self, file: SessionFile) -> AddFileResult:
         return await self.session.add_file(file)
 
+    async def add_files(self, files: list[SessionFile]) -> list[AddFileResult]:
+        return await self.session.add_files(files)
+
     def add_tools(self, tools: list[ToolImplementation]) -> None:
         self.agent.add_tools(tools)
 
@@ -76,26 +139,93 @@ class Assignment:
 
     async def run_once(self) -> RunResult:
         self.last_tools_submitted = []
-        result = await self.executor.execute(
-            self.agent, self.session, self.run_id, **self.params
-        )
+        started_at, start = datetime.now(timezone.utc), time.perf_counter()
+        with tracing.span(
+            "assignment.run_once",
+            **{"agent.id": self.agent.spec.id, "run.id": self.run_id},
+        ) as span:
+            result = await self.executor.execute(
+                self.agent,
+                self.session,
+                self.run_id,
+                run_started=self._run_started,
+                **self.params,
+            )
+            span.set_attribute("run.id", result.run_id)
+            span.set_attribute("run.result_type", result.result_type.value)
+        if self.profile is not None:
+            self.profile.add(
+                ProfileEntry(
+                    entry_type=ProfileEntryType.RUN_WAIT,
+                    run_id=result.run_id,
+                    started_at=started_at,
+                    duration=time.perf_counter() - start,
+                    status=result.result_type.value,
+                )
+            )
         self.last_result = result
         self.run_id = result.run_id
 
+        if (
+            result.usage is None
+            and result.result_type == RunResultType.TOOL_CALL
+            and _has_budget(self)
+        ):
+            result.usage = await self.executor.get_run_usage(
+                self.agent, self.session, result.run_id, **self.params
+            )
+        if result.usage is not None:
+            self._record_usage(result)
+
         return result
 
+    def _record_usage(self, result: RunResult) -> None:
+        # the usage of a run grows across its tool rounds, only the increase is new
+        previous = self.usage_by_run.get(result.run_id)
+        self.usage_by_run[result.run_id] = result.usage
+        aggregator = get_usage_aggregator()
+        if aggregator is not None:
+            aggregator.record(
+                self.agent.spec.id, result.model, self.tenant, result.usage - previous
+            )
+
     async def submit_tool_calls(self, tool_call_results: list[ToolCallResult]) -> None:
         self.last_tools_submitted.extend(
             [tcr.tool_call.tool for tcr in tool_call_results]
         )
-        await self.executor.submit_tool_calls(
-            self.agent, self.session, self.run_id, tool_call_results, **self.params
-        )
+        started_at, start = datetime.now(timezone.utc), time.perf_counter()
+        with tracing.span(
+            "assignment.submit_tool_calls",
+            **{"run.id": self.run_id, "tool_calls": len(tool_call_results)},
+        ):
+            await self.executor.submit_tool_calls(
+                self.agent, self.session, self.run_id, tool_call_results, **self.params
+            )
+        if self.profile is not None:
+            self.profile.add(
+                ProfileEntry(
+                    entry_type=ProfileEntryType.SUBMIT,
+                    run_id=self.run_id,
+                    started_at=started_at,
+                    duration=time.perf_counter() - start,
+                )
+            )
+        submitted = {tcr.tool_call.id for tcr in tool_call_results}
+        self.pending_tool_call_ids = [
+            id for id in self.pending_tool_call_ids if id not in submitted
+        ]
 
     async def _prepare_for_async_tool_calls(self) -> None:
         await self.executor.prepare_for_async_tool_calls(
             self.agent, self.session, self.run_id, **self.params
         )
+        # the run was closed, tool results will be answered by a new run
+        self.run_id = None
+
+    async def _defer_tool_calls(self) -> None:
+        await self.executor.defer_tool_calls(
+            self.agent, self.session, self.run_id, **self.params
+        )
 
     async def add_tool_call_results(
         self, tool_call_results: list[ToolCallResult]
@@ -106,79 +236,281 @@ class Assignment:
 
     "TODO: create test"
 
-    async def run_until_breakpoint(self) -> AssignmentRunResult:
-        self.last_tools_submitted = []
-        return await _run_assignment_until_breakpoint(self)
+    async def run_until_breakpoint(
+        self, deadline: float | None = None, max_tool_rounds: int | None = None
+    ) -> AssignmentRunResult:
+        """Runs the agent, executing sync tool calls, until a breakpoint.
 
-    "TODO: create test"
+        `deadline` is an absolute time in the clock of `loop.time()`, which is
+        `time.monotonic()` for the default loop. When it is reached, or after
+        `max_tool_rounds` rounds of sync tool calls, the upstream run is
+        cancelled and a PartialAssignmentRunResult is returned. Cancelling the
+        calling task also cancels the upstream run.
 
-    @classmethod
-    async def from_spec(cls, spec: AssignmentSpec) -> "Assignment":
-        return await _create_assignment_from_spec(spec)
+        With `profiling` set, the result carries the timeline of the runs.
+        """
+        self.last_tools_submitted = []
+        if not self.profiling:
+            return await _run_assignment_until_breakpoint(
+                self, deadline, max_tool_rounds
+            )
+
+        self.profile = AssignmentProfile()
+        result = await _run_assignment_until_breakpoint(
+            self, deadline, max_tool_rounds
+        )
+        await _add_run_profiles(self)
+        result.profile = self.profile
+        return result
 
+    def _run_started(self, run_id: str) -> None:
+        # known before the run ends, so deadlines and cancellation can stop it
+        self.run_id = run_id
 
-async def _create_assignment_from_spec(spec: AssignmentSpec) -> Assignment:
-    agent = await _get_agent(spec)
-    session = await _get_session(spec)
+    async def cancel(self) -> None:
+        """Cancels the current run of the assignment, if any, at most once."""
+        run_id, self.run_id = self.run_id, None
+        if run_id and run_id not in self._cancelled_run_ids:
+            self._cancelled_run_ids.add(run_id)
+            await self.executor.cancel_run(
+                self.agent, self.session, run_id, **self.params
+            )
+
+    def snapshot(self) -> str:
+        """Returns a signed token from which `resume` continues this assignment.
+
+        The token holds ids only: the agent and session specs are rebuilt from
+        the template, which must be the registry template the assignment was
+        built from or be passed to `resume`.
+        """
+        return AssignmentSnapshot(
+            agent_id=self.agent.spec.id,
+            session_id=self.session.spec.id,
+            template_id=self.template_id,
+            run_id=self.run_id,
+            pending_tool_call_ids=self.pending_tool_call_ids,
+            last_tools_submitted=[t.name for t in self.last_tools_submitted],
+            parameters_digest=parameters_digest(self.params),
+        ).encode()
 
-    if spec.query:
-        await session.add_message(
-            SessionMessage(role=MessageRole.USER, text=spec.query)
-        )
-    elif await session.is_empty and agent.spec.default_query:
-        await session.add_message(
-            SessionMessage(role=MessageRole.USER, text=agent.spec.default_query)
+    @classmethod
+    async def resume(
+        cls,
+        token: str,
+        template: AssignmentTemplate | None = None,
+        parameters: dict[str, Any] | None = None,
+    ) -> "Assignment":
+        return await _resume_assignment(
+            AssignmentSnapshot.decode(token), template, parameters
         )
 
-    assignment = Assignment(agent, session, None, **spec.parameters)
-    await assignment._validate_assignment()
-    return assignment
-
+    "TODO: create test"
 
-async def _get_agent(spec: AssignmentSpec):
-    spec.agent.parameters = _merge_parameters(spec.parameters, spec.agent.parameters)
-    spec.agent.tools.extend(spec.additional_tools)
+    @classmethod
+    async def from_spec(cls, spec: AssignmentSpec) -> "Assignment":
+        return await _create_assignment_from_spec(spec)
 
-    for t in spec.agent.tools:
-        t.parameters = _merge_parameters(spec.parameters, t.parameters)
+    @classmethod
+    async def from_template(
+        cls,
+        template: AssignmentTemplate,
+        parameters: dict[str, Any] | None = None,
+        session: SessionSpec | None = None,
+        query: str | None = None,
+        run_id: str | None = None,
+    ) -> "Assignment":
+        return await _create_assignment_from_template(
+            template, parameters, session, query, run_id
+        )
 
-    return await class_registry.get_agent_class(spec.agent.type).from_spec(spec.agent)
+    @classmethod
+    async def from_registry(
+        cls,
+        id: str,
+        parameters: dict[str, Any] | None = None,
+        session: SessionSpec | None = None,
+        query: str | None = None,
+        run_id: str | None = None,
+    ) -> "Assignment":
+        template = await get_assignment_template(id)
+        return await _create_assignment_from_template(
+            template, parameters, session, query, run_id
+        )
 
 
-async def _get_session(spec: AssignmentSpec) -> Session:
-    agent = spec.agent
-    session = spec.session
-    parameters = spec.parameters
-    if not session:
-        session = SessionSpec()
+async def _create_assignment_from_spec(spec: AssignmentSpec) -> Assignment:
+    return await _create_assignment_from_template(
+        AssignmentTemplate.compile(spec), query=spec.query, run_id=spec.run_id
+    )
 
-    if agent.session_type == "NativeSession":
-        if not session.api_key:
-            session.api_key = agent.api_key
 
-        session.parameters = _merge_parameters(
-            _merge_parameters(parameters, agent.parameters), session.parameters
+async def _create_assignment_from_template(
+    template: AssignmentTemplate,
+    parameters: dict[str, Any] | None = None,
+    session: SessionSpec | None = None,
+    query: str | None = None,
+    run_id: str | None = None,
+) -> Assignment:
+    with tracing.span(
+        "assignment.build", **{"template.id": template.id, "run.id": run_id}
+    ) as span:
+        assignment = await _build_assignment_from_template(
+            template, parameters, session, query, run_id
+        )
+        _assignment_build.observe(assignment.build_timings["total"])
+        span.set_attribute("agent.id", assignment.agent.spec.id)
+        span.set_attribute("session.id", assignment.session.spec.id)
+        return assignment
+
+
+async def _build_assignment_from_template(
+    template: AssignmentTemplate,
+    parameters: dict[str, Any] | None = None,
+    session: SessionSpec | None = None,
+    query: str | None = None,
+    run_id: str | None = None,
+) -> Assignment:
+    if run_id and query:
+        raise InvalidDefinition(
+            f"Cannot add a query while resuming run {run_id}, its thread is locked"
         )
-        session.type = agent.type + "NativeSession"
-    else:
-        session.parameters = _merge_parameters(parameters, session.parameters)
-        if not session.type:
-            session.type = agent.session_type
 
-    return await class_registry.get_session_class(session.type).from_spec(session)
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
+    agent_spec = template.agent_spec(parameters)
+    session_spec = template.session_spec(session, parameters)
+    # the template and default queries only seed new runs
+    query = query or template.spec.query
+    new_session = not session_spec.id
+    built_sessions: list[Session] = []
+
+    async def build_agent() -> Agent:
+        stage_start = time.perf_counter()
+        agent = await class_registry.get_agent_class(agent_spec.type).from_spec(
+            agent_spec
+        )
+        timings["agent"] = time.perf_counter() - stage_start
+        return agent
+
+    async def build_session() -> Session:
+        stage_start = time.perf_counter()
+        # shielded, so a session created upstream is known even if cancelled
+        creating = asyncio.ensure_future(
+            class_registry.get_session_class(session_spec.type).from_spec(
+                session_spec
+            )
+        )
+        try:
+            session = await asyncio.shield(creating)
+        except asyncio.CancelledError:
+            await asyncio.wait([creating])
+            if creating.exception() is None:
+                built_sessions.append(creating.result())
+            raise
+        built_sessions.append(session)
+        timings["session"] = time.perf_counter() - stage_start
+
+        # seeding only depends on the session, so it does not wait for the agent
+        stage_start = time.perf_counter()
+        if run_id:
+            # resuming a deferred run, its thread cannot take new messages
+            pass
+        elif query:
+            await session.add_message(
+                SessionMessage(role=MessageRole.USER, text=query)
+            )
+        elif await session.is_empty and agent_spec.default_query:
+            await session.add_message(
+                SessionMessage(role=MessageRole.USER, text=agent_spec.default_query)
+            )
+        timings["messages"] = time.perf_counter() - stage_start
+        return session
+
+    try:
+        try:
+            async with asyncio.TaskGroup() as tg:
+                agent_task = tg.create_task(build_agent())
+                session_task = tg.create_task(build_session())
+        except ExceptionGroup as eg:
+            # surface the original error, as a sequential build would
+            first, *others = eg.exceptions
+            if others:
+                raise first from ExceptionGroup("Other assignment build errors", others)
+            raise first
+
+        assignment = Assignment(
+            agent_task.result(),
+            session_task.result(),
+            run_id,
+            **template.parameters(parameters),
+        )
+        assignment.async_tool_mode = template.spec.async_tool_mode
+        assignment.template_id = template.id
+        assignment.tenant = template.spec.tenant
+        assignment.max_total_tokens = template.spec.max_total_tokens
+        assignment.profiling = template.spec.profile
+
+        stage_start = time.perf_counter()
+        await assignment._validate_assignment()
+        timings["validate"] = time.perf_counter() - stage_start
+    except BaseException:
+        if new_session and built_sessions:
+            # the session was created for this assignment only, also when cancelled
+            await asyncio.shield(
+                asyncio.gather(
+                    *[s.delete_session() for s in built_sessions],
+                    return_exceptions=True,
+                )
+            )
+        raise
+    timings["total"] = time.perf_counter() - start
+
+    assignment.build_timings = timings
+    logging.debug(f"Assignment built in {timings}")
+    return assignment
 
 
-def _merge_parameters(
-    super_parameters: dict[str, Any], spec_parameters: dict[str, Any]
-) -> dict[str, Any]:
-    for key in spec_parameters:
-        value = spec_parameters[key]
-        if isinstance(value, str) and str(value).startswith("$parameters."):
-            template_key = str(value).split(".", 2)[1]
-            if template_key in super_parameters:
-                spec_parameters[key] = super_parameters[template_key]
+async def _resume_assignment(
+    snapshot: AssignmentSnapshot,
+    template: AssignmentTemplate | None = None,
+    parameters: dict[str, Any] | None = None,
+) -> Assignment:
+    if template is None:
+        if not snapshot.template_id:
+            raise InvalidDefinition("Snapshot has no template id, pass its template")
+        template = await get_assignment_template(snapshot.template_id)
+
+    assignment_parameters = template.parameters(parameters)
+    if parameters_digest(assignment_parameters) != snapshot.parameters_digest:
+        raise InvalidDefinition("Snapshot parameters do not match the template")
+
+    agent_spec = template.agent_spec(parameters)
+    if agent_spec.id != snapshot.agent_id:
+        raise InvalidDefinition(
+            f"Snapshot agent {snapshot.agent_id} does not match the template"
+        )
+    session_spec = template.session_spec(None, parameters).model_copy(
+        update={"id": snapshot.session_id, "messages": []}
+    )
 
-    return super_parameters | spec_parameters
+    # the snapshot was taken from a valid assignment, so it is not validated again
+    agent, session = await asyncio.gather(
+        class_registry.get_agent_class(agent_spec.type).restore(agent_spec),
+        class_registry.get_session_class(session_spec.type).restore(session_spec),
+    )
+    assignment = Assignment(agent, session, snapshot.run_id, **assignment_parameters)
+    assignment.async_tool_mode = template.spec.async_tool_mode
+    assignment.template_id = template.id
+    assignment.tenant = template.spec.tenant
+    assignment.max_total_tokens = template.spec.max_total_tokens
+    assignment.profiling = template.spec.profile
+    assignment.pending_tool_call_ids = snapshot.pending_tool_call_ids
+
+    tools = {t.spec.name: t.spec for t in agent.tools}
+    assignment.last_tools_submitted = [
+        tools[name] for name in snapshot.last_tools_submitted if name in tools
+    ]
+    return assignment
 
 
 def _tool_can_be_sync_called(definition: ToolDefinition) -> bool:
@@ -191,23 +523,142 @@ def _tool_can_be_sync_called(definition: ToolDefinition) -> bool:
 async def _execute_sync_tool_call(
     toolCall: ToolCall, definition: ToolDefinition
 ) -> ToolCallResult:
-    if definition.executor and isinstance(definition.executor, SyncTool):
-        return definition.executor.call(toolCall)
+    start = time.perf_counter()
+    with tracing.span(
+        "tool.call", **{"tool.name": toolCall.tool.name, "tool.call_id": toolCall.id}
+    ):
+        try:
+            if definition.executor and isinstance(definition.executor, SyncTool):
+                return definition.executor.call(toolCall)
+
+            executor_class = class_registry.get_sync_tool_executor(toolCall.tool.name)
+            return executor_class.execute_call(toolCall)
+        except Exception:
+            _tool_call_errors.inc(tool=toolCall.tool.name)
+            raise
+        finally:
+            _tool_call_duration.observe(
+                time.perf_counter() - start, tool=toolCall.tool.name
+            )
+
+
+async def _profile_sync_tool_call(
+    profile: AssignmentProfile,
+    run_id: str,
+    toolCall: ToolCall,
+    definition: ToolDefinition,
+) -> ToolCallResult:
+    started_at, start = datetime.now(timezone.utc), time.perf_counter()
+    status = "failed"
+    try:
+        result = await _execute_sync_tool_call(toolCall, definition)
+        status = "completed"
+        return result
+    finally:
+        profile.add(
+            ProfileEntry(
+                entry_type=ProfileEntryType.TOOL_CALL,
+                name=toolCall.tool.name,
+                run_id=run_id,
+                started_at=started_at,
+                duration=time.perf_counter() - start,
+                status=status,
+            )
+        )
 
-    executor_class = class_registry.get_sync_tool_executor(toolCall.tool.name)
-    return executor_class.execute_call(toolCall)
+
+async def _add_run_profiles(assignment: Assignment) -> None:
+    profile = assignment.profile
+    entries = await asyncio.gather(
+        *[
+            assignment.executor.get_run_profile(
+                assignment.agent, assignment.session, run_id, **assignment.params
+            )
+            for run_id in profile.run_ids
+        ],
+        return_exceptions=True,
+    )
+    for run_entries in entries:
+        if isinstance(run_entries, Exception):
+            # the local timings are still worth returning
+            logging.warning(f"Could not get run profile: {run_entries}")
+            continue
+        profile.entries.extend(run_entries)
+    profile.entries.sort(
+        key=lambda e: e.started_at or datetime.max.replace(tzinfo=timezone.utc)
+    )
 
 
 async def _run_assignment_until_breakpoint(
     assignment: Assignment,
+    deadline: float | None = None,
+    max_tool_rounds: int | None = None,
+) -> AssignmentRunResult:
+    with tracing.span(
+        "assignment.run",
+        **{
+            "agent.id": assignment.agent.spec.id,
+            "session.id": assignment.session.spec.id,
+        },
+    ) as span:
+        _assignments_in_flight.inc()
+        try:
+            async with asyncio.timeout_at(deadline):
+                result = await _run_tool_rounds(assignment, max_tool_rounds)
+        except TimeoutError:
+            await assignment.cancel()
+            result = _create_partial_result(
+                assignment, PartialResultReason.DEADLINE_EXCEEDED
+            )
+        except asyncio.CancelledError:
+            await asyncio.shield(assignment.cancel())
+            _assignments.inc(result="cancelled")
+            raise
+        except Exception:
+            _assignments.inc(result="error")
+            raise
+        finally:
+            _assignments_in_flight.dec()
+
+        _assignments.inc(result=_get_result_label(result))
+        span.set_attribute("run.id", result.run_id)
+        if isinstance(result, PartialAssignmentRunResult):
+            span.set_attribute("partial.reason", result.reason.value)
+        return result
+
+
+def _get_result_label(result: AssignmentRunResult) -> str:
+    if isinstance(result, PartialAssignmentRunResult):
+        return result.reason.value
+    if result.pending_tool_call_ids:
+        return "pending"
+    if result.last_run_result.result_type == RunResultType.TOOL_CALL:
+        return "asyncToolCall"
+    return "completed"
+
+
+async def _run_tool_rounds(
+    assignment: Assignment, max_tool_rounds: int | None
 ) -> AssignmentRunResult:
     done: bool = False
+    tool_rounds: int = 0
+    if _is_over_budget(assignment):
+        await assignment.cancel()
+        return _create_partial_result(assignment, PartialResultReason.BUDGET_EXCEEDED)
+
     while not done:
         result = await assignment.run_once()
         tools_dict = {t.spec.name: t for t in assignment.agent.tools}
         done = True
 
         if result.result_type == RunResultType.TOOL_CALL:
+            if _is_over_budget(assignment):
+                # stop before the tool outputs let the run spend more
+                await assignment.cancel()
+                return _create_partial_result(
+                    assignment, PartialResultReason.BUDGET_EXCEEDED
+                )
+
             if all(
                 [
                     tc.tool is not None
@@ -215,6 +666,12 @@ async def _run_assignment_until_breakpoint(
                     for tc in result.tool_calls
                 ]
             ):
+                if max_tool_rounds is not None and tool_rounds >= max_tool_rounds:
+                    await assignment.cancel()
+                    return _create_partial_result(
+                        assignment, PartialResultReason.MAX_TOOL_ROUNDS
+                    )
+
                 try:
                     # process all calls synchronously
                     async with asyncio.TaskGroup() as tg:
@@ -223,11 +680,19 @@ async def _run_assignment_until_breakpoint(
                                 _execute_sync_tool_call(
                                     tc, tools_dict.get(tc.tool.name)
                                 )
+                                if assignment.profile is None
+                                else _profile_sync_tool_call(
+                                    assignment.profile,
+                                    result.run_id,
+                                    tc,
+                                    tools_dict.get(tc.tool.name),
+                                )
                             )
                             for tc in result.tool_calls
                         ]
                     tc_results = [task.result() for task in tasks]
                     await assignment.submit_tool_calls(tc_results)
+                    tool_rounds += 1
 
                     # will run again after this
                     done = False
@@ -236,13 +701,67 @@ async def _run_assignment_until_breakpoint(
                     # if any failures fallback to async case
                     # TODO: log
                     logging.info(f"Error processing sync tools: {ex}")
-                    return AssignmentRunResult(
-                        session_id=assignment.session.spec.id,
-                        last_run_result=assignment.last_result,
-                    )
+                    return _create_assignment_run_result(assignment, pending=True)
+            elif assignment.async_tool_mode == AsyncToolMode.DEFER:
+                # keep the run waiting for the tool outputs
+                await assignment._defer_tool_calls()
+                return _create_assignment_run_result(assignment, pending=True)
             else:
                 await assignment._prepare_for_async_tool_calls()
 
+    return _create_assignment_run_result(assignment)
+
+
+def _create_assignment_run_result(
+    assignment: Assignment, pending: bool = False
+) -> AssignmentRunResult:
+    result = assignment.last_result
+    if not pending:
+        assignment.pending_tool_call_ids = []
+        return AssignmentRunResult(
+            session_id=assignment.session.spec.id,
+            last_run_result=result,
+            run_id=assignment.run_id,
+            usage=assignment.usage,
+        )
+
+    assignment.pending_tool_call_ids = [tc.id for tc in result.tool_calls]
     return AssignmentRunResult(
-        session_id=assignment.session.spec.id, last_run_result=assignment.last_result
+        session_id=assignment.session.spec.id,
+        last_run_result=result,
+        run_id=assignment.run_id,
+        pending_tool_call_ids=assignment.pending_tool_call_ids,
+        expires_at=result.expires_at,
+        usage=assignment.usage,
+    )
+
+
+def _create_partial_result(
+    assignment: Assignment, reason: PartialResultReason
+) -> PartialAssignmentRunResult:
+    return PartialAssignmentRunResult(
+        session_id=assignment.session.spec.id,
+        last_run_result=assignment.last_result,
+        reason=reason,
+        usage=assignment.usage,
+    )
+
+
+def _has_budget(assignment: Assignment) -> bool:
+    aggregator = get_usage_aggregator()
+    return assignment.max_total_tokens is not None or (
+        aggregator is not None and aggregator.has_budget(assignment.tenant)
     )
+
+
+def _is_over_budget(assignment: Assignment) -> bool:
+    usage = assignment.usage
+    if (
+        assignment.max_total_tokens is not None
+        and usage is not None
+        and usage.total_tokens >= assignment.max_total_tokens
+    ):
+        return True
+
+    aggregator = get_usage_aggregator()
+    return aggregator is not None and aggregator.is_over_budget(assignment.tenant)
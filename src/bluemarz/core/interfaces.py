@@ -22,10 +22,18 @@ class Session(ABC):
     async def from_spec(cls, spec: models.SessionSpec) -> "Session":
         pass
 
+    @classmethod
+    async def restore(cls, spec: models.SessionSpec) -> "Session":
+        """Rebuilds an existing session, avoiding round trips where possible."""
+        return await cls.from_spec(spec)
+
     @abstractmethod
     async def add_file(self, file: models.SessionFile) -> models.AddFileResult:
         pass
 
+    async def add_files(self, files: list[models.SessionFile]) -> list[models.AddFileResult]:
+        return [await self.add_file(file) for file in files]
+
     @abstractmethod
     async def add_message(self, message: models.SessionMessage) -> models.AddMessageResult:
         pass
@@ -38,6 +46,9 @@ class Session(ABC):
     async def add_tool_call_result(self, tool_call_result: models.ToolCallResult) -> models.AddMessageResult:
         pass
 
+    async def fork(self) -> "Session":
+        raise NotImplementedError(f"{self.__class__.__name__} cannot be forked")
+
 
 class ToolDefinition(ABC):
     def __init__(self, spec: models.ToolSpec, executor: Union["SyncTool", "AsyncTool"] = None):
@@ -119,6 +130,11 @@ class Agent(ABC):
     async def from_spec(cls, spec: models.AgentSpec) -> "Agent":
         pass
 
+    @classmethod
+    async def restore(cls, spec: models.AgentSpec) -> "Agent":
+        """Rebuilds an existing agent, avoiding round trips where possible."""
+        return await cls.from_spec(spec)
+
     @classmethod
     @abstractmethod
     def _get_tool_type(cls) -> type[ToolDefinition]:
@@ -158,6 +174,11 @@ class AssignmentExecutor(ABC):
     async def execute(
         agent: Agent, session: Session, run_id: str | None, **kwargs
     ) -> models.RunResult:
+        """Runs the agent until it answers or calls tools.
+
+        Executors with upstream runs call `kwargs["run_started"]`, when given,
+        with the run id as soon as the run exists, so it can be cancelled.
+        """
         pass
 
     @staticmethod
@@ -180,3 +201,42 @@ class AssignmentExecutor(ABC):
         **kwargs,
     ) -> models.RunResult:
         pass
+
+    @staticmethod
+    async def cancel_run(
+        agent: Agent,
+        session: Session,
+        run_id: str,
+        **kwargs,
+    ) -> None:
+        pass
+
+    @staticmethod
+    async def defer_tool_calls(
+        agent: Agent,
+        session: Session,
+        run_id: str,
+        **kwargs,
+    ) -> None:
+        """Leaves the run waiting for tool outputs submitted on a later resume."""
+        pass
+
+    @staticmethod
+    async def get_run_usage(
+        agent: Agent,
+        session: Session,
+        run_id: str,
+        **kwargs,
+    ) -> models.TokenUsage | None:
+        """Returns the tokens spent so far by a run waiting for tool outputs."""
+        return None
+
+    @staticmethod
+    async def get_run_profile(
+        agent: Agent,
+        session: Session,
+        run_id: str,
+        **kwargs,
+    ) -> list[models.ProfileEntry]:
+        """Returns the queueing and steps of a run, from upstream timestamps."""
+        return []
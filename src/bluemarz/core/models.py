@@ -1,3 +1,4 @@
+from datetime import datetime
 from enum import Enum
 from typing import Any, Self
 from pydantic import Field, HttpUrl, model_validator
@@ -18,6 +19,58 @@ class DeleteSessionResult(CamelCaseModel):
     ok: bool
 
 
+class ContextBudget(CamelCaseModel):
+    """Bounds how much of the session history each run reads and writes."""
+
+    last_messages: int | None = Field(None, ge=1)
+    max_prompt_tokens: int | None = Field(None, ge=1)
+    max_completion_tokens: int | None = Field(None, ge=1)
+
+    @classmethod
+    def resolve(
+        cls, agent: "ContextBudget | None", session: "ContextBudget | None"
+    ) -> "ContextBudget | None":
+        """Returns the agent budget with the limits set by the session replaced."""
+        if agent is None or session is None:
+            return session or agent
+        return agent.model_copy(update=session.model_dump(exclude_none=True))
+
+
+class ContextReport(CamelCaseModel):
+    """What a budget did to the history of a run, unset where it is not known."""
+
+    budget: ContextBudget
+    prompt_tokens: int | None = None
+    messages_before: int | None = None
+    messages_after: int | None = None
+    estimated_tokens_before: int | None = None
+    estimated_tokens_after: int | None = None
+
+
+class TokenUsage(CamelCaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+
+    def __add__(self, other: "TokenUsage | None") -> "TokenUsage":
+        if other is None:
+            return self
+        return TokenUsage(
+            prompt_tokens=self.prompt_tokens + other.prompt_tokens,
+            completion_tokens=self.completion_tokens + other.completion_tokens,
+            total_tokens=self.total_tokens + other.total_tokens,
+        )
+
+    def __sub__(self, other: "TokenUsage | None") -> "TokenUsage":
+        if other is None:
+            return self
+        return TokenUsage(
+            prompt_tokens=self.prompt_tokens - other.prompt_tokens,
+            completion_tokens=self.completion_tokens - other.completion_tokens,
+            total_tokens=self.total_tokens - other.total_tokens,
+        )
+
+
 class AgentSpec(CamelCaseModel):
     id: str = Field(..., min_length=1)
     api_key: str | None = Field(None, min_length=1)
@@ -29,6 +82,7 @@ class AgentSpec(CamelCaseModel):
     default_query: str | None = None
     tools: list["ToolSpec"] = []
     parameters: dict[str, Any] = {}
+    context_budget: ContextBudget | None = None
 
 
 class SessionSpec(CamelCaseModel):
@@ -39,6 +93,7 @@ class SessionSpec(CamelCaseModel):
     files: list["SessionFile"] = []
     setup_tool_calls: list["ToolCall"] = []
     parameters: dict[str, Any] = {}
+    context_budget: ContextBudget | None = None
 
 
 class ToolType(str, Enum):
@@ -101,12 +156,22 @@ class SessionMessage(CamelCaseModel):
     files: list[SessionFile] | None = None
 
 
+class AsyncToolMode(str, Enum):
+    CANCEL = "cancel"
+    DEFER = "defer"
+
+
 class AssignmentSpec(CamelCaseModel):
     agent: AgentSpec
     session:  SessionSpec | None = None
     additional_tools: list[ToolSpec] | None = []
     query: str | None = None
     parameters: dict[str, Any] = {}
+    run_id: str | None = None
+    async_tool_mode: AsyncToolMode = AsyncToolMode.CANCEL
+    tenant: str | None = None
+    max_total_tokens: int | None = Field(None, ge=1)
+    profile: bool = False
 
 
 class RunResultType(str, Enum):
@@ -119,6 +184,10 @@ class RunResult(CamelCaseModel):
     result_type: RunResultType
     tool_calls: list[ToolCall] = None
     messages: list[SessionMessage] = None
+    expires_at: datetime | None = None
+    context: ContextReport | None = None
+    model: str | None = None
+    usage: TokenUsage | None = None
 
     @model_validator(mode="after")
     def validate_tool(self) -> Self:
@@ -135,6 +204,72 @@ class RunResult(CamelCaseModel):
         return self
 
 
+class ProfileEntryType(str, Enum):
+    QUEUED = "queued"
+    RUN_STEP = "runStep"
+    RUN_WAIT = "runWait"
+    TOOL_CALL = "toolCall"
+    SUBMIT = "submit"
+
+
+class ProfileEntry(CamelCaseModel):
+    entry_type: ProfileEntryType
+    name: str | None = None
+    run_id: str | None = None
+    step_id: str | None = None
+    started_at: datetime | None = None
+    duration: float | None = None
+    status: str | None = None
+
+
+class AssignmentProfile(CamelCaseModel):
+    """Timeline of an assignment, from upstream timestamps and local timers."""
+
+    entries: list[ProfileEntry] = []
+
+    def add(self, entry: ProfileEntry) -> None:
+        self.entries.append(entry)
+
+    @property
+    def run_ids(self) -> list[str]:
+        return list(dict.fromkeys(e.run_id for e in self.entries if e.run_id))
+
+    def durations(self) -> dict[str, float]:
+        """Total seconds per entry type, and per name for run steps and tools."""
+        totals: dict[str, float] = {}
+        for entry in self.entries:
+            if entry.duration is None:
+                continue
+            keys = [entry.entry_type.value]
+            if entry.name:
+                keys.append(f"{entry.entry_type.value}:{entry.name}")
+            for key in keys:
+                totals[key] = totals.get(key, 0) + entry.duration
+        return totals
+
+
 class AssignmentRunResult(CamelCaseModel):
     session_id: str
     last_run_result: RunResult
+    run_id: str | None = None
+    pending_tool_call_ids: list[str] | None = None
+    expires_at: datetime | None = None
+    usage: TokenUsage | None = None
+    profile: AssignmentProfile | None = None
+
+
+class PartialResultReason(str, Enum):
+    DEADLINE_EXCEEDED = "deadlineExceeded"
+    MAX_TOOL_ROUNDS = "maxToolRounds"
+    BUDGET_EXCEEDED = "budgetExceeded"
+
+
+class PartialAssignmentRunResult(AssignmentRunResult):
+    last_run_result: RunResult | None = None
+    reason: PartialResultReason
+
+
+class RaceAssignmentRunResult(AssignmentRunResult):
+    last_run_result: RunResult | None = None
+    winner_agent_id: str | None = None
+    accepted: bool = False
@@ -0,0 +1,78 @@
+from typing import Any, Iterator
+
+PLACEHOLDER_PREFIX: str = "$parameters."
+
+_Path = tuple[str | int, ...]
+
+
+class ParameterTemplate:
+    """Parameters dict with its `$parameters.<key>` placeholders located once.
+
+    Placeholders are found in nested dicts and lists at compile time. Rendering
+    walks only those slots and copies only the containers on their paths, so
+    the source dict is never modified and parameters without placeholders are
+    returned as they are.
+    """
+
+    __slots__ = ("_source", "_slots")
+
+    def __init__(self, source: dict[str, Any] | None):
+        self._source: dict[str, Any] = source if source is not None else {}
+        self._slots: list[tuple[_Path, str]] = list(_find_slots(self._source, ()))
+
+    @classmethod
+    def compile(cls, source: dict[str, Any] | None) -> "ParameterTemplate":
+        return cls(source)
+
+    @property
+    def source(self) -> dict[str, Any]:
+        return self._source
+
+    @property
+    def has_placeholders(self) -> bool:
+        return bool(self._slots)
+
+    def render(self, parameters: dict[str, Any]) -> dict[str, Any]:
+        """Replaces the placeholders whose key is found in `parameters`."""
+        if not self._slots:
+            return self._source
+
+        result = dict(self._source)
+        copied: set[_Path] = {()}
+        for path, key in self._slots:
+            if key not in parameters:
+                continue
+
+            container = result
+            for depth in range(1, len(path)):
+                prefix = path[:depth]
+                child = container[path[depth - 1]]
+                if prefix not in copied:
+                    child = dict(child) if isinstance(child, dict) else list(child)
+                    container[path[depth - 1]] = child
+                    copied.add(prefix)
+                container = child
+
+            container[path[-1]] = parameters[key]
+
+        return result
+
+    def merge(self, super_parameters: dict[str, Any]) -> dict[str, Any]:
+        """Renders with `super_parameters` and lays the result over them."""
+        return super_parameters | self.render(super_parameters)
+
+
+def _find_slots(value: Any, path: _Path) -> Iterator[tuple[_Path, str]]:
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return
+
+    for key, item in items:
+        if isinstance(item, str):
+            if item.startswith(PLACEHOLDER_PREFIX):
+                yield (*path, key), item.split(".", 2)[1]
+        else:
+            yield from _find_slots(item, (*path, key))
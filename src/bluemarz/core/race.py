@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from typing import Callable
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.interfaces import Agent, Session
+from bluemarz.core.models import (
+    AddMessageResult,
+    AssignmentRunResult,
+    MessageRole,
+    RaceAssignmentRunResult,
+    RunResultType,
+    SessionMessage,
+    TokenUsage,
+)
+
+
+def _is_message_response(result: AssignmentRunResult) -> bool:
+    return (
+        result.last_run_result is not None
+        and result.last_run_result.result_type == RunResultType.MESSAGE_RESPONSE
+    )
+
+
+class RaceAssignment:
+    """Runs the same session against several agents and keeps the first answer.
+
+    Every agent runs in its own fork of the session, forked and started
+    `hedge_delay` seconds after the previous one, so slower agents only start,
+    and their forks are only created, when faster ones have not answered yet. The first message response accepted by
+    `accept` wins: the other runs are cancelled upstream and the winning
+    messages are added to the original session.
+    """
+
+    def __init__(
+        self,
+        agents: list[Agent],
+        session: Session,
+        hedge_delay: float | list[float] = 0,
+        accept: Callable[[AssignmentRunResult], bool] | None = None,
+        keep_forks: bool = False,
+        **kwargs,
+    ) -> None:
+        if not agents:
+            raise ValueError("RaceAssignment needs at least one agent")
+
+        if isinstance(hedge_delay, list):
+            if len(hedge_delay) != len(agents):
+                raise ValueError("hedge_delay must have one delay per agent")
+            self._delays = hedge_delay
+        else:
+            self._delays = [hedge_delay * i for i in range(len(agents))]
+
+        self.agents = agents
+        self.session = session
+        self.params = kwargs
+        self._accept = accept or _is_message_response
+        self._keep_forks = keep_forks
+
+    async def add_message(self, message: SessionMessage) -> AddMessageResult:
+        return await self.session.add_message(message)
+
+    async def run_until_breakpoint(
+        self, deadline: float | None = None, max_tool_rounds: int | None = None
+    ) -> RaceAssignmentRunResult:
+        forks: list[Session] = []
+        participants: list[Assignment] = []
+
+        async def run_agent(
+            agent: Agent, delay: float
+        ) -> tuple[Agent, AssignmentRunResult]:
+            await asyncio.sleep(delay)
+            # shielded, so a fork created while cancelled is still deleted
+            forking = asyncio.ensure_future(self.session.fork())
+            try:
+                fork = await asyncio.shield(forking)
+            except asyncio.CancelledError:
+                await asyncio.wait([forking])
+                if forking.exception() is None:
+                    forks.append(forking.result())
+                raise
+            forks.append(fork)
+
+            assignment = Assignment(agent, fork, None, **self.params)
+            participants.append(assignment)
+            return agent, await assignment.run_until_breakpoint(
+                deadline, max_tool_rounds
+            )
+
+        tasks = [
+            asyncio.create_task(run_agent(agent, delay))
+            for agent, delay in zip(self.agents, self._delays)
+        ]
+
+        winner: tuple[Agent, AssignmentRunResult] | None = None
+        first: tuple[Agent, AssignmentRunResult] | None = None
+        error: BaseException | None = None
+        try:
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        logging.warning(f"Race participant failed: {task.exception()}")
+                        error = error or task.exception()
+                        continue
+
+                    agent, result = task.result()
+                    first = first or (agent, result)
+                    if winner is None and self._accept(result):
+                        winner = (agent, result)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._delete_forks(forks)
+
+        if winner is None and first is None:
+            raise error
+
+        agent, result = winner or first
+        if winner is not None:
+            for message in result.last_run_result.messages or []:
+                await self.session.add_message(
+                    SessionMessage(role=MessageRole.AGENT, text=message.text)
+                )
+
+        return RaceAssignmentRunResult(
+            session_id=self.session.spec.id,
+            last_run_result=result.last_run_result,
+            winner_agent_id=agent.spec.id,
+            accepted=winner is not None,
+            # every participant spent tokens, not only the winner
+            usage=sum(
+                (a.usage for a in participants if a.usage is not None), TokenUsage()
+            ),
+        )
+
+    async def _delete_forks(self, forks: list[Session]) -> None:
+        if not self._keep_forks:
+            await asyncio.gather(
+                *[fork.delete_session() for fork in forks], return_exceptions=True
+            )
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import logging
+from typing import Any, Generic, Iterable, TypeVar
+
+import httpx
+import orjson
+from pydantic import BaseModel, HttpUrl
+
+from bluemarz.core.spec_registry import SpecRegistry
+
+T = TypeVar("T")
+
+
+class ReloadableRegistry(Generic[T], SpecRegistry[T]):
+    """Read only registry whose contents are replaced atomically by a loader."""
+
+    _registry: dict[str, T]
+
+    def __init__(self, registry: dict[str, T] = None):
+        self._registry = registry if registry is not None else {}
+
+    def get_by_id(self, id: str) -> T:
+        return self._registry[id]
+
+    def get_many(self, ids: Iterable[str]) -> dict[str, T]:
+        registry = self._registry
+        return {id: registry[id] for id in ids if id in registry}
+
+    def save_by_id(self, id: str, spec: T) -> None:
+        raise Exception("Unsupported operation, ReloadableRegistry is read only")
+
+    def __len__(self) -> int:
+        return len(self._registry)
+
+    def _swap(self, registry: dict[str, T]) -> None:
+        self._registry = registry
+
+
+class UrlRegistryLoader(Generic[T]):
+    """Keeps a ReloadableRegistry in sync with a json document served over http.
+
+    Polls with `If-None-Match` and `If-Modified-Since`, so unchanged documents
+    cost a 304. When the document changes only the specs whose json changed are
+    validated again, and the new contents are swapped in at once. A document
+    with invalid specs is rejected and the current contents are kept.
+    """
+
+    def __init__(
+        self,
+        class_type: type[BaseModel],
+        url: HttpUrl | str,
+        poll_interval: float = 60,
+    ):
+        self._class_type = class_type
+        self._url = str(url)
+        self._poll_interval = poll_interval
+        self._registry = ReloadableRegistry[T]()
+        self._digests: dict[str, bytes] = {}
+        self._etag: str | None = None
+        self._last_modified: str | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def registry(self) -> ReloadableRegistry[T]:
+        return self._registry
+
+    async def load(self) -> bool:
+        """Fetches the document and applies it. Returns whether it changed."""
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=60, follow_redirects=True)
+
+        async with self._client.stream("GET", self._url, headers=headers) as response:
+            if response.status_code == 304:
+                return False
+            response.raise_for_status()
+
+            content = bytearray()
+            async for chunk in response.aiter_bytes():
+                content.extend(chunk)
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        init_dict: Any = orjson.loads(content)
+        if not isinstance(init_dict, dict):
+            raise Exception(f"Url {self._url} does not contain valid json")
+
+        changed = self._apply(init_dict)
+        self._etag = etag
+        self._last_modified = last_modified
+        return changed
+
+    def _apply(self, init_dict: dict[str, Any]) -> bool:
+        current = self._registry._registry
+        final_dict: dict[str, T] = {}
+        digests: dict[str, bytes] = {}
+        changed = len(init_dict) != len(current)
+
+        for key, value in init_dict.items():
+            digest = hashlib.blake2b(
+                orjson.dumps(value, option=orjson.OPT_SORT_KEYS), digest_size=16
+            ).digest()
+            digests[key] = digest
+
+            if self._digests.get(key) == digest and key in current:
+                final_dict[key] = current[key]
+            else:
+                final_dict[key] = self._class_type.model_validate(value)
+                changed = True
+
+        if changed:
+            self._registry._swap(final_dict)
+        self._digests = digests
+        return changed
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                if await self.load():
+                    logging.info(f"Registry reloaded from {self._url}")
+            except Exception as ex:
+                logging.error(f"Error reloading registry from {self._url}: {ex}")
+
+            await asyncio.sleep(self._poll_interval)
+
+    @classmethod
+    async def from_url(
+        cls,
+        class_type: type[BaseModel],
+        url: HttpUrl | str,
+        poll_interval: float = 60,
+    ) -> "UrlRegistryLoader[T]":
+        """Creates a loader, loads the document once and starts polling."""
+        loader = cls[class_type](class_type, url, poll_interval)
+        await loader.load()
+        loader.start()
+        return loader
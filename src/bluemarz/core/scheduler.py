@@ -0,0 +1,231 @@
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from enum import IntEnum
+import time
+from typing import Any, Awaitable, Callable, Generator
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.models import AssignmentRunResult
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+@dataclass
+class QueueTimeStats:
+    count: int = 0
+    total: float = 0
+    max: float = 0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def record(self, queue_time: float) -> None:
+        self.count += 1
+        self.total += queue_time
+        self.max = max(self.max, queue_time)
+
+
+class AssignmentHandle:
+    """Awaitable handle of an assignment submitted to a scheduler."""
+
+    def __init__(
+        self,
+        assignment: Assignment,
+        priority: Priority,
+        tenant: str,
+        run: Callable[[Assignment], Awaitable[Any]],
+    ):
+        self.assignment = assignment
+        self.priority = priority
+        self.tenant = tenant
+        self.queued_at: float = time.monotonic()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self._run = run
+        self._future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def queue_time(self) -> float | None:
+        if self.started_at is None:
+            return None
+        return self.started_at - self.queued_at
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def cancel(self) -> bool:
+        """Cancels the assignment, removing it from the queue or its running task."""
+        if self._task is not None and not self._task.done():
+            return self._task.cancel()
+        return self._future.cancel()
+
+    def result(self) -> AssignmentRunResult:
+        return self._future.result()
+
+    def __await__(self) -> Generator[Any, None, AssignmentRunResult]:
+        return self._future.__await__()
+
+
+class _KeyQueue:
+    def __init__(self):
+        self.in_flight: int = 0
+        self.queued: int = 0
+        self.queues: dict[Priority, OrderedDict[str, deque[AssignmentHandle]]] = {
+            p: OrderedDict() for p in Priority
+        }
+
+    def push(self, handle: AssignmentHandle) -> None:
+        tenants = self.queues[handle.priority]
+        tenants.setdefault(handle.tenant, deque()).append(handle)
+        self.queued += 1
+
+    def pop(self) -> AssignmentHandle | None:
+        for priority in sorted(self.queues):
+            tenants = self.queues[priority]
+            while tenants:
+                # round robin: the served tenant goes to the back of the line
+                tenant, handles = next(iter(tenants.items()))
+                handle = handles.popleft()
+                if handles:
+                    tenants.move_to_end(tenant)
+                else:
+                    del tenants[tenant]
+                self.queued -= 1
+
+                # cancelled handles not removed yet are skipped
+                if not handle.done():
+                    return handle
+        return None
+
+    def remove(self, handle: AssignmentHandle) -> bool:
+        tenants = self.queues[handle.priority]
+        handles = tenants.get(handle.tenant)
+        if handles is None or handle not in handles:
+            return False
+
+        handles.remove(handle)
+        if not handles:
+            del tenants[handle.tenant]
+        self.queued -= 1
+        return True
+
+    def __len__(self) -> int:
+        return self.queued
+
+
+class AssignmentScheduler:
+    """Runs assignments with bounded concurrency per api key.
+
+    Queued assignments are started by priority, interactive before batch, and
+    tenants of the same priority take turns, so one tenant cannot starve the
+    others. `submit` raises `asyncio.QueueFull` once `max_queued` assignments
+    are waiting, pushing back on callers instead of growing without bound.
+    """
+
+    def __init__(self, max_in_flight_per_key: int = 8, max_queued: int | None = None):
+        if max_in_flight_per_key < 1:
+            raise ValueError("max_in_flight_per_key must be positive")
+        self._max_in_flight = max_in_flight_per_key
+        self._max_queued = max_queued
+        self._queues: dict[str, _KeyQueue] = {}
+        self._queued: int = 0
+        self._queue_time: dict[Priority, QueueTimeStats] = {
+            p: QueueTimeStats() for p in Priority
+        }
+
+    def submit(
+        self,
+        assignment: Assignment,
+        priority: Priority = Priority.INTERACTIVE,
+        tenant: str = "default",
+        run: Callable[[Assignment], Awaitable[Any]] | None = None,
+    ) -> AssignmentHandle:
+        if self._max_queued is not None and self._queued >= self._max_queued:
+            raise asyncio.QueueFull(f"Scheduler queue is full ({self._max_queued})")
+
+        handle = AssignmentHandle(
+            assignment, priority, tenant, run or _run_until_breakpoint
+        )
+        key = _get_key(assignment)
+        self._queues.setdefault(key, _KeyQueue()).push(handle)
+        self._queued += 1
+        handle._future.add_done_callback(
+            lambda _, handle=handle: self._remove(key, handle)
+        )
+        self._dispatch(key)
+        return handle
+
+    def queued(self, api_key: str | None = None) -> int:
+        if api_key is not None:
+            queue = self._queues.get(api_key)
+            return len(queue) if queue else 0
+        return self._queued
+
+    def in_flight(self, api_key: str | None = None) -> int:
+        if api_key is not None:
+            queue = self._queues.get(api_key)
+            return queue.in_flight if queue else 0
+        return sum(q.in_flight for q in self._queues.values())
+
+    def queue_time_stats(self, priority: Priority) -> QueueTimeStats:
+        return self._queue_time[priority]
+
+    def _dispatch(self, key: str) -> None:
+        queue = self._queues[key]
+        while queue.in_flight < self._max_in_flight:
+            queued = queue.queued
+            handle = queue.pop()
+            self._queued -= queued - queue.queued
+            if handle is None:
+                break
+
+            queue.in_flight += 1
+            handle.started_at = time.monotonic()
+            self._queue_time[handle.priority].record(handle.queue_time)
+            handle._task = asyncio.get_running_loop().create_task(
+                handle._run(handle.assignment)
+            )
+            handle._task.add_done_callback(
+                lambda task, handle=handle: self._finish(key, handle, task)
+            )
+
+        if not queue.in_flight and not len(queue):
+            del self._queues[key]
+
+    def _remove(self, key: str, handle: AssignmentHandle) -> None:
+        # drops handles cancelled while queued
+        queue = self._queues.get(key)
+        if handle.started_at is not None or queue is None or not queue.remove(handle):
+            return
+
+        self._queued -= 1
+        if not queue.in_flight and not len(queue):
+            del self._queues[key]
+
+    def _finish(self, key: str, handle: AssignmentHandle, task: asyncio.Task) -> None:
+        handle.finished_at = time.monotonic()
+        self._queues[key].in_flight -= 1
+
+        if not handle._future.done():
+            if task.cancelled():
+                handle._future.cancel()
+            elif task.exception() is not None:
+                handle._future.set_exception(task.exception())
+            else:
+                handle._future.set_result(task.result())
+
+        self._dispatch(key)
+
+
+async def _run_until_breakpoint(assignment: Assignment) -> AssignmentRunResult:
+    return await assignment.run_until_breakpoint()
+
+
+def _get_key(assignment: Assignment) -> str:
+    return getattr(assignment.agent, "api_key", None) or assignment.agent.spec.api_key or ""
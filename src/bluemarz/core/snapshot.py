@@ -0,0 +1,69 @@
+import base64
+import binascii
+import hashlib
+import hmac
+from typing import Any, NamedTuple
+
+import orjson
+
+from bluemarz.core.exceptions import InvalidDefinition
+
+SNAPSHOT_VERSION: int = 1
+_MAC_SIZE: int = 16
+
+_secret: bytes | None = None
+
+
+def set_snapshot_secret(secret: bytes | str | None) -> None:
+    """Sets the key used to sign and verify assignment snapshots."""
+    global _secret
+    _secret = secret.encode() if isinstance(secret, str) else secret
+
+
+def parameters_digest(parameters: dict[str, Any]) -> str:
+    return hashlib.blake2b(
+        orjson.dumps(parameters, option=orjson.OPT_SORT_KEYS, default=str),
+        digest_size=8,
+    ).hexdigest()
+
+
+class AssignmentSnapshot(NamedTuple):
+    """State needed to continue an assignment in another process.
+
+    Encoded as a url safe base64 token: a version byte, the fields as a json
+    array and a truncated HMAC-SHA256 of both.
+    """
+
+    agent_id: str
+    session_id: str
+    template_id: str | None
+    run_id: str | None
+    pending_tool_call_ids: list[str]
+    last_tools_submitted: list[str]
+    parameters_digest: str
+
+    def encode(self) -> str:
+        payload = bytes([SNAPSHOT_VERSION]) + orjson.dumps(list(self))
+        token = payload + _sign(payload)
+        return base64.urlsafe_b64encode(token).rstrip(b"=").decode()
+
+    @classmethod
+    def decode(cls, token: str) -> "AssignmentSnapshot":
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (binascii.Error, ValueError):
+            raise InvalidDefinition("Snapshot token is not valid base64")
+
+        payload, mac = raw[:-_MAC_SIZE], raw[-_MAC_SIZE:]
+        if not payload or not hmac.compare_digest(mac, _sign(payload)):
+            raise InvalidDefinition("Snapshot token signature does not match")
+        if payload[0] != SNAPSHOT_VERSION:
+            raise InvalidDefinition(f"Unsupported snapshot version {payload[0]}")
+
+        return cls(*orjson.loads(payload[1:]))
+
+
+def _sign(payload: bytes) -> bytes:
+    if not _secret:
+        raise InvalidDefinition("Snapshot secret is not set")
+    return hmac.new(_secret, payload, hashlib.sha256).digest()[:_MAC_SIZE]
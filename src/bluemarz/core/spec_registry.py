@@ -1,17 +1,24 @@
 from abc import ABC, abstractmethod
+import asyncio
+from collections import OrderedDict
 import json
-import os
 from pathlib import Path
-from typing import Generic, TypeVar
+import sqlite3
+import threading
+from typing import Any, Generic, Iterable, TypeVar
 
+import httpx
+import orjson
 from pydantic import BaseModel, HttpUrl
-import urllib.request
 from bluemarz.core.models import AssignmentSpec
 
 T = TypeVar("T")
 
 
 class SpecRegistry(Generic[T], ABC):
+    # whether lookups do blocking I/O and should run outside the event loop
+    blocking: bool = False
+
     @abstractmethod
     def get_by_id(self, id: str) -> T:
         pass
@@ -19,8 +26,101 @@ class SpecRegistry(Generic[T], ABC):
     def save_by_id(self, id: str, spec: T) -> None:
         pass
 
+    def get_many(self, ids: Iterable[str]) -> dict[str, T]:
+        result: dict[str, T] = {}
+        for id in ids:
+            try:
+                result[id] = self.get_by_id(id)
+            except KeyError:
+                pass
+        return result
+
+    def save_many(self, specs: dict[str, T]) -> None:
+        for id, spec in specs.items():
+            self.save_by_id(id, spec)
+
+
+class AsyncSpecRegistry(Generic[T], ABC):
+    @abstractmethod
+    async def aget_by_id(self, id: str) -> T:
+        pass
+
+    @abstractmethod
+    async def aget_many(self, ids: Iterable[str]) -> dict[str, T]:
+        pass
+
+    @abstractmethod
+    async def asave_by_id(self, id: str, spec: T) -> None:
+        pass
+
+
+class AsyncSpecRegistryAdapter(Generic[T], AsyncSpecRegistry[T]):
+    """Exposes a SpecRegistry to async code.
+
+    Blocking registries are called in a worker thread. Concurrent `aget_by_id`
+    calls made in the same event loop iteration are coalesced into a single
+    `get_many` call on the wrapped registry.
+    """
+
+    def __init__(self, registry: SpecRegistry[T]):
+        self._registry = registry
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        # the loop keeps weak references to tasks, the adapter keeps loads alive
+        self._loads: set[asyncio.Task] = set()
+
+    @property
+    def registry(self) -> SpecRegistry[T]:
+        return self._registry
+
+    async def aget_by_id(self, id: str) -> T:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if not self._pending:
+            loop.call_soon(self._flush)
+        self._pending.setdefault(id, []).append(future)
+
+        return await future
+
+    async def aget_many(self, ids: Iterable[str]) -> dict[str, T]:
+        return await self._call(self._registry.get_many, list(ids))
+
+    async def asave_by_id(self, id: str, spec: T) -> None:
+        await self._call(self._registry.save_by_id, id, spec)
+
+    def _flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        task = asyncio.get_running_loop().create_task(self._load(pending))
+        self._loads.add(task)
+        task.add_done_callback(self._loads.discard)
+
+    async def _load(self, pending: dict[str, list[asyncio.Future]]) -> None:
+        try:
+            found = await self.aget_many(pending.keys())
+        except Exception as ex:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(ex)
+            return
+
+        for id, futures in pending.items():
+            for future in futures:
+                if future.done():
+                    continue
+                if id in found:
+                    future.set_result(found[id])
+                else:
+                    future.set_exception(KeyError(id))
+
+    async def _call(self, func, *args):
+        if self._registry.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
 
 __assignment_spec: SpecRegistry[AssignmentSpec] = None
+__async_assignment_spec: AsyncSpecRegistry[AssignmentSpec] = None
 
 
 class InMemmoryRegistry(Generic[T], SpecRegistry[T]):
@@ -28,7 +128,7 @@ class InMemmoryRegistry(Generic[T], SpecRegistry[T]):
     
     def __init__(self, registry: dict[str, T] = None):
         if registry is None:
-            self._registry = []
+            self._registry = {}
         else:
             self._registry = registry
 
@@ -58,10 +158,13 @@ class InMemmoryRegistry(Generic[T], SpecRegistry[T]):
 
     @classmethod
     def from_url(cls, class_type: type[BaseModel], path :HttpUrl) -> "InMemmoryRegistry[T]":
-        urllib.request.urlretrieve(str(path), "temp.json")
-        registry = cls.from_file(class_type, Path("temp.json"))
-        os.remove("temp.json")
-        return registry
+        init_dict = _fetch_json(path)
+        if not init_dict or not isinstance(init_dict, dict):
+            raise Exception(f"Url does not contain valid json")
+
+        return cls[class_type](
+            {key: class_type.model_validate(init_dict[key]) for key in init_dict}
+        )
     
     
 class StaticInMemmoryRegistry(Generic[T], SpecRegistry[T]):
@@ -69,7 +172,7 @@ class StaticInMemmoryRegistry(Generic[T], SpecRegistry[T]):
     
     def __init__(self, registry: dict[str, T]):
         if registry is None:
-            self._registry = []
+            self._registry = {}
         else:
             self._registry = registry
 
@@ -102,15 +205,180 @@ class StaticInMemmoryRegistry(Generic[T], SpecRegistry[T]):
 
     @classmethod
     def from_url(cls, class_type: type[BaseModel], path :HttpUrl) -> "StaticInMemmoryRegistry[T]":
-        urllib.request.urlretrieve(str(path), "temp.json")
-        registry = cls.from_file(class_type, Path("temp.json"))
-        os.remove("temp.json")
-        return registry
+        init_dict = _fetch_json(path)
+        if not init_dict or not isinstance(init_dict, dict):
+            raise Exception(f"Url does not contain valid json")
+
+        final_dict: dict[str, T] = {
+            key: class_type.model_validate(init_dict[key]) for key in init_dict
+        }
+        if not final_dict:
+            raise Exception(f"Cannot create StaticInMemmoryRegistry with empty registry contents")
+
+        return cls[class_type](final_dict)
     
 
-def set_assignment_registry(registry: SpecRegistry[AssignmentSpec]):
-   global __assignment_spec 
-   __assignment_spec = registry
+class SqliteSpecRegistry(Generic[T], SpecRegistry[T]):
+    """Registry persisted in SQLite as JSON, keyed by an indexed id.
+
+    Parsed specs are kept in a bounded LRU cache, so only the most used specs
+    live in memory as models.
+    """
+
+    blocking: bool = True
+
+    # sqlite default limit of host parameters in a single statement
+    _MAX_QUERY_PARAMETERS: int = 999
+
+    _cache: OrderedDict[str, T]
+
+    def __init__(
+        self,
+        class_type: type[BaseModel],
+        path: Path | str = ":memory:",
+        cache_size: int = 1024,
+    ):
+        self._class_type = class_type
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS specs "
+                "(id TEXT PRIMARY KEY, spec TEXT NOT NULL) WITHOUT ROWID"
+            )
+
+    def get_by_id(self, id: str) -> T:
+        with self._lock:
+            spec = self._get_cached(id)
+            if spec is not None:
+                return spec
+
+            row = self._connection.execute(
+                "SELECT spec FROM specs WHERE id = ?", (id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(id)
+
+            spec = self._class_type.model_validate_json(row[0])
+            self._put_cached(id, spec)
+            return spec
+
+    def get_many(self, ids: Iterable[str]) -> dict[str, T]:
+        result: dict[str, T] = {}
+        with self._lock:
+            missing: list[str] = []
+            for id in dict.fromkeys(ids):
+                spec = self._get_cached(id)
+                if spec is None:
+                    missing.append(id)
+                else:
+                    result[id] = spec
+
+            for i in range(0, len(missing), self._MAX_QUERY_PARAMETERS):
+                chunk = missing[i : i + self._MAX_QUERY_PARAMETERS]
+                rows = self._connection.execute(
+                    f"SELECT id, spec FROM specs WHERE id IN ({",".join("?" * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for id, raw in rows:
+                    spec = self._class_type.model_validate_json(raw)
+                    self._put_cached(id, spec)
+                    result[id] = spec
+
+        return result
+
+    def save_by_id(self, id: str, spec: T) -> None:
+        self.save_many({id: spec})
+
+    def save_many(self, specs: dict[str, T]) -> None:
+        rows = [(id, spec.model_dump_json(by_alias=True)) for id, spec in specs.items()]
+        with self._lock:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO specs (id, spec) VALUES (?, ?)", rows
+                )
+            for id, spec in specs.items():
+                self._put_cached(id, spec)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM specs").fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _get_cached(self, id: str) -> T | None:
+        spec = self._cache.get(id)
+        if spec is not None:
+            self._cache.move_to_end(id)
+        return spec
+
+    def _put_cached(self, id: str, spec: T) -> None:
+        if self._cache_size <= 0:
+            return
+        self._cache[id] = spec
+        self._cache.move_to_end(id)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    @classmethod
+    def from_file(
+        cls,
+        class_type: type[BaseModel],
+        path: Path,
+        db_path: Path | str = ":memory:",
+        cache_size: int = 1024,
+    ) -> "SqliteSpecRegistry[T]":
+        if not path.is_file():
+            raise Exception(f"path {path} not a file")
+
+        init_dict = None
+        with path.open() as file:
+            init_dict = json.load(file)
+
+        if not init_dict or not isinstance(init_dict, dict):
+            raise Exception(f"File does not contain valid json")
+
+        registry = cls[class_type](class_type, db_path, cache_size)
+        rows = [
+            (key, class_type.model_validate(value).model_dump_json(by_alias=True))
+            for key, value in init_dict.items()
+        ]
+        with registry._lock, registry._connection:
+            registry._connection.executemany(
+                "INSERT OR REPLACE INTO specs (id, spec) VALUES (?, ?)", rows
+            )
+
+        return registry
+
+
+def _fetch_json(path: HttpUrl) -> Any:
+    response = httpx.get(str(path), follow_redirects=True)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+
+def set_assignment_registry(
+   registry: SpecRegistry[AssignmentSpec] | AsyncSpecRegistry[AssignmentSpec],
+):
+   """Sets the registry of assignment specs.
+
+   An async only registry serves async lookups only, sync lookups then raise.
+   """
+   global __assignment_spec, __async_assignment_spec
+   if isinstance(registry, SpecRegistry):
+       __assignment_spec = registry
+       if isinstance(registry, AsyncSpecRegistry):
+           __async_assignment_spec = registry
+       else:
+           __async_assignment_spec = AsyncSpecRegistryAdapter[AssignmentSpec](registry)
+   elif isinstance(registry, AsyncSpecRegistry):
+       __assignment_spec = None
+       __async_assignment_spec = registry
+   else:
+       raise TypeError(f"Not a spec registry: {type(registry).__name__}")
 
 
 def get_assignment_by_id(id :str) -> AssignmentSpec:
@@ -126,3 +394,37 @@ def save_assignment(id :str, spec: AssignmentSpec) -> None:
     
     __assignment_spec.save_by_id(id, spec)
 
+
+def get_assignments_by_ids(ids: Iterable[str]) -> dict[str, AssignmentSpec]:
+    if __assignment_spec is None:
+        raise Exception("AssignmentSpec registry not set")
+
+    return __assignment_spec.get_many(ids)
+
+
+def save_assignments(specs: dict[str, AssignmentSpec]) -> None:
+    if __assignment_spec is None:
+        raise Exception("AssignmentSpec registry not set")
+
+    __assignment_spec.save_many(specs)
+
+
+async def aget_assignment_by_id(id: str) -> AssignmentSpec:
+    if __async_assignment_spec is None:
+        raise Exception("AssignmentSpec registry not set")
+
+    return await __async_assignment_spec.aget_by_id(id)
+
+
+async def aget_assignments_by_ids(ids: Iterable[str]) -> dict[str, AssignmentSpec]:
+    if __async_assignment_spec is None:
+        raise Exception("AssignmentSpec registry not set")
+
+    return await __async_assignment_spec.aget_many(ids)
+
+
+async def asave_assignment(id: str, spec: AssignmentSpec) -> None:
+    if __async_assignment_spec is None:
+        raise Exception("AssignmentSpec registry not set")
+
+    await __async_assignment_spec.asave_by_id(id, spec)
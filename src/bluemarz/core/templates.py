@@ -0,0 +1,135 @@
+from collections import OrderedDict
+import copy
+import threading
+from typing import Any
+
+from bluemarz.core import spec_registry
+from bluemarz.core.models import AgentSpec, AssignmentSpec, SessionSpec, ToolSpec
+from bluemarz.core.parameters import ParameterTemplate
+from bluemarz.utils import metrics
+
+
+class AssignmentTemplate:
+    """Assignment spec compiled once and reused to build many assignments.
+
+    The source spec is copied and never modified. Merged parameters and the
+    agent tool list are resolved at compile time and request parameters are
+    laid over them. Specs and parameters are returned as deep copies, so an
+    assignment changing its own never changes the template or other assignments.
+    """
+
+    def __init__(self, spec: AssignmentSpec, id: str | None = None):
+        self.id = id
+        self._spec = spec.model_copy(deep=True)
+        self._tools: list[ToolSpec] = [
+            *self._spec.agent.tools,
+            *(self._spec.additional_tools or []),
+        ]
+        self._agent_parameters = ParameterTemplate.compile(
+            self._spec.agent.parameters
+        )
+        self._tool_parameters = [
+            ParameterTemplate.compile(t.parameters) for t in self._tools
+        ]
+        self._session_parameters = ParameterTemplate.compile(
+            self._spec.session.parameters if self._spec.session else None
+        )
+        self._agent = self._resolve_agent(self._spec.parameters)
+
+    @classmethod
+    def compile(
+        cls, spec: AssignmentSpec, id: str | None = None
+    ) -> "AssignmentTemplate":
+        return cls(spec, id)
+
+    @property
+    def spec(self) -> AssignmentSpec:
+        return self._spec
+
+    def parameters(self, overlay: dict[str, Any] | None = None) -> dict[str, Any]:
+        return copy.deepcopy(self._parameters(overlay))
+
+    def agent_spec(self, overlay: dict[str, Any] | None = None) -> AgentSpec:
+        return self._agent_spec(overlay).model_copy(deep=True)
+
+    def session_spec(
+        self,
+        session: SessionSpec | None = None,
+        overlay: dict[str, Any] | None = None,
+    ) -> SessionSpec:
+        parameters = self._parameters(overlay)
+        agent = self._agent_spec(overlay)
+        if session is not None:
+            session_parameters = ParameterTemplate.compile(session.parameters)
+        else:
+            session = self._spec.session or SessionSpec()
+            session_parameters = self._session_parameters
+        update: dict[str, Any] = {}
+
+        if agent.session_type == "NativeSession":
+            if not session.api_key:
+                update["api_key"] = agent.api_key
+
+            update["parameters"] = session_parameters.merge(
+                self._agent_parameters.merge(parameters)
+            )
+            update["type"] = agent.type + "NativeSession"
+        else:
+            update["parameters"] = session_parameters.merge(parameters)
+            if not session.type:
+                update["type"] = agent.session_type
+
+        return session.model_copy(update=copy.deepcopy(update), deep=True)
+
+    def _parameters(self, overlay: dict[str, Any] | None) -> dict[str, Any]:
+        if not overlay:
+            return self._spec.parameters
+        return self._spec.parameters | overlay
+
+    def _agent_spec(self, overlay: dict[str, Any] | None) -> AgentSpec:
+        if not overlay:
+            return self._agent
+        return self._resolve_agent(self._parameters(overlay))
+
+    def _resolve_agent(self, parameters: dict[str, Any]) -> AgentSpec:
+        return self._spec.agent.model_copy(
+            update={
+                "parameters": self._agent_parameters.merge(parameters),
+                "tools": [
+                    t.model_copy(update={"parameters": template.merge(parameters)})
+                    for t, template in zip(self._tools, self._tool_parameters)
+                ],
+            }
+        )
+
+
+_TEMPLATE_CACHE_SIZE: int = 1024
+_templates: OrderedDict[str, tuple[AssignmentSpec, AssignmentTemplate]] = OrderedDict()
+_templates_lock = threading.Lock()
+
+
+async def get_assignment_template(id: str) -> AssignmentTemplate:
+    """Returns the compiled template of a registry assignment spec.
+
+    Templates are cached by id and compiled again when the registry returns a
+    different spec object, e.g. after a save or a reload.
+    """
+    spec = await spec_registry.aget_assignment_by_id(id)
+
+    with _templates_lock:
+        cached = _templates.get(id)
+        if cached is not None and cached[0] is spec:
+            _templates.move_to_end(id)
+            metrics.CACHE_REQUESTS.inc(cache="template", result="hit")
+            return cached[1]
+
+    metrics.CACHE_REQUESTS.inc(cache="template", result="miss")
+
+    template = AssignmentTemplate.compile(spec, id)
+    with _templates_lock:
+        _templates[id] = (spec, template)
+        _templates.move_to_end(id)
+        while len(_templates) > _TEMPLATE_CACHE_SIZE:
+            _templates.popitem(last=False)
+
+    return template
@@ -0,0 +1,438 @@
+import asyncio
+import logging
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, NamedTuple
+import uuid
+
+import orjson
+
+from bluemarz.core.assignments import (
+    Assignment,
+    _execute_sync_tool_call,
+    _tool_can_be_sync_called,
+)
+from bluemarz.core.exceptions import InvalidDefinition
+from bluemarz.core.interfaces import AsyncTool
+from bluemarz.core.models import (
+    AssignmentRunResult,
+    PartialAssignmentRunResult,
+    RunResultType,
+    ToolCall,
+    ToolCallResult,
+)
+
+
+class ToolJob(NamedTuple):
+    id: int
+    group_id: str
+    tool_call: ToolCall
+    attempts: int
+
+
+class ToolJobGroup(NamedTuple):
+    id: str
+    snapshot: str
+    parameters: dict[str, Any]
+
+
+class ToolJobQueue:
+    """Tool calls waiting for execution, persisted in SQLite.
+
+    Calls are grouped by the assignment run that made them. A group is ready
+    to resume once every call in it has a result. Jobs and groups claimed by
+    a process that died are released again by `recover`.
+    """
+
+    def __init__(self, path: Path | str = ":memory:"):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript(
+                "CREATE TABLE IF NOT EXISTS tool_groups ("
+                " id TEXT PRIMARY KEY, snapshot TEXT NOT NULL,"
+                " parameters TEXT NOT NULL, status TEXT NOT NULL,"
+                " result TEXT);"
+                "CREATE TABLE IF NOT EXISTS tool_jobs ("
+                " id INTEGER PRIMARY KEY, group_id TEXT NOT NULL,"
+                " tool_call TEXT NOT NULL, status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " available_at REAL NOT NULL DEFAULT 0, result TEXT);"
+                "CREATE INDEX IF NOT EXISTS tool_jobs_status"
+                " ON tool_jobs (status, available_at);"
+                "CREATE INDEX IF NOT EXISTS tool_jobs_group ON tool_jobs (group_id);"
+            )
+
+    def add_group(
+        self,
+        group_id: str,
+        snapshot: str,
+        parameters: dict[str, Any],
+        tool_calls: list[ToolCall],
+        results: dict[str, str] | None = None,
+    ) -> None:
+        """Stores a group of tool calls, those with `results` by id already done."""
+        results = results or {}
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO tool_groups (id, snapshot, parameters, status)"
+                " VALUES (?, ?, ?, 'waiting')",
+                (group_id, snapshot, orjson.dumps(parameters, default=str)),
+            )
+            self._connection.executemany(
+                "INSERT INTO tool_jobs (group_id, tool_call, status, result)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        group_id,
+                        tc.model_dump_json(by_alias=True, exclude_none=True),
+                        "done" if tc.id in results else "pending",
+                        results.get(tc.id),
+                    )
+                    for tc in tool_calls
+                ],
+            )
+
+    def claim_job(self) -> ToolJob | None:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "UPDATE tool_jobs SET status = 'running', attempts = attempts + 1"
+                " WHERE id = (SELECT id FROM tool_jobs WHERE status = 'pending'"
+                " AND available_at <= ? ORDER BY id LIMIT 1)"
+                " RETURNING id, group_id, tool_call, attempts",
+                (time.time(),),
+            ).fetchone()
+        if row is None:
+            return None
+        return ToolJob(row[0], row[1], ToolCall.model_validate_json(row[2]), row[3])
+
+    def complete_job(self, job_id: int, text: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE tool_jobs SET status = 'done', result = ? WHERE id = ?",
+                (text, job_id),
+            )
+
+    def retry_job(self, job_id: int, delay: float) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE tool_jobs SET status = 'pending', available_at = ?"
+                " WHERE id = ?",
+                (time.time() + delay, job_id),
+            )
+
+    def claim_ready_group(self) -> ToolJobGroup | None:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "UPDATE tool_groups SET status = 'resuming'"
+                " WHERE id = (SELECT g.id FROM tool_groups g WHERE g.status = 'waiting'"
+                " AND NOT EXISTS (SELECT 1 FROM tool_jobs j WHERE j.group_id = g.id"
+                " AND j.status != 'done') LIMIT 1)"
+                " RETURNING id, snapshot, parameters"
+            ).fetchone()
+        if row is None:
+            return None
+        return ToolJobGroup(row[0], row[1], orjson.loads(row[2]))
+
+    def get_results(self, group_id: str) -> list[ToolCallResult]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT tool_call, result FROM tool_jobs WHERE group_id = ? ORDER BY id",
+                (group_id,),
+            ).fetchall()
+        return [
+            ToolCallResult(tool_call=ToolCall.model_validate_json(tc), text=text)
+            for tc, text in rows
+        ]
+
+    def finish_group(self, group_id: str, status: str, result: str) -> None:
+        """Closes a group as `finished`, `failed` or `continued` in another group."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE tool_groups SET status = ?, result = ? WHERE id = ?",
+                (status, result, group_id),
+            )
+            self._connection.execute(
+                "DELETE FROM tool_jobs WHERE group_id = ?", (group_id,)
+            )
+
+    def get_group_status(self, group_id: str) -> tuple[str, str | None] | None:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT status, result FROM tool_groups WHERE id = ?", (group_id,)
+            ).fetchone()
+
+    def recover(self) -> None:
+        """Releases the jobs and groups left running by a previous process."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE tool_jobs SET status = 'pending' WHERE status = 'running'"
+            )
+            self._connection.execute(
+                "UPDATE tool_groups SET status = 'waiting' WHERE status = 'resuming'"
+            )
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM tool_jobs WHERE status != 'done'"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class AsyncToolRuntime:
+    """Runs async tool calls in a worker pool and resumes their assignments.
+
+    `enqueue` stores the tool calls of an assignment with its snapshot, so the
+    calling request does not wait for them. Workers run the registered
+    `AsyncTool`s, retrying failures with exponential backoff; after
+    `max_attempts` the error is given to the agent as the tool result. Sync
+    tool calls made in the same round run at once, in `enqueue`. When
+    every call of a run has a result, the assignment is resumed from its
+    snapshot and run again, and new async tool calls are enqueued in turn.
+
+    Assignments must be built from the assignment registry and a snapshot
+    secret must be set, see `Assignment.snapshot`.
+    """
+
+    def __init__(
+        self,
+        queue: ToolJobQueue,
+        workers: int = 4,
+        max_attempts: int = 3,
+        retry_delay: float = 1,
+        poll_interval: float = 0.5,
+        on_result: Callable[[str, AssignmentRunResult], Awaitable[None]] | None = None,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        self._queue = queue
+        self._workers = workers
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._poll_interval = poll_interval
+        self._on_result = on_result
+        self._tools: dict[str, AsyncTool] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._waiters: dict[str, asyncio.Future] = {}
+
+    def register(self, *tools: AsyncTool) -> None:
+        for tool in tools:
+            self._tools[tool.spec.name] = tool
+
+    async def enqueue(self, assignment: Assignment) -> str:
+        """Stores the tool calls of the last run of `assignment`.
+
+        Returns the id of the job group, which `wait` accepts.
+        """
+        result = assignment.last_result
+        if result is None or result.result_type != RunResultType.TOOL_CALL:
+            raise InvalidDefinition("Assignment has no tool calls to run")
+        if not assignment.template_id:
+            raise InvalidDefinition("Only registry assignments can run async tools")
+
+        group_id = uuid.uuid4().hex
+        await asyncio.to_thread(
+            self._queue.add_group,
+            group_id,
+            assignment.snapshot(),
+            assignment.params,
+            result.tool_calls,
+            await self._run_sync_tool_calls(assignment, result.tool_calls),
+        )
+        self._wakeup.set()
+        return group_id
+
+    async def run(self, assignment: Assignment) -> AssignmentRunResult | str:
+        """Runs `assignment` until a breakpoint, enqueueing async tool calls.
+
+        Returns the result, or the job group id when tools were enqueued.
+        Partial results are returned as they are, their runs were cancelled.
+        """
+        result = await assignment.run_until_breakpoint()
+        if (
+            not isinstance(result, PartialAssignmentRunResult)
+            and result.last_run_result.result_type == RunResultType.TOOL_CALL
+        ):
+            return await self.enqueue(assignment)
+        return result
+
+    async def wait(self, group_id: str) -> AssignmentRunResult:
+        """Waits until the assignment of `group_id` reaches a final result.
+
+        Groups resumed by this runtime wake the waiter at once; groups resumed
+        by another process sharing the queue are seen every `poll_interval`.
+        """
+        while True:
+            # registered before reading the status, so a finish in between wakes it
+            future = self._waiters.get(group_id)
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                self._waiters[group_id] = future
+
+            row = await asyncio.to_thread(self._queue.get_group_status, group_id)
+            if row is None:
+                self._waiters.pop(group_id, None)
+                raise KeyError(group_id)
+
+            status, result = row
+            if status in ("finished", "failed", "continued"):
+                self._wake_waiters(group_id)
+            if status == "finished":
+                return AssignmentRunResult.model_validate_json(result)
+            if status == "failed":
+                raise InvalidDefinition(f"Assignment of {group_id} failed: {result}")
+            if status == "continued":
+                group_id = result
+                continue
+
+            await asyncio.wait([future], timeout=self._poll_interval)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue.recover()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self._workers)]
+        self._tasks.append(loop.create_task(self._resume_ready()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _next_job(self) -> ToolJob:
+        while True:
+            job = await asyncio.to_thread(self._queue.claim_job)
+            if job is not None:
+                return job
+            await self._sleep()
+
+    async def _sleep(self) -> None:
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self._poll_interval)
+        except TimeoutError:
+            pass
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._next_job()
+            name = _get_tool_name(job.tool_call)
+            tool = self._tools.get(name)
+            try:
+                if tool is None:
+                    raise InvalidDefinition(f"No async tool registered for {name}")
+                result: ToolCallResult = await tool.call(job.tool_call)
+                text = result.text
+            except Exception as ex:
+                if job.attempts < self._max_attempts and tool is not None:
+                    logging.info(f"Retrying tool call {job.tool_call.id}: {ex}")
+                    await asyncio.to_thread(
+                        self._queue.retry_job,
+                        job.id,
+                        self._retry_delay * 2 ** (job.attempts - 1),
+                    )
+                    continue
+                logging.error(f"Tool call {job.tool_call.id} failed: {ex}")
+                text = f"Error: {ex}"
+
+            await asyncio.to_thread(self._queue.complete_job, job.id, text)
+            self._wakeup.set()
+
+    async def _resume_ready(self) -> None:
+        while True:
+            group = await asyncio.to_thread(self._queue.claim_ready_group)
+            if group is None:
+                await self._sleep()
+                continue
+
+            try:
+                outcome = await self._resume(group)
+            except Exception as ex:
+                logging.error(f"Error resuming assignment of {group.id}: {ex}")
+                await asyncio.to_thread(
+                    self._queue.finish_group, group.id, "failed", str(ex)
+                )
+                self._wake_waiters(group.id)
+                continue
+
+            if isinstance(outcome, str):
+                # the assignment called async tools again, waiters follow the new group
+                await asyncio.to_thread(
+                    self._queue.finish_group, group.id, "continued", outcome
+                )
+                self._wake_waiters(group.id)
+                continue
+
+            await asyncio.to_thread(
+                self._queue.finish_group,
+                group.id,
+                "finished",
+                outcome.model_dump_json(by_alias=True, exclude_none=True),
+            )
+            if self._on_result is not None:
+                try:
+                    await self._on_result(group.id, outcome)
+                except Exception as ex:
+                    logging.error(f"Error handling result of {group.id}: {ex}")
+            self._wake_waiters(group.id)
+
+    async def _run_sync_tool_calls(
+        self, assignment: Assignment, tool_calls: list[ToolCall]
+    ) -> dict[str, str]:
+        # rounds mixing sync and async calls leave the sync ones to the runtime
+        tools = {t.spec.name: t for t in assignment.agent.tools}
+        sync_calls = [
+            tc
+            for tc in tool_calls
+            if tc.tool is not None
+            and tc.tool.name in tools
+            and _tool_can_be_sync_called(tools[tc.tool.name])
+        ]
+        outcomes = await asyncio.gather(
+            *[_execute_sync_tool_call(tc, tools[tc.tool.name]) for tc in sync_calls],
+            return_exceptions=True,
+        )
+        results: dict[str, str] = {}
+        for tool_call, outcome in zip(sync_calls, outcomes):
+            if isinstance(outcome, BaseException):
+                logging.error(f"Tool call {tool_call.id} failed: {outcome}")
+                results[tool_call.id] = f"Error: {outcome}"
+            else:
+                results[tool_call.id] = outcome.text
+        return results
+
+    async def _resume(self, group: ToolJobGroup) -> AssignmentRunResult | str:
+        assignment = await Assignment.resume(group.snapshot, parameters=group.parameters)
+        results = await asyncio.to_thread(self._queue.get_results, group.id)
+
+        submitted = False
+        if assignment.run_id:
+            try:
+                await assignment.submit_tool_calls(results)
+                submitted = True
+            except Exception as ex:
+                # the deferred run expired, answer in a new run instead
+                logging.info(f"Could not submit to run {assignment.run_id}: {ex}")
+                assignment.run_id = None
+
+        if not submitted:
+            await assignment.add_tool_call_results(results)
+        return await self.run(assignment)
+
+    def _wake_waiters(self, group_id: str) -> None:
+        # waiters read the outcome from the queue, the future only wakes them
+        future = self._waiters.pop(group_id, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+
+def _get_tool_name(tool_call: ToolCall) -> str | None:
+    return tool_call.tool.name if tool_call.tool else tool_call.tool_name
@@ -0,0 +1,91 @@
+import threading
+from typing import NamedTuple
+
+from bluemarz.core.models import TokenUsage
+
+
+class UsageKey(NamedTuple):
+    agent_id: str
+    model: str | None
+    tenant: str | None
+
+
+class UsageAggregator:
+    """Sums the token usage of the assignments run in this process.
+
+    Usage is kept per agent, model and tenant. Tenants with a budget set are
+    over budget once their total tokens reach it, after which their
+    assignments stop before the next tool round.
+    """
+
+    def __init__(self, budgets: dict[str, int] | None = None):
+        self._usage: dict[UsageKey, TokenUsage] = {}
+        self._tenants: dict[str | None, int] = {}
+        self._budgets: dict[str, int] = dict(budgets or {})
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        agent_id: str,
+        model: str | None,
+        tenant: str | None,
+        usage: TokenUsage,
+    ) -> None:
+        key = UsageKey(agent_id, model, tenant)
+        with self._lock:
+            self._usage[key] = usage + self._usage.get(key)
+            self._tenants[tenant] = self._tenants.get(tenant, 0) + usage.total_tokens
+
+    def set_budget(self, tenant: str, max_total_tokens: int | None) -> None:
+        with self._lock:
+            if max_total_tokens is None:
+                self._budgets.pop(tenant, None)
+            else:
+                self._budgets[tenant] = max_total_tokens
+
+    def has_budget(self, tenant: str | None) -> bool:
+        return tenant in self._budgets
+
+    def is_over_budget(self, tenant: str | None) -> bool:
+        budget = self._budgets.get(tenant)
+        return budget is not None and self._tenants.get(tenant, 0) >= budget
+
+    def total(self) -> TokenUsage:
+        return sum(self.usage().values(), TokenUsage())
+
+    def usage(self) -> dict[UsageKey, TokenUsage]:
+        with self._lock:
+            return dict(self._usage)
+
+    def by_agent(self) -> dict[str, TokenUsage]:
+        return self._group(lambda key: key.agent_id)
+
+    def by_model(self) -> dict[str | None, TokenUsage]:
+        return self._group(lambda key: key.model)
+
+    def by_tenant(self) -> dict[str | None, TokenUsage]:
+        return self._group(lambda key: key.tenant)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._usage.clear()
+            self._tenants.clear()
+
+    def _group(self, get_key) -> dict:
+        groups: dict = {}
+        for key, usage in self.usage().items():
+            group = get_key(key)
+            groups[group] = usage + groups.get(group)
+        return groups
+
+
+_aggregator: UsageAggregator | None = None
+
+
+def set_usage_aggregator(aggregator: UsageAggregator | None) -> None:
+    global _aggregator
+    _aggregator = aggregator
+
+
+def get_usage_aggregator() -> UsageAggregator | None:
+    return _aggregator
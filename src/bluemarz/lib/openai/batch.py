@@ -0,0 +1,278 @@
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+import json
+import logging
+from typing import Any, NamedTuple
+
+import orjson
+
+from bluemarz.core.middleware import apply_api_key_middleware
+from bluemarz.core.models import (
+    AgentSpec,
+    AssignmentRunResult,
+    AssignmentSpec,
+    ToolSpec,
+)
+from bluemarz.lib.openai import client
+from bluemarz.lib.openai.chat import create_chat_messages, create_run_result
+from bluemarz.lib.openai.components import OpenAiAssistantTool
+from bluemarz.lib.openai.models import (
+    Batch,
+    ChatCompletion,
+    OpenAiAssistantSpec,
+    OpenAiAssistantToolType,
+)
+from bluemarz.utils.model_utils import to_dict as _to_dict
+
+CHAT_COMPLETIONS_ENDPOINT: str = "/v1/chat/completions"
+FINAL_BATCH_STATUSES: frozenset[str] = frozenset(
+    {"completed", "failed", "expired", "cancelled"}
+)
+# api limits of a single batch input file
+_MAX_BATCH_REQUESTS: int = 50_000
+_MAX_BATCH_BYTES: int = 190 * 1024 * 1024
+
+
+class BatchJob(NamedTuple):
+    api_key: str
+    batch: Batch
+
+
+class BatchResult(NamedTuple):
+    custom_id: str
+    result: AssignmentRunResult | None
+    error: str | None = None
+
+
+class BatchAssignmentRunner:
+    """Runs assignments through the Batch API instead of interactive runs.
+
+    The Batch API does not accept assistant runs, so every spec becomes a
+    chat completion request with the assistant model, instructions and
+    function tools, followed by the session messages and the query. Threads
+    are not used: a spec with a session id is sent without its history.
+    Results are returned as assignment results whose session id is the
+    request custom id. Tool calls are returned, not executed.
+    """
+
+    def __init__(
+        self,
+        completion_window: str = "24h",
+        poll_interval: float = 60,
+        max_batch_requests: int = _MAX_BATCH_REQUESTS,
+    ):
+        self._completion_window = completion_window
+        self._poll_interval = poll_interval
+        self._max_batch_requests = max_batch_requests
+        self._assistants: dict[tuple[str, str], OpenAiAssistantSpec] = {}
+        self._agent_tools: dict[tuple[str, str], dict[str, ToolSpec]] = {}
+        # tool maps by batch id and custom id, custom ids repeat across batches
+        self._request_tools: dict[str, dict[str, dict[str, ToolSpec]]] = {}
+
+    async def submit(
+        self,
+        specs: Iterable[AssignmentSpec | tuple[str, AssignmentSpec]]
+        | AsyncIterable[AssignmentSpec | tuple[str, AssignmentSpec]],
+    ) -> list[BatchJob]:
+        """Writes the specs as JSONL batch files and creates their batches.
+
+        Specs may come with a custom id, the default is their position. One
+        batch is created per api key and per api batch size limit.
+        """
+        jobs: list[BatchJob] = []
+        lines: dict[str, list[bytes]] = {}
+        sizes: dict[str, int] = {}
+        tools: dict[str, dict[str, dict[str, ToolSpec]]] = {}
+
+        index = 0
+        async for item in _aiter(specs):
+            custom_id, spec = item if isinstance(item, tuple) else (str(index), item)
+            index += 1
+
+            api_key = apply_api_key_middleware(spec.agent.api_key)
+            request, request_tools = await self._create_request(custom_id, api_key, spec)
+            line = orjson.dumps(request)
+            if (
+                len(lines.get(api_key, ())) >= self._max_batch_requests
+                or sizes.get(api_key, 0) + len(line) > _MAX_BATCH_BYTES
+            ):
+                jobs.append(
+                    await self._create_batch(
+                        api_key, lines.pop(api_key), tools.pop(api_key)
+                    )
+                )
+                sizes.pop(api_key)
+
+            lines.setdefault(api_key, []).append(line)
+            sizes[api_key] = sizes.get(api_key, 0) + len(line) + 1
+            tools.setdefault(api_key, {})[custom_id] = request_tools
+
+        for api_key, key_lines in lines.items():
+            jobs.append(await self._create_batch(api_key, key_lines, tools[api_key]))
+
+        return jobs
+
+    async def wait(self, job: BatchJob) -> BatchJob:
+        batch = job.batch
+        while batch.status not in FINAL_BATCH_STATUSES:
+            await asyncio.sleep(self._poll_interval)
+            batch = await client.get_batch(job.api_key, batch.id)
+        return BatchJob(job.api_key, batch)
+
+    async def results(self, job: BatchJob) -> AsyncIterator[BatchResult]:
+        """Yields the result of every request of a finished batch."""
+        batch = job.batch
+        if batch.output_file_id:
+            content = await client.get_file_content(job.api_key, batch.output_file_id)
+            for line in content.splitlines():
+                if line.strip():
+                    yield self._create_result(batch.id, orjson.loads(line))
+
+        if batch.error_file_id:
+            content = await client.get_file_content(job.api_key, batch.error_file_id)
+            for line in content.splitlines():
+                if line.strip():
+                    yield self._create_result(batch.id, orjson.loads(line))
+
+    async def run(
+        self,
+        specs: Iterable[AssignmentSpec | tuple[str, AssignmentSpec]]
+        | AsyncIterable[AssignmentSpec | tuple[str, AssignmentSpec]],
+    ) -> AsyncIterator[BatchResult]:
+        """Submits the specs, waits for their batches and yields the results."""
+        jobs = await self.submit(specs)
+        for finished in asyncio.as_completed([self.wait(job) for job in jobs]):
+            job = await finished
+            if job.batch.status != "completed":
+                logging.warning(f"Batch {job.batch.id} ended as {job.batch.status}")
+            async for result in self.results(job):
+                yield result
+
+    async def _create_batch(
+        self,
+        api_key: str,
+        lines: list[bytes],
+        tools: dict[str, dict[str, ToolSpec]],
+    ) -> BatchJob:
+        file = await client.upload_file_content(
+            api_key, b"\n".join(lines) + b"\n", "assignments.jsonl", "batch"
+        )
+        batch = await client.create_batch(
+            api_key,
+            file.id,
+            endpoint=CHAT_COMPLETIONS_ENDPOINT,
+            completion_window=self._completion_window,
+        )
+        self._request_tools[batch.id] = tools
+        return BatchJob(api_key, batch)
+
+    async def _get_assistant(
+        self, api_key: str, agent: AgentSpec
+    ) -> OpenAiAssistantSpec | None:
+        # specs with their own model and prompt do not need the assistant
+        if agent.model and agent.prompt:
+            return None
+
+        key = (api_key, agent.id)
+        assistant = self._assistants.get(key)
+        if assistant is None:
+            assistant = await client.get_assistant(api_key, agent.id)
+            self._assistants[key] = assistant
+        return assistant
+
+    async def _create_request(
+        self, custom_id: str, api_key: str, spec: AssignmentSpec
+    ) -> tuple[dict[str, Any], dict[str, ToolSpec]]:
+        assistant = await self._get_assistant(api_key, spec.agent)
+        body: dict[str, Any] = {
+            "model": spec.agent.model or assistant.model,
+            "messages": _create_messages(spec, assistant),
+        }
+
+        tools = self._get_tools(api_key, spec)
+        function_tools = [
+            _to_dict(t.openai_tool)
+            for t in map(OpenAiAssistantTool.from_spec, tools.values())
+            if t.openai_tool.type == OpenAiAssistantToolType.FUNCTION
+        ]
+        if function_tools:
+            body["tools"] = function_tools
+
+        if assistant is not None:
+            if assistant.temperature is not None:
+                body["temperature"] = assistant.temperature
+            if assistant.top_p is not None:
+                body["top_p"] = assistant.top_p
+            if isinstance(assistant.response_format, dict):
+                body["response_format"] = assistant.response_format
+
+        request = {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": CHAT_COMPLETIONS_ENDPOINT,
+            "body": body,
+        }
+        return request, tools
+
+    def _get_tools(self, api_key: str, spec: AssignmentSpec) -> dict[str, ToolSpec]:
+        if spec.additional_tools:
+            return {t.name: t for t in [*spec.agent.tools, *spec.additional_tools]}
+
+        # requests of the same agent share its tool map
+        key = (api_key, spec.agent.id)
+        tools = self._agent_tools.get(key)
+        if tools is None:
+            tools = {t.name: t for t in spec.agent.tools}
+            self._agent_tools[key] = tools
+        return tools
+
+    def _create_result(self, batch_id: str, line: dict[str, Any]) -> BatchResult:
+        custom_id: str = line["custom_id"]
+        batch_tools = self._request_tools.get(batch_id, {})
+        tools = batch_tools.pop(custom_id, {})
+        if not batch_tools:
+            self._request_tools.pop(batch_id, None)
+        response = line.get("response") or {}
+
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or response.get("body", {}).get("error")
+            return BatchResult(custom_id, None, json.dumps(error))
+
+        completion = ChatCompletion.model_validate(response["body"])
+        run_result = create_run_result(completion, tools)
+        return BatchResult(
+            custom_id,
+            AssignmentRunResult(
+                session_id=custom_id,
+                last_run_result=run_result,
+                run_id=completion.id,
+                usage=run_result.usage,
+            ),
+        )
+
+
+def _create_messages(
+    spec: AssignmentSpec, assistant: OpenAiAssistantSpec | None
+) -> list[dict[str, str]]:
+    messages: list[dict[str, str]] = []
+    instructions = spec.agent.prompt or (assistant.instructions if assistant else None)
+    if instructions:
+        messages.append({"role": "system", "content": instructions})
+
+    history = spec.session.messages if spec.session else []
+    messages.extend(create_chat_messages(history))
+
+    query = spec.query or (None if history else spec.agent.default_query)
+    if query:
+        messages.append({"role": "user", "content": query})
+
+    return messages
+
+
+async def _aiter(items: Iterable | AsyncIterable) -> AsyncIterator:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
@@ -0,0 +1,452 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import json
+import logging
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Any, Self
+import uuid
+
+import orjson
+
+from bluemarz.core.class_registry import ai_agent, ai_session, assignment_executor
+from bluemarz.core.interfaces import Agent, AssignmentExecutor, Session, ToolDefinition
+from bluemarz.core.middleware import apply_api_key_middleware
+from bluemarz.core.models import (
+    AddFileResult,
+    AddMessageResult,
+    AgentSpec,
+    ContextBudget,
+    ContextReport,
+    DeleteSessionResult,
+    MessageRole,
+    RunResult,
+    RunResultType,
+    SessionFile,
+    SessionMessage,
+    SessionSpec,
+    ToolCall,
+    ToolCallResult,
+    ToolSpec,
+)
+from bluemarz.lib.openai import client
+from bluemarz.lib.openai.components import (
+    OpenAiAssistantTool,
+    create_token_usage,
+    estimate_tokens,
+)
+from bluemarz.lib.openai.models import ChatCompletion, OpenAiAssistantToolType
+from bluemarz.utils.model_utils import to_dict as _to_dict
+
+ChatMessage = dict[str, Any]
+
+_CHAT_ROLES: dict[MessageRole, str] = {
+    MessageRole.AGENT: "assistant",
+    MessageRole.SYSTEM: "system",
+    MessageRole.USER: "user",
+}
+
+
+class ChatSessionStore(ABC):
+    """Keeps the chat completion messages of each session."""
+
+    @abstractmethod
+    def get_messages(self, session_id: str) -> list[ChatMessage]:
+        pass
+
+    @abstractmethod
+    def append(self, session_id: str, messages: list[ChatMessage]) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        pass
+
+
+class InMemoryChatSessionStore(ChatSessionStore):
+    """Keeps the history of the `max_sessions` most recently used sessions."""
+
+    _sessions: OrderedDict[str, list[ChatMessage]]
+
+    def __init__(self, max_sessions: int = 1024):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be positive")
+        self._max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_messages(self, session_id: str) -> list[ChatMessage]:
+        with self._lock:
+            messages = self._sessions.get(session_id)
+            if messages is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(messages)
+
+    def append(self, session_id: str, messages: list[ChatMessage]) -> None:
+        with self._lock:
+            self._sessions.setdefault(session_id, []).extend(messages)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self._max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SqliteChatSessionStore(ChatSessionStore):
+    def __init__(self, path: Path | str = ":memory:"):
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS chat_messages ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, seq))"
+            )
+
+    def get_messages(self, session_id: str) -> list[ChatMessage]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT message FROM chat_messages WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            ).fetchall()
+        return [orjson.loads(r[0]) for r in rows]
+
+    def append(self, session_id: str, messages: list[ChatMessage]) -> None:
+        if not messages:
+            return
+
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT COALESCE(MAX(seq), -1) FROM chat_messages WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            self._connection.executemany(
+                "INSERT INTO chat_messages VALUES (?, ?, ?)",
+                [
+                    (session_id, row[0] + 1 + i, orjson.dumps(m))
+                    for i, m in enumerate(messages)
+                ],
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM chat_messages WHERE session_id = ?", (session_id,)
+            )
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+_chat_session_store: ChatSessionStore = InMemoryChatSessionStore()
+
+
+def set_chat_session_store(store: ChatSessionStore) -> None:
+    global _chat_session_store
+    _chat_session_store = store
+
+
+def get_chat_session_store() -> ChatSessionStore:
+    return _chat_session_store
+
+
+@ai_agent
+class OpenAiChatAgent(Agent):
+    """Agent answering through chat completions instead of assistant runs.
+
+    Uses the model and prompt of its spec. When the spec has no model, they
+    are taken from the assistant with the spec id.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        spec: AgentSpec,
+        tools: list[OpenAiAssistantTool] = None,
+    ):
+        self._api_key = api_key
+        super().__init__(spec, tools)
+
+    @classmethod
+    def _get_tool_type(cls) -> OpenAiAssistantTool:
+        return OpenAiAssistantTool
+
+    @classmethod
+    async def from_spec(cls, spec: AgentSpec) -> "OpenAiChatAgent":
+        if not spec.api_key:
+            raise ValueError("spec must have api_key")
+
+        api_key: str = apply_api_key_middleware(spec.api_key)
+        if not spec.model:
+            assistant = await client.get_assistant(api_key, spec.id)
+            spec = spec.model_copy(
+                update={
+                    "model": assistant.model,
+                    "prompt": spec.prompt or assistant.instructions,
+                }
+            )
+
+        tools = [OpenAiAssistantTool.from_spec(t) for t in spec.tools or []]
+        return cls(api_key, spec, tools)
+
+    @classmethod
+    async def from_id(cls, id: str, api_key: str) -> "OpenAiChatAgent":
+        if not api_key or not id:
+            raise ValueError("api_key and assistant_id are required")
+
+        return await cls.from_spec(
+            AgentSpec(
+                id=id,
+                api_key=api_key,
+                type="OpenAiChatAgent",
+                session_type="OpenAiChatSession",
+            )
+        )
+
+    @property
+    def api_key(self) -> str:
+        return self._api_key
+
+    def _add_tools(self, tools: list[ToolDefinition]) -> Self:
+        self._tools.extend(
+            [OpenAiAssistantTool.from_definition(t.spec, t.executor) for t in tools]
+        )
+        return self
+
+
+@ai_session
+class OpenAiChatSession(Session):
+    """Session whose history is kept in the local ChatSessionStore.
+
+    Files are not supported.
+    """
+
+    def __init__(self, spec: SessionSpec, store: ChatSessionStore | None = None):
+        self._store = store or get_chat_session_store()
+        super().__init__(spec)
+
+    @classmethod
+    async def from_spec(cls, spec: SessionSpec) -> "OpenAiChatSession":
+        if spec.id:
+            return cls(spec)
+
+        spec.id = uuid.uuid4().hex
+        session = cls(spec)
+        session.append([_create_chat_message(m) for m in spec.messages])
+        return session
+
+    @property
+    async def is_empty(self) -> bool:
+        return not self.messages
+
+    @property
+    def messages(self) -> list[ChatMessage]:
+        return self._store.get_messages(self.spec.id)
+
+    def append(self, messages: list[ChatMessage]) -> None:
+        self._store.append(self.spec.id, messages)
+
+    async def add_file(self, file: SessionFile) -> AddFileResult:
+        logging.warning("OpenAiChatSession does not support files")
+        return AddFileResult(ok=False)
+
+    async def add_message(self, message: SessionMessage) -> AddMessageResult:
+        self.append([_create_chat_message(message)])
+        return AddMessageResult(ok=True)
+
+    async def add_tool_call_result(
+        self, tool_call_result: ToolCallResult
+    ) -> AddMessageResult:
+        self.append([_create_tool_message(tool_call_result)])
+        return AddMessageResult(ok=True)
+
+    async def delete_session(self) -> DeleteSessionResult:
+        self._store.delete(self.spec.id)
+        return DeleteSessionResult(ok=True)
+
+    async def fork(self) -> "OpenAiChatSession":
+        session = OpenAiChatSession(
+            self.spec.model_copy(update={"id": uuid.uuid4().hex, "messages": []}),
+            self._store,
+        )
+        session.append(self.messages)
+        return session
+
+
+@assignment_executor
+class OpenAiChatExecutor(AssignmentExecutor):
+    """Runs a turn as one streamed chat completion request.
+
+    There is no upstream run: run ids are completion ids, and tool outputs
+    are added to the history, from which the next turn continues.
+    """
+
+    @staticmethod
+    async def validate_assignment(
+        agent: OpenAiChatAgent,
+        session: OpenAiChatSession,
+        run_id: str | None = None,
+        **kwargs,
+    ) -> None:
+        pass
+
+    @staticmethod
+    async def execute(
+        agent: OpenAiChatAgent,
+        session: OpenAiChatSession,
+        run_id: str | None = None,
+        **kwargs,
+    ) -> RunResult:
+        history = session.messages
+        system = (
+            [{"role": "system", "content": agent.spec.prompt}]
+            if agent.spec.prompt
+            else []
+        )
+        budget = ContextBudget.resolve(
+            agent.spec.context_budget, session.spec.context_budget
+        )
+        messages = system + (
+            _fit_to_budget(history, budget, _estimate_tokens(system))
+            if budget
+            else history
+        )
+
+        body: dict[str, Any] = {"model": agent.spec.model, "messages": messages}
+        if budget and budget.max_completion_tokens:
+            body["max_completion_tokens"] = budget.max_completion_tokens
+        tools = [
+            _to_dict(t.openai_tool)
+            for t in agent.tools
+            if t.openai_tool.type == OpenAiAssistantToolType.FUNCTION
+        ]
+        if tools:
+            body["tools"] = tools
+
+        completion = await client.create_chat_completion(agent.api_key, body)
+        session.append(
+            [completion.choices[0].message.model_dump(mode="json", exclude_none=True)]
+        )
+        result = create_run_result(
+            completion, {t.spec.name: t.spec for t in agent.tools}
+        )
+        if budget:
+            result.context = ContextReport(
+                budget=budget,
+                prompt_tokens=(
+                    completion.usage.prompt_tokens if completion.usage else None
+                ),
+                messages_before=len(history),
+                messages_after=len(messages) - len(system),
+                estimated_tokens_before=_estimate_tokens(system + history),
+                estimated_tokens_after=_estimate_tokens(messages),
+            )
+        return result
+
+    @staticmethod
+    async def submit_tool_calls(
+        agent: OpenAiChatAgent,
+        session: OpenAiChatSession,
+        run_id: str,
+        tc_results: list[ToolCallResult],
+        **kwargs,
+    ) -> RunResult:
+        session.append([_create_tool_message(tcr) for tcr in tc_results])
+
+    @staticmethod
+    async def prepare_for_async_tool_calls(
+        agent: OpenAiChatAgent,
+        session: OpenAiChatSession,
+        run_id: str,
+        **kwargs,
+    ) -> RunResult:
+        # the tool calls stay in the history until their results are added
+        pass
+
+
+def create_run_result(
+    completion: ChatCompletion, tools: dict[str, ToolSpec]
+) -> RunResult:
+    message = completion.choices[0].message
+    if message.tool_calls:
+        return RunResult(
+            run_id=completion.id,
+            result_type=RunResultType.TOOL_CALL,
+            tool_calls=[
+                _create_tool_call(
+                    tc.id, tc.function.name, tc.function.arguments, tools
+                )
+                for tc in message.tool_calls
+            ],
+            model=completion.model,
+            usage=create_token_usage(completion.usage),
+        )
+
+    return RunResult(
+        run_id=completion.id,
+        result_type=RunResultType.MESSAGE_RESPONSE,
+        messages=[SessionMessage(role=MessageRole.AGENT, text=message.content or " ")],
+        model=completion.model,
+        usage=create_token_usage(completion.usage),
+    )
+
+
+def _estimate_tokens(messages: list[ChatMessage]) -> int:
+    return estimate_tokens(orjson.dumps(m) for m in messages)
+
+
+def _fit_to_budget(
+    history: list[ChatMessage], budget: ContextBudget, reserved_tokens: int = 0
+) -> list[ChatMessage]:
+    """Drops the oldest messages of `history` that exceed `budget`."""
+    start = 0
+    if budget.last_messages:
+        start = max(0, len(history) - budget.last_messages)
+
+    if budget.max_prompt_tokens:
+        tokens = [_estimate_tokens([m]) for m in history]
+        total = reserved_tokens + sum(tokens[start:])
+        while total > budget.max_prompt_tokens and start < len(history) - 1:
+            total -= tokens[start]
+            start += 1
+
+    # tool outputs cannot be sent without the call that asked for them: drop
+    # leading outputs, or keep their call if they answer the last one
+    end = start
+    while end < len(history) and history[end]["role"] == "tool":
+        end += 1
+    if end < len(history):
+        start = end
+    else:
+        while start > 0 and history[start]["role"] == "tool":
+            start -= 1
+
+    return history[start:]
+
+
+def create_chat_messages(messages: list[SessionMessage]) -> list[ChatMessage]:
+    return [_create_chat_message(m) for m in messages if m.text]
+
+
+def _create_chat_message(message: SessionMessage) -> ChatMessage:
+    return {"role": _CHAT_ROLES[message.role], "content": message.text or " "}
+
+
+def _create_tool_message(tool_call_result: ToolCallResult) -> ChatMessage:
+    return {
+        "role": "tool",
+        "tool_call_id": tool_call_result.tool_call.id,
+        "content": tool_call_result.text or tool_call_result.error or " ",
+    }
+
+
+def _create_tool_call(
+    id: str, name: str, arguments: str, tools: dict[str, ToolSpec]
+) -> ToolCall:
+    if name in tools:
+        return ToolCall(id=id, tool=tools[name], arguments=json.loads(arguments))
+    return ToolCall(id=id, tool_name=name, arguments=json.loads(arguments))
@@ -4,6 +4,7 @@ import os
 from typing import Any
 
 import aiofile
+import orjson
 
 import httpx
 
@@ -16,10 +17,17 @@ from bluemarz.utils.http_client import HTTPClient
 
 BASE_URL: str = "https://api.openai.com/v1"
 BASE_HEADERS: dict[str, Any] = {"OpenAI-Beta": "assistants=v2"}
+# maximum number of messages sent in a single thread creation request
+MAX_THREAD_MESSAGES: int = 32
 
 _client: HTTPClient = HTTPClient(BASE_URL, headers=BASE_HEADERS)
 
 
+def set_base_url(base_url: str) -> None:
+    """Points the client to another api root, e.g. a proxy or a local mock."""
+    _client.base_url = base_url.rstrip("/")
+
+
 def _get_auth_headers(openai_key: str) -> dict[str, Any]:
     return {"Authorization": "Bearer " + openai_key}
 
@@ -39,13 +47,9 @@ async def retrieve_assistant(
         raise
 
 
-async def create_message(
-    openai_key: str,
-    thread_id: str,
-    role: str,
-    content: str,
-    files: list[models.OpenAiFileSpec] = None,
-) -> models.ThreadMessage:
+def create_message_body(
+    role: str, content: str, files: list[models.OpenAiFileSpec] = None
+) -> dict[str, Any]:
     body = {"role": role}
     if content:
         body["content"] = content
@@ -57,6 +61,18 @@ async def create_message(
             {"file_id": file.id, "tools": [{"type": "file_search"}]} for file in files
         ]
 
+    return body
+
+
+async def create_message(
+    openai_key: str,
+    thread_id: str,
+    role: str,
+    content: str,
+    files: list[models.OpenAiFileSpec] = None,
+) -> models.ThreadMessage:
+    body = create_message_body(role, content, files)
+
     path: str = f"/threads/{thread_id}/messages"
 
     try:
@@ -74,6 +90,9 @@ async def create_run(
     thread: models.OpenAiThreadSpec,
     assistant: models.OpenAiAssistantSpec,
     additional_tools: list[models.OpenAiAssistantToolSpec],
+    truncation_strategy: models.OpenAiThreadRun.TruncationStrategy | None = None,
+    max_prompt_tokens: int | None = None,
+    max_completion_tokens: int | None = None,
 ) -> models.OpenAiThreadRun:
     tools: list[models.OpenAiAssistantToolSpec] = []
     if additional_tools:
@@ -99,6 +118,12 @@ async def create_run(
         "assistant_id": assistant.id,
         "tools": [_to_dict(t) for t in tools],
     }
+    if truncation_strategy:
+        body["truncation_strategy"] = _to_dict(truncation_strategy)
+    if max_prompt_tokens:
+        body["max_prompt_tokens"] = max_prompt_tokens
+    if max_completion_tokens:
+        body["max_completion_tokens"] = max_completion_tokens
 
     try:
         response: httpx.Response = await _client.request(
@@ -125,6 +150,25 @@ async def get_run(
         raise
 
 
+async def list_runs(
+    openai_key: str, thread_id: str, limit: int = None
+) -> list[models.OpenAiThreadRun]:
+    path: str = f"/threads/{thread_id}/runs"
+    params = {}
+    if limit:
+        params["limit"] = limit
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.GET, path, params=params, headers=_get_auth_headers(openai_key)
+        ).asend()
+        ret_data = response.json()
+        return [models.OpenAiThreadRun.model_validate(r) for r in ret_data["data"]]
+    except Exception as ex:
+        logging.error(f"Error in list_runs: {ex}")
+        raise
+
+
 async def cancel_run(
     openai_key: str, thread_id: str, run_id: str
 ) -> models.OpenAiThreadRun:
@@ -218,12 +262,15 @@ async def get_run_step(
 
 
 async def get_steps(
-    openai_key: str, thread_id: str, run_id: str
+    openai_key: str, thread_id: str, run_id: str, limit: int = None
 ) -> list[models.ThreadRunStep]:
     path: str = f"/threads/{thread_id}/runs/{run_id}/steps"
+    params = {}
+    if limit:
+        params["limit"] = limit
     try:
         response: httpx.Response = await _client.request(
-            HTTPMethod.GET, path, headers=_get_auth_headers(openai_key)
+            HTTPMethod.GET, path, params=params, headers=_get_auth_headers(openai_key)
         ).asend()
         ret_data = response.json()
         return [models.ThreadRunStep.model_validate(stp) for stp in ret_data["data"]]
@@ -232,12 +279,49 @@ async def get_steps(
         raise
 
 
-async def create_session(openai_key: str) -> models.OpenAiThreadSpec:
+async def list_steps(
+    openai_key: str,
+    thread_id: str,
+    run_id: str,
+    after: str = None,
+    order: str = "desc",
+    limit: int = None,
+) -> models.ThreadRunStepList:
+    path: str = f"/threads/{thread_id}/runs/{run_id}/steps"
+    params = {"order": order}
+    if after:
+        params["after"] = after
+    if limit:
+        params["limit"] = limit
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.GET, path, params=params, headers=_get_auth_headers(openai_key)
+        ).asend()
+        return _desserialize(response, models.ThreadRunStepList)
+    except Exception as ex:
+        logging.error(f"Error in list_steps: {ex}")
+        raise
+
+
+async def create_session(
+    openai_key: str,
+    messages: list[dict[str, Any]] = None,
+    tool_resources: models.ToolResources = None,
+    metadata: models.Metadata = None,
+) -> models.OpenAiThreadSpec:
     path: str = "/threads"
-    params = {"messages": "", "tool_resource": "", "metadata": ""}
+    body = {}
+    if messages:
+        body["messages"] = messages
+    if tool_resources:
+        body["tool_resources"] = _to_dict(tool_resources)
+    if metadata:
+        body["metadata"] = metadata
+
     try:
         response: httpx.Response = await _client.request(
-            HTTPMethod.POST, path, params=params, headers=_get_auth_headers(openai_key)
+            HTTPMethod.POST, path, headers=_get_auth_headers(openai_key), json=body
         ).asend()
         return _desserialize(response, models.OpenAiThreadSpec)
     except Exception as ex:
@@ -257,6 +341,29 @@ async def get_session(openai_key: str, thread_id: str) -> models.OpenAiThreadSpe
         raise
 
 
+async def modify_session(
+    openai_key: str,
+    thread_id: str,
+    tool_resources: models.ToolResources = None,
+    metadata: models.Metadata = None,
+) -> models.OpenAiThreadSpec:
+    path: str = f"/threads/{thread_id}"
+    body = {}
+    if tool_resources:
+        body["tool_resources"] = _to_dict(tool_resources)
+    if metadata:
+        body["metadata"] = metadata
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.POST, path, headers=_get_auth_headers(openai_key), json=body
+        ).asend()
+        return _desserialize(response, models.OpenAiThreadSpec)
+    except Exception as ex:
+        logging.error(f"Error in modify_session: {ex}")
+        raise
+
+
 async def get_assistant(
     openai_key: str, assistant_id: str
 ) -> models.OpenAiAssistantSpec:
@@ -286,6 +393,30 @@ async def get_thread_messages(
         raise
 
 
+async def list_thread_messages(
+    openai_key: str,
+    thread_id: str,
+    after: str = None,
+    order: str = "desc",
+    limit: int = None,
+) -> models.ThreadMessageList:
+    path: str = f"/threads/{thread_id}/messages"
+    params = {"order": order}
+    if after:
+        params["after"] = after
+    if limit:
+        params["limit"] = limit
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.GET, path, params=params, headers=_get_auth_headers(openai_key)
+        ).asend()
+        return _desserialize(response, models.ThreadMessageList)
+    except Exception as ex:
+        logging.error(f"Error in list_thread_messages: {ex}")
+        raise
+
+
 async def delete_session(openai_key: str, thread_id: str) -> None:
     path: str = f"/threads/{thread_id}"
     params = {}
@@ -354,3 +485,302 @@ async def upload_files(
             os.remove(file.file_name)
 
         return upload_files
+
+
+async def create_vector_store(
+    openai_key: str,
+    name: str = None,
+    file_ids: list[str] = None,
+    expires_after: models.VectorStore.ExpiresAfter = None,
+    metadata: models.Metadata = None,
+) -> models.VectorStore:
+    path: str = "/vector_stores"
+    body = {}
+    if name:
+        body["name"] = name
+    if file_ids:
+        body["file_ids"] = file_ids
+    if expires_after:
+        body["expires_after"] = _to_dict(expires_after)
+    if metadata:
+        body["metadata"] = metadata
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.POST, path, headers=_get_auth_headers(openai_key), json=body
+        ).asend()
+        return _desserialize(response, models.VectorStore)
+    except Exception as ex:
+        logging.error(f"Error in create_vector_store: {ex}")
+        raise
+
+
+async def get_vector_store(openai_key: str, vector_store_id: str) -> models.VectorStore:
+    path: str = f"/vector_stores/{vector_store_id}"
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.GET, path, headers=_get_auth_headers(openai_key)
+        ).asend()
+        return _desserialize(response, models.VectorStore)
+    except Exception as ex:
+        logging.error(f"Error in get_vector_store: {ex}")
+        raise
+
+
+async def modify_vector_store(
+    openai_key: str,
+    vector_store_id: str,
+    name: str = None,
+    expires_after: models.VectorStore.ExpiresAfter = None,
+    metadata: models.Metadata = None,
+) -> models.VectorStore:
+    path: str = f"/vector_stores/{vector_store_id}"
+    body = {}
+    if name:
+        body["name"] = name
+    if expires_after:
+        body["expires_after"] = _to_dict(expires_after)
+    if metadata:
+        body["metadata"] = metadata
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.POST, path, headers=_get_auth_headers(openai_key), json=body
+        ).asend()
+        return _desserialize(response, models.VectorStore)
+    except Exception as ex:
+        logging.error(f"Error in modify_vector_store: {ex}")
+        raise
+
+
+async def delete_vector_store(openai_key: str, vector_store_id: str) -> None:
+    path: str = f"/vector_stores/{vector_store_id}"
+
+    try:
+        await _client.request(
+            HTTPMethod.DELETE, path, headers=_get_auth_headers(openai_key)
+        ).asend()
+    except Exception as ex:
+        logging.error(f"Error in delete_vector_store: {ex}")
+        raise
+
+
+async def create_vector_store_file(
+    openai_key: str, vector_store_id: str, file_id: str
+) -> models.VectorStoreFile:
+    path: str = f"/vector_stores/{vector_store_id}/files"
+    body = {"file_id": file_id}
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.POST, path, headers=_get_auth_headers(openai_key), json=body
+        ).asend()
+        return _desserialize(response, models.VectorStoreFile)
+    except Exception as ex:
+        logging.error(f"Error in create_vector_store_file: {ex}")
+        raise
+
+
+async def delete_vector_store_file(
+    openai_key: str, vector_store_id: str, file_id: str
+) -> None:
+    path: str = f"/vector_stores/{vector_store_id}/files/{file_id}"
+
+    try:
+        await _client.request(
+            HTTPMethod.DELETE, path, headers=_get_auth_headers(openai_key)
+        ).asend()
+    except Exception as ex:
+        logging.error(f"Error in delete_vector_store_file: {ex}")
+        raise
+
+
+async def create_vector_store_file_batch(
+    openai_key: str, vector_store_id: str, file_ids: list[str]
+) -> models.VectorStoreFileBatch:
+    path: str = f"/vector_stores/{vector_store_id}/file_batches"
+    body = {"file_ids": file_ids}
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.POST, path, headers=_get_auth_headers(openai_key), json=body
+        ).asend()
+        return _desserialize(response, models.VectorStoreFileBatch)
+    except Exception as ex:
+        logging.error(f"Error in create_vector_store_file_batch: {ex}")
+        raise
+
+
+async def get_vector_store_file_batch(
+    openai_key: str, vector_store_id: str, batch_id: str
+) -> models.VectorStoreFileBatch:
+    path: str = f"/vector_stores/{vector_store_id}/file_batches/{batch_id}"
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.GET, path, headers=_get_auth_headers(openai_key)
+        ).asend()
+        return _desserialize(response, models.VectorStoreFileBatch)
+    except Exception as ex:
+        logging.error(f"Error in get_vector_store_file_batch: {ex}")
+        raise
+
+
+async def cancel_vector_store_file_batch(
+    openai_key: str, vector_store_id: str, batch_id: str
+) -> models.VectorStoreFileBatch:
+    path: str = f"/vector_stores/{vector_store_id}/file_batches/{batch_id}/cancel"
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.POST, path, headers=_get_auth_headers(openai_key)
+        ).asend()
+        return _desserialize(response, models.VectorStoreFileBatch)
+    except Exception as ex:
+        logging.error(f"Error in cancel_vector_store_file_batch: {ex}")
+        raise
+
+
+async def upload_file_content(
+    openai_key: str, content: bytes, filename: str, purpose: str
+) -> models.OpenAiFileSpec:
+    path: str = "/files"
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.POST,
+            path,
+            headers=_get_auth_headers(openai_key),
+            data={"purpose": purpose},
+            files={"file": (filename, content)},
+        ).asend()
+        return _desserialize(response, models.OpenAiFileSpec)
+    except Exception as ex:
+        logging.error(f"Error in upload_file_content: {ex}")
+        raise
+
+
+async def get_file_content(openai_key: str, file_id: str) -> bytes:
+    path: str = f"/files/{file_id}/content"
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.GET, path, headers=_get_auth_headers(openai_key)
+        ).asend()
+        return response.content
+    except Exception as ex:
+        logging.error(f"Error in get_file_content: {ex}")
+        raise
+
+
+async def create_batch(
+    openai_key: str,
+    input_file_id: str,
+    endpoint: str = "/v1/chat/completions",
+    completion_window: str = "24h",
+    metadata: models.Metadata | None = None,
+) -> models.Batch:
+    path: str = "/batches"
+    body: dict[str, Any] = {
+        "input_file_id": input_file_id,
+        "endpoint": endpoint,
+        "completion_window": completion_window,
+    }
+    if metadata:
+        body["metadata"] = metadata
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.POST, path, headers=_get_auth_headers(openai_key), json=body
+        ).asend()
+        return _desserialize(response, models.Batch)
+    except Exception as ex:
+        logging.error(f"Error in create_batch: {ex}")
+        raise
+
+
+async def get_batch(openai_key: str, batch_id: str) -> models.Batch:
+    path: str = f"/batches/{batch_id}"
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.GET, path, headers=_get_auth_headers(openai_key)
+        ).asend()
+        return _desserialize(response, models.Batch)
+    except Exception as ex:
+        logging.error(f"Error in get_batch: {ex}")
+        raise
+
+
+async def cancel_batch(openai_key: str, batch_id: str) -> models.Batch:
+    path: str = f"/batches/{batch_id}/cancel"
+
+    try:
+        response: httpx.Response = await _client.request(
+            HTTPMethod.POST, path, headers=_get_auth_headers(openai_key)
+        ).asend()
+        return _desserialize(response, models.Batch)
+    except Exception as ex:
+        logging.error(f"Error in cancel_batch: {ex}")
+        raise
+
+
+async def create_chat_completion(
+    openai_key: str, body: dict[str, Any]
+) -> models.ChatCompletion:
+    """Sends a streamed chat completion request and assembles the completion."""
+    path: str = "/chat/completions"
+    body = body | {"stream": True, "stream_options": {"include_usage": True}}
+
+    try:
+        async with _client.request(
+            HTTPMethod.POST, path, headers=_get_auth_headers(openai_key), json=body
+        ).astream() as response:
+            return await _read_chat_completion_stream(response)
+    except Exception as ex:
+        logging.error(f"Error in create_chat_completion: {ex}")
+        raise
+
+
+async def _read_chat_completion_stream(
+    response: httpx.Response,
+) -> models.ChatCompletion:
+    completion: dict[str, Any] = {"choices": []}
+    content: list[str] = []
+    tool_calls: dict[int, dict[str, Any]] = {}
+    finish_reason: str | None = None
+
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:") :].strip()
+        if data == "[DONE]":
+            break
+
+        chunk = orjson.loads(data)
+        for key in ("id", "created", "model", "usage"):
+            if chunk.get(key) is not None:
+                completion[key] = chunk[key]
+
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            if delta.get("content"):
+                content.append(delta["content"])
+            for tc in delta.get("tool_calls") or []:
+                call = tool_calls.setdefault(
+                    tc["index"], {"function": {"name": "", "arguments": ""}}
+                )
+                if tc.get("id"):
+                    call["id"] = tc["id"]
+                function = tc.get("function") or {}
+                call["function"]["name"] += function.get("name") or ""
+                call["function"]["arguments"] += function.get("arguments") or ""
+            finish_reason = choice.get("finish_reason") or finish_reason
+
+    message: dict[str, Any] = {"role": "assistant", "content": "".join(content) or None}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+    completion["choices"] = [{"message": message, "finish_reason": finish_reason}]
+
+    return models.ChatCompletion.model_validate(completion)
@@ -1,7 +1,8 @@
+import asyncio
 import json
 import logging
-from time import sleep
-from typing import Self
+import time
+from typing import Any, Callable, Iterable, Self
 
 from bluemarz.core.exceptions import InvalidDefinition
 from bluemarz.core.interfaces import (
@@ -16,19 +17,37 @@ from bluemarz.core.models import (
     AddFileResult,
     AddMessageResult,
     AgentSpec,
+    ContextBudget,
+    ContextReport,
     DeleteSessionResult,
     MessageRole,
+    ProfileEntry,
+    ProfileEntryType,
     RunResult,
     RunResultType,
     SessionFile,
     SessionMessage,
     SessionSpec,
+    TokenUsage,
     ToolCall,
     ToolCallResult,
     ToolSpec,
 )
 from bluemarz.core.class_registry import ai_agent, ai_session, assignment_executor
 from bluemarz.lib.openai import client
+from bluemarz.utils import metrics, tracing
+from bluemarz.utils.http_client import HTTPRequestError
+from bluemarz.lib.openai.session_pool import get_session_pool
+from bluemarz.lib.openai.session_writer import (
+    ACTIVE_RUN_STATUSES,
+    SessionWriter,
+    get_session_writer,
+)
+from bluemarz.lib.openai.message_store import (
+    StoredMessage,
+    get_message_store,
+    sync_thread_messages,
+)
 from bluemarz.lib.openai.models import (
     FunctionTool,
     OpenAiAssistantSpec,
@@ -38,8 +57,39 @@ from bluemarz.lib.openai.models import (
     OpenAiThreadRun,
     OpenAiThreadSpec,
     OpenAiToolCallSpec,
+    RunUsage,
     ThreadMessage,
+    ThreadRunStep,
     ThreadMessageRole,
+    ToolResources,
+    VectorStore,
+    VectorStoreFileBatch,
+)
+
+# session parameter holding a vector store shared by every thread of an agent
+VECTOR_STORE_PARAMETER: str = "vector_store_id"
+# maximum number of file ids accepted by a single vector store file batch
+_MAX_FILE_BATCH_SIZE: int = 500
+# seconds a vector store file batch may take to index before it is cancelled
+_FILE_BATCH_TIMEOUT: float = 600
+_FILE_BATCH_POLL_INTERVAL: float = 1
+# days of inactivity after which the vector store of a thread is deleted
+_THREAD_VECTOR_STORE_EXPIRY_DAYS: int = 7
+# maximum page size of the run steps list
+_STEPS_PAGE_SIZE: int = 100
+# rough token estimate without a tokenizer, enough to keep prompts under a cap
+_CHARS_PER_TOKEN: int = 4
+_MESSAGE_OVERHEAD_TOKENS: int = 4
+
+_run_polls = metrics.get_metrics_registry().histogram(
+    "bluemarz_run_polls",
+    "Polls of a run until it stops or needs tool outputs",
+    buckets=(0, 1, 2, 3, 5, 10, 20, 30, 60, 120, 300),
+)
+_run_wait = metrics.get_metrics_registry().histogram(
+    "bluemarz_run_wait_seconds",
+    "Time from creating or resuming a run until it stops or needs tool outputs",
+    ["status"],
 )
 
 
@@ -77,6 +127,18 @@ class OpenAiAssistant(Agent):
 
         return cls(api_key, impl, spec, tools)
 
+    @classmethod
+    async def restore(cls, spec: AgentSpec) -> "OpenAiAssistant":
+        """Rebuilds the agent without fetching the assistant until a run needs it."""
+        if not spec.id:
+            raise ValueError("spec must have id")
+        if not spec.api_key:
+            raise ValueError("spec must have api_key")
+
+        api_key: str = apply_api_key_middleware(spec.api_key)
+        tools = [OpenAiAssistantTool.from_spec(t) for t in spec.tools or []]
+        return cls(api_key, None, spec, tools)
+
     @classmethod
     async def from_id(cls, id: str, api_key: str) -> "OpenAiAssistant":
         if not api_key or not id:
@@ -98,7 +160,12 @@ class OpenAiAssistant(Agent):
         return self._api_key
 
     @property
-    def openai_assistant(self) -> OpenAiAssistantSpec:
+    def openai_assistant(self) -> OpenAiAssistantSpec | None:
+        return self._impl
+
+    async def get_openai_assistant(self) -> OpenAiAssistantSpec:
+        if self._impl is None:
+            self._impl = await client.get_assistant(self._api_key, self._spec.id)
         return self._impl
 
     def _add_tools(self, tools: list[ToolDefinition]) -> Self:
@@ -116,12 +183,16 @@ class OpenAiAssistantNativeSession(Session):
         impl: OpenAiThreadSpec,
         spec: SessionSpec,
         is_empty: bool = False,
-        files: list[SessionFile] = [],
+        files: list[SessionFile] = None,
     ):
         self._api_key = api_key
         self._impl = impl
-        self._files = files
+        self._files = files if files is not None else []
         self._is_empty = is_empty
+        self._writer = get_session_writer(api_key, impl.id)
+        self._vector_store_id: str | None = None
+        self._vector_store_lock = asyncio.Lock()
+        self._impl_loaded: bool = True
         super().__init__(spec)
 
     @classmethod
@@ -135,21 +206,48 @@ class OpenAiAssistantNativeSession(Session):
 
         is_empty: bool = True
         impl: OpenAiThreadSpec = None
+        seeded: list[SessionMessage] = []
         if spec.id:
             impl = await client.get_session(api_key, spec.id)
             is_empty = await check_if_empty_session(api_key, spec.id)
+        elif spec.messages:
+            # seed the thread in the creation request, up to the api limit
+            seeded = spec.messages[: client.MAX_THREAD_MESSAGES]
+            impl = await client.create_session(
+                api_key, messages=await _create_message_bodies(api_key, seeded)
+            )
+            spec.id = impl.id
+            is_empty = False
         else:
-            impl = await client.create_session(api_key)
+            impl = await _create_thread(api_key)
             spec.id = impl.id
 
-        session = cls(api_key, impl, spec, is_empty=is_empty)
+        session = cls(
+            api_key,
+            impl,
+            spec,
+            is_empty=is_empty,
+            files=[f for m in seeded if m.files for f in m.files],
+        )
 
-        if new_session and spec.messages:
-            for message in spec.messages:
-                await session.add_message(message)
+        if new_session:
+            await session._add_messages(spec.messages[len(seeded) :])
 
         return session
 
+    @classmethod
+    async def restore(cls, spec: SessionSpec) -> "OpenAiAssistantNativeSession":
+        """Rebuilds the session without fetching the thread until it is needed."""
+        if not spec.id:
+            raise ValueError("spec must have id")
+        if not spec.api_key:
+            raise ValueError("spec must have api_key")
+
+        api_key: str = apply_api_key_middleware(spec.api_key)
+        session = cls(api_key, OpenAiThreadSpec(id=spec.id), spec)
+        session._impl_loaded = False
+        return session
+
     @classmethod
     async def from_id(cls, id: str, api_key: str) -> "OpenAiAssistantNativeSession":
         if not api_key or not id:
@@ -162,9 +260,12 @@ class OpenAiAssistantNativeSession(Session):
 
     @classmethod
     async def new_session(cls, api_key: str) -> "OpenAiAssistantNativeSession":
-        impl: OpenAiThreadSpec = await client.create_session(api_key)
+        impl: OpenAiThreadSpec = await _create_thread(api_key)
         return cls(
-            api_key, impl, SessionSpec(id=impl.id, type="OpenAiAssistantNativeSession")
+            api_key,
+            impl,
+            SessionSpec(id=impl.id, type="OpenAiAssistantNativeSession"),
+            is_empty=True,
         )
 
     @property
@@ -179,10 +280,90 @@ class OpenAiAssistantNativeSession(Session):
     def files(self) -> list[SessionFile]:
         return self._files
 
+    @property
+    def writer(self) -> SessionWriter:
+        return self._writer
+
     @property
     async def is_empty(self) -> bool:
         return self._is_empty
 
+    async def get_vector_store_id(self) -> str:
+        """Returns the vector store used for file search in this thread.
+
+        Uses, in order: the store already attached to the thread, the store
+        shared through the `vector_store_id` session parameter, or a new store
+        created for the thread. The store is attached to the thread if needed.
+        """
+        async with self._vector_store_lock:
+            if self._vector_store_id:
+                return self._vector_store_id
+
+            resources = (await self._get_impl()).tool_resources
+            if (
+                resources
+                and resources.file_search
+                and resources.file_search.vector_store_ids
+            ):
+                self._vector_store_id = resources.file_search.vector_store_ids[0]
+                return self._vector_store_id
+
+            vector_store_id: str = self.spec.parameters.get(VECTOR_STORE_PARAMETER)
+            if not vector_store_id:
+                vector_store = await client.create_vector_store(
+                    self._api_key,
+                    name=f"thread-{self._impl.id}",
+                    expires_after=VectorStore.ExpiresAfter(
+                        anchor="last_active_at", days=_THREAD_VECTOR_STORE_EXPIRY_DAYS
+                    ),
+                    metadata={"thread_id": self._impl.id},
+                )
+                vector_store_id = vector_store.id
+
+            self._impl = await client.modify_session(
+                self._api_key,
+                self._impl.id,
+                tool_resources=ToolResources(
+                    file_search=ToolResources.FileSearchResources(
+                        vector_store_ids=[vector_store_id]
+                    )
+                ),
+            )
+            self._vector_store_id = vector_store_id
+            return self._vector_store_id
+
+    async def add_files(self, files: list[SessionFile]) -> list[AddFileResult]:
+        openai_files = await _get_or_upload_files(self._api_key, files)
+        if not openai_files:
+            return []
+
+        vector_store_id = await self.get_vector_store_id()
+        file_ids = [f.id for f in openai_files]
+        chunks = [
+            file_ids[i : i + _MAX_FILE_BATCH_SIZE]
+            for i in range(0, len(file_ids), _MAX_FILE_BATCH_SIZE)
+        ]
+
+        batches: list[VectorStoreFileBatch] = await asyncio.gather(
+            *[
+                _index_file_batch(self._api_key, vector_store_id, chunk)
+                for chunk in chunks
+            ]
+        )
+
+        results: list[AddFileResult] = []
+        for chunk, batch in zip(chunks, batches):
+            ok = batch.status == "completed" and batch.file_counts.failed == 0
+            if not ok:
+                logging.warning(
+                    f"Vector store file batch {batch.id} finished with status {batch.status}"
+                )
+            results.extend([AddFileResult(ok=ok, file_id=file_id) for file_id in chunk])
+
+        self._files.extend(files)
+        self._is_empty = False
+        return results
+
     async def add_file(self, file: SessionFile) -> AddFileResult:
         openai_files: list[OpenAiFileSpec] = None
 
@@ -191,46 +372,96 @@ class OpenAiAssistantNativeSession(Session):
         else:
             openai_files = await client.upload_files(self._api_key, [file])
 
-        await client.create_message(
-            self._api_key, self._impl.id, "user", None, files=openai_files
-        )
+        await self._writer.write("user", None, files=openai_files)
 
-        if self.is_empty:
-            self._is_empty = False
+        self._is_empty = False
 
         return AddMessageResult(ok=True)
 
     async def add_message(self, message: SessionMessage) -> AddMessageResult:
-        role: str = "assistant"
-        if message.role == MessageRole.USER:
-            role = "user"
+        role: str = _get_openai_role(message)
 
         if not message.files:
-            await client.create_message(
-                self._api_key, self._impl.id, role, message.text
-            )
+            await self._writer.write(role, message.text)
         else:
             self._files.extend(message.files)
-            files = []
+            files = await _get_or_upload_files(self._api_key, message.files)
 
-            to_upload = [f for f in message.files if not f.id]
-            to_get_ids = [f.id for f in message.files if f.id]
+            await self._writer.write(role, message.text, files=files)
+        self._is_empty = False
+        return AddMessageResult(ok=True)
 
-            if to_upload:
-                files.extend(await client.upload_files(self._api_key, to_upload))
+    async def _add_messages(self, messages: list[SessionMessage]) -> None:
+        if not messages:
+            return
 
-            if to_get_ids:
-                files.extend(await client.get_files(self._api_key, to_get_ids))
+        async def get_files(message: SessionMessage) -> list[OpenAiFileSpec] | None:
+            if not message.files:
+                return None
+            self._files.extend(message.files)
+            return await _get_or_upload_files(self._api_key, message.files)
+
+        files = await asyncio.gather(*[get_files(m) for m in messages])
+        # queued together, so the writer sends consecutive user texts as one
+        await asyncio.gather(
+            *[
+                self._writer.write(_get_openai_role(m), m.text, files=f)
+                for m, f in zip(messages, files)
+            ]
+        )
+        self._is_empty = False
+
+    async def get_messages(self) -> list[SessionMessage]:
+        """Returns the thread history, oldest first.
+
+        When a message store is set, only messages newer than the last synced
+        one are fetched and the history is served from the store.
+        """
+        store = get_message_store()
+        if store:
+            await sync_thread_messages(store, self._api_key, self._impl.id)
+            return [
+                _create_session_message_from_stored_message(m)
+                for m in store.get_messages(self._impl.id)
+            ]
+
+        messages = await client.get_thread_messages(self._api_key, self._impl.id)
+        return [
+            _create_session_message_from_openai_thread_message(m)
+            for m in reversed(messages)
+        ]
+
+    async def fork(self) -> "OpenAiAssistantNativeSession":
+        """Creates a new thread with the history and file search store of this one."""
+        messages = await self.get_messages()
+        seeded = messages[: client.MAX_THREAD_MESSAGES]
+        impl = await client.create_session(
+            self._api_key,
+            messages=await _create_message_bodies(self._api_key, seeded),
+            tool_resources=(await self._get_impl()).tool_resources,
+        )
 
-            await client.create_message(
-                self._api_key, self._impl.id, role, message.text, files=files
-            )
-        if self.is_empty:
-            self._is_empty = False
-        return AddMessageResult(ok=True)
+        session = OpenAiAssistantNativeSession(
+            self._api_key,
+            impl,
+            self.spec.model_copy(update={"id": impl.id, "messages": []}),
+            is_empty=not messages,
+        )
+        await session._add_messages(messages[len(seeded) :])
+
+        return session
+
+    async def _get_impl(self) -> OpenAiThreadSpec:
+        if not self._impl_loaded:
+            self._impl = await client.get_session(self._api_key, self._impl.id)
+            self._impl_loaded = True
+        return self._impl
 
     async def delete_session(self) -> DeleteSessionResult:
         await client.delete_session(self._api_key, self._impl.id)
+        store = get_message_store()
+        if store:
+            store.delete(self._impl.id)
         return DeleteSessionResult()
 
     async def add_tool_call_result(
@@ -254,10 +485,90 @@ class OpenAiAssistantNativeSession(Session):
         await self.add_message(message)
 
 
+async def _create_thread(api_key: str) -> OpenAiThreadSpec:
+    pool = get_session_pool()
+    if pool:
+        return await pool.acquire(api_key)
+    return await client.create_session(api_key)
+
+
+def _get_openai_role(message: SessionMessage) -> str:
+    if message.role == MessageRole.USER:
+        return "user"
+    return "assistant"
+
+
+async def _create_message_bodies(
+    api_key: str, messages: list[SessionMessage]
+) -> list[dict]:
+    async def create_body(message: SessionMessage) -> dict:
+        files = None
+        if message.files:
+            files = await _get_or_upload_files(api_key, message.files)
+        return client.create_message_body(
+            _get_openai_role(message), message.text, files
+        )
+
+    return list(await asyncio.gather(*[create_body(m) for m in messages]))
+
+
 async def check_if_empty_session(api_key: str, session_id: str) -> bool:
     return not bool(await client.get_thread_messages(api_key, session_id))
 
 
+async def _get_or_upload_files(
+    api_key: str, files: list[SessionFile]
+) -> list[OpenAiFileSpec]:
+    openai_files: list[OpenAiFileSpec] = []
+
+    to_upload = [f for f in files if not f.id]
+    to_get_ids = [f.id for f in files if f.id]
+
+    if to_upload:
+        openai_files.extend(await client.upload_files(api_key, to_upload))
+
+    if to_get_ids:
+        openai_files.extend(await client.get_files(api_key, to_get_ids))
+
+    return openai_files
+
+
+async def _index_file_batch(
+    api_key: str, vector_store_id: str, file_ids: list[str]
+) -> VectorStoreFileBatch:
+    batch = await client.create_vector_store_file_batch(
+        api_key, vector_store_id, file_ids
+    )
+    deadline = time.monotonic() + _FILE_BATCH_TIMEOUT
+    while batch.status == "in_progress":
+        if time.monotonic() >= deadline:
+            logging.warning(f"Vector store file batch {batch.id} timed out")
+            return await client.cancel_vector_store_file_batch(
+                api_key, vector_store_id, batch.id
+            )
+        await asyncio.sleep(_FILE_BATCH_POLL_INTERVAL)
+        batch = await client.get_vector_store_file_batch(
+            api_key, vector_store_id, batch.id
+        )
+
+    return batch
+
+
+def _get_run_limits(budget: ContextBudget | None) -> dict[str, Any]:
+    if budget is None:
+        return {}
+
+    limits: dict[str, Any] = {
+        "max_prompt_tokens": budget.max_prompt_tokens,
+        "max_completion_tokens": budget.max_completion_tokens,
+    }
+    if budget.last_messages:
+        limits["truncation_strategy"] = OpenAiThreadRun.TruncationStrategy(
+            type="last_messages", last_messages=budget.last_messages
+        )
+    return limits
+
+
 def _create_tool_parameters(parameter: ToolSpec.Variable) -> dict:
     type: str = parameter.type.value
     # if not parameter.required:
@@ -345,6 +656,64 @@ def _create_session_message_from_openai_thread_message(
     return SessionMessage(role=role, text=text)
 
 
+def _create_session_message_from_stored_message(
+    message: StoredMessage,
+) -> SessionMessage:
+    role = MessageRole.USER if message.is_user else MessageRole.AGENT
+    return SessionMessage(role=role, text=message.text)
+
+
+async def _get_last_agent_messages(
+    api_key: str, thread_id: str
+) -> list[SessionMessage]:
+    store = get_message_store()
+    if store:
+        await sync_thread_messages(store, api_key, thread_id)
+        stored_messages: list[StoredMessage] = []
+        for message in reversed(store.get_messages(thread_id)):
+            if message.is_user:
+                break
+            if message.text and message.text.startswith("Tool called: "):
+                break
+            stored_messages.append(message)
+
+        return [
+            _create_session_message_from_stored_message(m)
+            for m in reversed(stored_messages)
+        ]
+
+    messages = await client.get_thread_messages(api_key, thread_id)
+
+    assistant_messages = []
+    for message in messages:
+        if message.role == ThreadMessageRole.USER:
+            break
+
+        if (
+            message.content
+            and message.content[0].text
+            and message.content[0].text.value.startswith("Tool called: ")
+        ):
+            break
+
+        assistant_messages.append(message)
+
+    return [
+        _create_session_message_from_openai_thread_message(m)
+        for m in reversed(assistant_messages)
+    ]
+
+
+def _report_run_started(
+    session: OpenAiAssistantNativeSession,
+    run: OpenAiThreadRun,
+    run_started: Callable[[str], None] | None,
+) -> None:
+    session.writer.run_started(run.id)
+    if run_started is not None:
+        run_started(run.id)
+
+
 @assignment_executor
 class OpenAiAssistantAndThreadExecutor(AssignmentExecutor):
     @staticmethod
@@ -373,24 +742,69 @@ class OpenAiAssistantAndThreadExecutor(AssignmentExecutor):
         **kwargs,
     ) -> RunResult:
         api_key = agent.api_key
+        budget = ContextBudget.resolve(
+            agent.spec.context_budget, session.spec.context_budget
+        )
+        start = time.perf_counter()
+        polls = 0
+        run_started = kwargs.get("run_started")
         run: OpenAiThreadRun = None
-        if not run_id:
-            run = await client.create_run(
-                api_key,
-                session.openai_thread,
-                agent.openai_assistant,
-                [t.openai_tool for t in agent.tools],
-            )
-        else:
-            run = await client.get_run(api_key, session.openai_thread.id, run_id)
-
-        while (
-            run.status == "queued"
-            or run.status == "in_progress"
-            or run.status == "cancelling"
-        ):
-            sleep(1)
-            run = await client.get_run(api_key, session.openai_thread.id, run.id)
+        # the thread as the new run reads it, before its truncation upstream
+        history = (
+            await _get_stored_history(api_key, session.openai_thread.id)
+            if budget is not None and not run_id
+            else None
+        )
+        try:
+            if not run_id:
+                # shielded, so a run created upstream is known even if cancelled
+                creating = asyncio.ensure_future(
+                    client.create_run(
+                        api_key,
+                        session.openai_thread,
+                        await agent.get_openai_assistant(),
+                        [t.openai_tool for t in agent.tools],
+                        **_get_run_limits(budget),
+                    )
+                )
+                try:
+                    run = await asyncio.shield(creating)
+                except asyncio.CancelledError:
+                    await asyncio.wait([creating])
+                    if creating.exception() is None:
+                        run = creating.result()
+                        _report_run_started(session, run, run_started)
+                    raise
+            else:
+                run = await client.get_run(api_key, session.openai_thread.id, run_id)
+            _report_run_started(session, run, run_started)
+
+            while (
+                run.status == "queued"
+                or run.status == "in_progress"
+                or run.status == "cancelling"
+            ):
+                await asyncio.sleep(1)
+                polls += 1
+                with tracing.span(
+                    "run.poll", **{"agent.id": agent.spec.id, "run.id": run.id}
+                ) as span:
+                    run = await client.get_run(
+                        api_key, session.openai_thread.id, run.id
+                    )
+                    span.set_attribute("run.status", run.status)
+        except asyncio.CancelledError:
+            # callers told of the run cancel it, otherwise it would keep spending
+            if run is not None and run_started is None:
+                await asyncio.shield(
+                    OpenAiAssistantAndThreadExecutor.cancel_run(agent, session, run.id)
+                )
+            raise
+
+        _run_polls.observe(polls)
+        _run_wait.observe(time.perf_counter() - start, status=run.status)
+        if run.status not in ACTIVE_RUN_STATUSES:
+            session.writer.run_finished(run.id)
 
         result = None
         if run.status == "requires_action":
@@ -426,37 +840,34 @@ class OpenAiAssistantAndThreadExecutor(AssignmentExecutor):
                 run_id=run.id,
                 result_type=RunResultType.TOOL_CALL,
                 tool_calls=result_tool_calls,
+                expires_at=run.expires_at,
             )
-        elif run.status == "completed":
-            messages = await client.get_thread_messages(
+        elif run.status == "completed" or (
+            # the token limits of the budget cut the answer short
+            run.status == "incomplete" and budget is not None
+        ):
+            messages = await _get_last_agent_messages(
                 api_key, session.openai_thread.id
             )
-
-            assistant_messages = []
-            for message in messages:
-                if message.role == ThreadMessageRole.USER:
-                    break
-
-                if (
-                    message.content
-                    and message.content[0].text
-                    and message.content[0].text.value.startswith("Tool called: ")
-                ):
-                    break
-
-                assistant_messages.append(message)
-
+            if run.status == "incomplete":
+                logging.warning(f"Run {run.id} incomplete: {run.incomplete_details}")
+                if not messages:
+                    raise Exception(
+                        f"Run {run.id} hit its context budget before answering: "
+                        + str(run.incomplete_details)
+                    )
             result = RunResult(
                 run_id=run.id,
                 result_type=RunResultType.MESSAGE_RESPONSE,
-                messages=[
-                    _create_session_message_from_openai_thread_message(m)
-                    for m in reversed(assistant_messages)
-                ],
+                messages=messages,
             )
         else:
             raise Exception("Run could not be completed: " + str(run.last_error))
 
+        result.model = run.model
+        result.usage = create_token_usage(run.usage)
+        if budget is not None:
+            result.context = _create_context_report(budget, run, history)
         return result
 
     @staticmethod
@@ -469,6 +880,8 @@ class OpenAiAssistantAndThreadExecutor(AssignmentExecutor):
     ) -> RunResult:
         api_key = agent.api_key
 
+        # the run may have been deferred by another process
+        session.writer.run_started(run_id)
         await client.submit_tool_output(
             api_key,
             session.openai_thread.id,
@@ -489,6 +902,166 @@ class OpenAiAssistantAndThreadExecutor(AssignmentExecutor):
         api_key = agent.api_key
 
         await client.cancel_run(api_key, session.openai_thread.id, run_id)
+        # writes retry upstream until the cancellation completes
+        session.writer.run_finished(run_id)
+
+    @staticmethod
+    async def defer_tool_calls(
+        agent: OpenAiAssistant,
+        session: OpenAiAssistantNativeSession,
+        run_id: str,
+        **kwargs,
+    ) -> None:
+        # the thread takes no messages until the outputs are submitted
+        session.writer.run_deferred(run_id)
+
+    @staticmethod
+    async def cancel_run(
+        agent: OpenAiAssistant,
+        session: OpenAiAssistantNativeSession,
+        run_id: str,
+        **kwargs,
+    ) -> None:
+        try:
+            await client.cancel_run(agent.api_key, session.openai_thread.id, run_id)
+        except HTTPRequestError as ex:
+            # runs that already ended cannot be cancelled
+            logging.info(f"Run {run_id} not cancelled: {ex}")
+        session.writer.run_finished(run_id)
+
+    @staticmethod
+    async def get_run_usage(
+        agent: OpenAiAssistant,
+        session: OpenAiAssistantNativeSession,
+        run_id: str,
+        **kwargs,
+    ) -> TokenUsage | None:
+        # runs report usage only when they end, their finished steps do before
+        steps = await _get_run_steps(agent.api_key, session.openai_thread.id, run_id)
+        usages = [create_token_usage(s.usage) for s in steps if s.usage]
+        return sum(usages, TokenUsage()) if usages else None
+
+    @staticmethod
+    async def get_run_profile(
+        agent: OpenAiAssistant,
+        session: OpenAiAssistantNativeSession,
+        run_id: str,
+        **kwargs,
+    ) -> list[ProfileEntry]:
+        # upstream timestamps have a resolution of one second
+        thread_id = session.openai_thread.id
+        run, steps = await asyncio.gather(
+            client.get_run(agent.api_key, thread_id, run_id),
+            _get_run_steps(agent.api_key, thread_id, run_id),
+        )
+
+        entries: list[ProfileEntry] = []
+        if run.created_at and run.started_at:
+            entries.append(
+                ProfileEntry(
+                    entry_type=ProfileEntryType.QUEUED,
+                    run_id=run.id,
+                    started_at=run.created_at,
+                    duration=(run.started_at - run.created_at).total_seconds(),
+                    status=run.status,
+                )
+            )
+        for step in sorted(steps, key=lambda s: s.created_at):
+            ended_at = (
+                step.completed_at
+                or step.failed_at
+                or step.cancelled_at
+                or step.expired_at
+            )
+            entries.append(
+                ProfileEntry(
+                    entry_type=ProfileEntryType.RUN_STEP,
+                    name=_get_step_name(step),
+                    run_id=run.id,
+                    step_id=step.id,
+                    started_at=step.created_at,
+                    duration=(
+                        (ended_at - step.created_at).total_seconds()
+                        if ended_at
+                        else None
+                    ),
+                    status=step.status,
+                )
+            )
+        return entries
+
+
+async def _get_run_steps(
+    api_key: str, thread_id: str, run_id: str
+) -> list[ThreadRunStep]:
+    steps: list[ThreadRunStep] = []
+    after: str | None = None
+    while True:
+        page = await client.list_steps(
+            api_key, thread_id, run_id, after=after, order="asc", limit=_STEPS_PAGE_SIZE
+        )
+        steps.extend(page.data)
+        if not page.has_more or not page.data:
+            return steps
+        after = page.data[-1].id
+
+
+def _get_step_name(step: ThreadRunStep) -> str:
+    # function steps include our tool time, file search steps are upstream only
+    tool_types = sorted(
+        {tc.get("type", "function") for tc in step.step_details.tool_calls or []}
+    )
+    return ":".join([step.step_details.type, *tool_types])
+
+
+async def _get_stored_history(
+    api_key: str, thread_id: str
+) -> list[StoredMessage] | None:
+    store = get_message_store()
+    if store is None:
+        return None
+    await sync_thread_messages(store, api_key, thread_id)
+    return store.get_messages(thread_id)
+
+
+def _create_context_report(
+    budget: ContextBudget, run: OpenAiThreadRun, history: list[StoredMessage] | None
+) -> ContextReport:
+    """Reports what the budget did to the thread read by `run`.
+
+    Runs truncate the thread upstream, so the history before and after is only
+    known from the message store synced before the run was created; without a
+    store, or for a resumed run, those fields are left unset. The history after
+    applies `last_messages`, the truncation to `max_prompt_tokens` is only seen
+    in `prompt_tokens`.
+    """
+    report = ContextReport(
+        budget=budget, prompt_tokens=run.usage.prompt_tokens if run.usage else None
+    )
+    if history is None:
+        return report
+
+    kept = history[-budget.last_messages :] if budget.last_messages else history
+    report.messages_before = len(history)
+    report.messages_after = len(kept)
+    report.estimated_tokens_before = estimate_tokens(m.text or "" for m in history)
+    report.estimated_tokens_after = estimate_tokens(m.text or "" for m in kept)
+    return report
+
+
+def estimate_tokens(contents: Iterable[str | bytes]) -> int:
+    """Rough token count of the messages with the given contents."""
+    return sum(_MESSAGE_OVERHEAD_TOKENS + len(c) // _CHARS_PER_TOKEN for c in contents)
+
+
+def create_token_usage(usage: RunUsage | None) -> TokenUsage | None:
+    if usage is None:
+        return None
+    return TokenUsage(
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        total_tokens=usage.total_tokens,
+    )
 
 
 def init():
@@ -0,0 +1,252 @@
+from abc import ABC, abstractmethod
+import asyncio
+from collections import OrderedDict
+from pathlib import Path
+import sqlite3
+import threading
+from typing import NamedTuple
+import weakref
+
+from bluemarz.lib.openai import client
+from bluemarz.lib.openai.models import ThreadMessage, ThreadMessageRole
+
+# page size used when syncing a thread, the maximum accepted by the api
+_SYNC_PAGE_SIZE: int = 100
+
+
+class StoredMessage(NamedTuple):
+    """Compact representation of a thread message kept by a MessageStore."""
+
+    id: str
+    role: str
+    text: str | None
+    file_ids: tuple[str, ...] = ()
+    created_at: int | None = None
+
+    @classmethod
+    def from_thread_message(cls, message: ThreadMessage) -> "StoredMessage":
+        text: str = None
+        if isinstance(message.content, str):
+            text = message.content
+        else:
+            for content in message.content:
+                if content.type == "text":
+                    text = content.text.value
+
+        file_ids = tuple(
+            a.file_id for a in message.attachments or [] if a.file_id is not None
+        )
+        created_at = (
+            int(message.created_at.timestamp()) if message.created_at else None
+        )
+
+        return cls(message.id, message.role.value, text, file_ids, created_at)
+
+    @property
+    def is_user(self) -> bool:
+        return self.role == ThreadMessageRole.USER.value
+
+
+class MessageStore(ABC):
+    @abstractmethod
+    def get_cursor(self, thread_id: str) -> str | None:
+        pass
+
+    @abstractmethod
+    def get_messages(self, thread_id: str) -> list[StoredMessage]:
+        pass
+
+    @abstractmethod
+    def append(self, thread_id: str, messages: list[StoredMessage]) -> None:
+        """Appends the messages whose ids are not stored yet."""
+        pass
+
+    @abstractmethod
+    def delete(self, thread_id: str) -> None:
+        pass
+
+
+class InMemoryMessageStore(MessageStore):
+    """Keeps the history of the `max_threads` most recently used threads."""
+
+    _threads: OrderedDict[str, list[StoredMessage]]
+
+    def __init__(self, max_threads: int = 1024):
+        if max_threads < 1:
+            raise ValueError("max_threads must be positive")
+        self._max_threads = max_threads
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_cursor(self, thread_id: str) -> str | None:
+        with self._lock:
+            messages = self._threads.get(thread_id)
+            return messages[-1].id if messages else None
+
+    def get_messages(self, thread_id: str) -> list[StoredMessage]:
+        with self._lock:
+            messages = self._threads.get(thread_id)
+            if messages is None:
+                return []
+            self._threads.move_to_end(thread_id)
+            return list(messages)
+
+    def append(self, thread_id: str, messages: list[StoredMessage]) -> None:
+        with self._lock:
+            stored = self._threads.setdefault(thread_id, [])
+            known = {m.id for m in stored}
+            stored.extend(m for m in messages if m.id not in known)
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self._max_threads:
+                self._threads.popitem(last=False)
+
+    def delete(self, thread_id: str) -> None:
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+
+class SqliteMessageStore(MessageStore):
+    # sqlite default limit of host parameters in a single statement
+    _MAX_QUERY_PARAMETERS: int = 999
+
+    def __init__(self, path: Path | str = ":memory:"):
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "thread_id TEXT NOT NULL, seq INTEGER NOT NULL, id TEXT NOT NULL, "
+                "role TEXT NOT NULL, text TEXT, file_ids TEXT, created_at INTEGER, "
+                "PRIMARY KEY (thread_id, seq))"
+            )
+
+    def get_cursor(self, thread_id: str) -> str | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id FROM messages WHERE thread_id = ? ORDER BY seq DESC LIMIT 1",
+                (thread_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_messages(self, thread_id: str) -> list[StoredMessage]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, role, text, file_ids, created_at FROM messages "
+                "WHERE thread_id = ? ORDER BY seq",
+                (thread_id,),
+            ).fetchall()
+        return [
+            StoredMessage(
+                r[0], r[1], r[2], tuple(r[3].split(",")) if r[3] else (), r[4]
+            )
+            for r in rows
+        ]
+
+    def append(self, thread_id: str, messages: list[StoredMessage]) -> None:
+        if not messages:
+            return
+
+        with self._lock, self._connection:
+            ids = [m.id for m in messages]
+            known: set[str] = set()
+            # one parameter is the thread id
+            size = self._MAX_QUERY_PARAMETERS - 1
+            for i in range(0, len(ids), size):
+                chunk = ids[i : i + size]
+                known.update(
+                    r[0]
+                    for r in self._connection.execute(
+                        "SELECT id FROM messages WHERE thread_id = ?"
+                        f" AND id IN ({','.join('?' * len(chunk))})",
+                        (thread_id, *chunk),
+                    )
+                )
+            messages = [m for m in messages if m.id not in known]
+            row = self._connection.execute(
+                "SELECT COALESCE(MAX(seq), -1) FROM messages WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchone()
+            start = row[0] + 1
+            self._connection.executemany(
+                "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        thread_id,
+                        start + i,
+                        m.id,
+                        m.role,
+                        m.text,
+                        ",".join(m.file_ids),
+                        m.created_at,
+                    )
+                    for i, m in enumerate(messages)
+                ],
+            )
+
+    def delete(self, thread_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM messages WHERE thread_id = ?", (thread_id,)
+            )
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+async def sync_thread_messages(
+    store: MessageStore, api_key: str, thread_id: str
+) -> list[StoredMessage]:
+    """Fetches the messages newer than the store cursor and appends them.
+
+    Messages still being written by a run are not synced, so the cursor never
+    moves past incomplete content. Syncs of the same thread run one at a time.
+    Returns the newly stored messages.
+    """
+    lock = _sync_locks.get(thread_id)
+    if lock is None:
+        lock = _sync_locks[thread_id] = asyncio.Lock()
+
+    async with lock:
+        return await _sync_thread_messages(store, api_key, thread_id)
+
+
+async def _sync_thread_messages(
+    store: MessageStore, api_key: str, thread_id: str
+) -> list[StoredMessage]:
+    new_messages: list[StoredMessage] = []
+    cursor = store.get_cursor(thread_id)
+
+    while True:
+        page = await client.list_thread_messages(
+            api_key, thread_id, after=cursor, order="asc", limit=_SYNC_PAGE_SIZE
+        )
+
+        complete = True
+        for message in page.data:
+            if message.status == "in_progress":
+                complete = False
+                break
+            new_messages.append(StoredMessage.from_thread_message(message))
+
+        if not complete or not page.has_more or not page.data:
+            break
+        cursor = page.data[-1].id
+
+    store.append(thread_id, new_messages)
+    return new_messages
+
+
+# dropped with the last sync of a thread that holds them
+_sync_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+    weakref.WeakValueDictionary()
+)
+_message_store: MessageStore | None = None
+
+
+def set_message_store(store: MessageStore | None) -> None:
+    global _message_store
+    _message_store = store
+
+
+def get_message_store() -> MessageStore | None:
+    return _message_store
@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import Enum
-from typing import TypeAlias
+from typing import Any, TypeAlias
 from pydantic import BaseModel, HttpUrl
 
 Metadata: TypeAlias = dict[str, str]
@@ -125,6 +125,14 @@ class ThreadMessage(BaseModel):
     metadata: Metadata | None = None
 
 
+class ThreadMessageList(BaseModel):
+    object: str = "list"
+    data: list[ThreadMessage]
+    first_id: str | None = None
+    last_id: str | None = None
+    has_more: bool = False
+
+
 class OpenAiThreadSpec(BaseModel):
     id: str | None = None
     object: str = "thread"
@@ -224,10 +232,10 @@ class VectorStore(BaseModel):
     created_at: int
     usage_bytes: int
     last_active_at: int | None = None
-    name: str
+    name: str | None = None
     status: str
     file_counts: FileCounts
-    expires_after: ExpiresAfter
+    expires_after: ExpiresAfter | None = None
     expires_at: datetime | None = None
     last_used_at: int | None = None
     metadata: Metadata | None = None
@@ -249,7 +257,7 @@ class VectorStoreFile(BaseModel):
     vector_store_id: str | None = None
     status: str
     last_error: LastError | None = None
-    chunking_strategy: ChunkingStrategy
+    chunking_strategy: ChunkingStrategy | None = None
 
 
 class VectorStoreFileBatch(BaseModel):
@@ -263,7 +271,6 @@ class VectorStoreFileBatch(BaseModel):
     id: str | None = None
     object: str = "vector_store.files_batch"
     created_at: int
-    usage_bytes: int
     vector_store_id: str | None = None
     status: str
     last_error: LastError | None = None
@@ -285,8 +292,8 @@ class ThreadRunStep(BaseModel):
             message_id: str
 
         type: str
-        message_creation: MessageCreation
-        tool_calls: list[OpenAiToolCallSpec]
+        message_creation: MessageCreation | None = None
+        tool_calls: list[dict[str, Any]] | None = None
 
     id: str
     object: str = "thread.run.step"
@@ -297,10 +304,60 @@ class ThreadRunStep(BaseModel):
     type: str
     status: str
     cancelled_at: datetime | None = None
-    completed_at: int
+    completed_at: datetime | None = None
     expired_at: datetime | None = None
     failed_at: datetime | None = None
     last_error: LastError | None = None
     step_details: StepDetails
-    usage: RunUsage
+    usage: RunUsage | None = None
+    metadata: Metadata | None = None
+
+
+class ThreadRunStepList(BaseModel):
+    object: str = "list"
+    data: list[ThreadRunStep]
+    first_id: str | None = None
+    last_id: str | None = None
+    has_more: bool = False
+
+
+class ChatCompletionMessage(BaseModel):
+    role: str
+    content: str | None = None
+    tool_calls: list[OpenAiToolCallSpec] | None = None
+    tool_call_id: str | None = None
+
+
+class ChatCompletion(BaseModel):
+    class Choice(BaseModel):
+        index: int = 0
+        message: ChatCompletionMessage
+        finish_reason: str | None = None
+
+    id: str
+    object: str = "chat.completion"
+    created: int | None = None
+    model: str
+    choices: list[Choice]
+    usage: RunUsage | None = None
+
+
+class Batch(BaseModel):
+    class RequestCounts(BaseModel):
+        total: int = 0
+        completed: int = 0
+        failed: int = 0
+
+    id: str
+    object: str = "batch"
+    endpoint: str
+    input_file_id: str
+    completion_window: str
+    status: str
+    output_file_id: str | None = None
+    error_file_id: str | None = None
+    created_at: int | None = None
+    completed_at: int | None = None
+    expires_at: int | None = None
+    request_counts: RequestCounts | None = None
     metadata: Metadata | None = None
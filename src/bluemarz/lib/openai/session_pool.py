@@ -0,0 +1,143 @@
+import asyncio
+from collections import deque
+import logging
+import time
+
+from bluemarz.lib.openai import client
+from bluemarz.lib.openai.models import OpenAiThreadSpec
+from bluemarz.utils import metrics
+
+
+class SessionPool:
+    """Keeps pre-created empty threads per api key.
+
+    `acquire` takes a pooled thread when one is available and refills the pool
+    in the background, so new sessions do not wait for thread creation.
+    Threads idle for longer than `max_idle` seconds are deleted instead of
+    being handed out.
+    """
+
+    _threads: dict[str, deque[tuple[float, OpenAiThreadSpec]]]
+    _refills: dict[str, asyncio.Task]
+
+    def __init__(self, size: int = 4, max_idle: float = 3600):
+        if size < 1:
+            raise ValueError("size must be positive")
+        self._size = size
+        self._max_idle = max_idle
+        self._threads = {}
+        self._refills = {}
+        self._background: set[asyncio.Task] = set()
+        self._gc_task: asyncio.Task | None = None
+
+    def available(self, api_key: str) -> int:
+        return len(self._threads.get(api_key, ()))
+
+    async def acquire(self, api_key: str) -> OpenAiThreadSpec:
+        pool = self._threads.setdefault(api_key, deque())
+        thread: OpenAiThreadSpec | None = None
+
+        while pool and thread is None:
+            created_at, pooled = pool.popleft()
+            if self._is_expired(created_at):
+                self._discard(api_key, pooled)
+            else:
+                thread = pooled
+
+        self.warm(api_key)
+        if thread is not None:
+            metrics.CACHE_REQUESTS.inc(cache="session_pool", result="hit")
+            return thread
+
+        metrics.CACHE_REQUESTS.inc(cache="session_pool", result="miss")
+        return await client.create_session(api_key)
+
+    def warm(self, api_key: str) -> None:
+        """Starts filling the pool of `api_key` in the background."""
+        refill = self._refills.get(api_key)
+        if refill is None or refill.done():
+            self._refills[api_key] = asyncio.get_running_loop().create_task(
+                self._refill(api_key)
+            )
+
+    async def collect(self) -> int:
+        """Deletes expired threads from every pool. Returns how many."""
+        collected = 0
+        for api_key, pool in list(self._threads.items()):
+            kept = deque(item for item in pool if not self._is_expired(item[0]))
+            for created_at, thread in pool:
+                if self._is_expired(created_at):
+                    self._discard(api_key, thread)
+                    collected += 1
+            self._threads[api_key] = kept
+
+        return collected
+
+    def start(self, gc_interval: float = 300) -> None:
+        """Starts collecting expired threads every `gc_interval` seconds."""
+        if self._gc_task is None or self._gc_task.done():
+            self._gc_task = asyncio.get_running_loop().create_task(
+                self._collect_periodically(gc_interval)
+            )
+
+    async def close(self) -> None:
+        """Stops background work and deletes every pooled thread."""
+        tasks = list(self._refills.values())
+        if self._gc_task is not None:
+            tasks.append(self._gc_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refills.clear()
+        self._gc_task = None
+
+        for api_key, pool in self._threads.items():
+            for _, thread in pool:
+                self._discard(api_key, thread)
+        self._threads.clear()
+
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+    def _is_expired(self, created_at: float) -> bool:
+        return time.monotonic() - created_at > self._max_idle
+
+    async def _refill(self, api_key: str) -> None:
+        while len(self._threads.setdefault(api_key, deque())) < self._size:
+            try:
+                thread = await client.create_session(api_key)
+            except Exception as ex:
+                logging.error(f"Error refilling session pool: {ex}")
+                return
+            self._threads[api_key].append((time.monotonic(), thread))
+
+    async def _collect_periodically(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.collect()
+
+    def _discard(self, api_key: str, thread: OpenAiThreadSpec) -> None:
+        task = asyncio.get_running_loop().create_task(
+            _delete_thread(api_key, thread.id)
+        )
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+
+async def _delete_thread(api_key: str, thread_id: str) -> None:
+    try:
+        await client.delete_session(api_key, thread_id)
+    except Exception:
+        # the thread is unused, failing to delete it only leaves it to expire
+        pass
+
+
+_session_pool: SessionPool | None = None
+
+
+def set_session_pool(pool: SessionPool | None) -> None:
+    global _session_pool
+    _session_pool = pool
+
+
+def get_session_pool() -> SessionPool | None:
+    return _session_pool
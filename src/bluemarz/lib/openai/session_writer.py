@@ -0,0 +1,201 @@
+import asyncio
+from dataclasses import dataclass, field
+from http import HTTPStatus
+import logging
+import weakref
+
+from bluemarz.lib.openai import client
+from bluemarz.lib.openai.models import OpenAiFileSpec
+from bluemarz.utils.http_client import HTTPRequestError
+
+# run statuses during which the api rejects new messages in the thread
+ACTIVE_RUN_STATUSES: frozenset[str] = frozenset(
+    {"queued", "in_progress", "requires_action", "cancelling"}
+)
+# seconds between upstream checks while waiting for a run to end
+_RUN_CHECK_INTERVAL: float = 5
+# seconds between upstream checks while a run started elsewhere is active
+_UPSTREAM_CHECK_INTERVAL: float = 1
+_MAX_WRITE_ATTEMPTS: int = 3
+
+
+class RunAwaitingToolOutputs(Exception):
+    """A deferred run holds the thread until its tool outputs are submitted."""
+
+    def __init__(self, thread_id: str, run_id: str):
+        self.thread_id = thread_id
+        self.run_id = run_id
+        super().__init__(
+            f"Thread {thread_id} takes no messages until the tool outputs of "
+            f"run {run_id} are submitted"
+        )
+
+
+@dataclass
+class _PendingWrite:
+    role: str
+    content: str | None
+    files: list[OpenAiFileSpec] | None
+    futures: list[asyncio.Future] = field(default_factory=list)
+
+    @property
+    def can_coalesce(self) -> bool:
+        return self.role == "user" and not self.files and bool(self.content)
+
+
+class SessionWriter:
+    """Serializes the message writes of one thread within the process.
+
+    Writes are sent in the order they were queued and wait for the active run
+    of the thread to end. User text messages queued together while waiting are
+    merged into a single message. Writes fail with RunAwaitingToolOutputs while
+    a deferred run waits for tool outputs, which may take until it expires.
+    """
+
+    def __init__(self, api_key: str, thread_id: str):
+        self._api_key = api_key
+        self._thread_id = thread_id
+        self._queue: list[_PendingWrite] = []
+        self._drain_task: asyncio.Task | None = None
+        self._active_runs: set[str] = set()
+        self._deferred_runs: set[str] = set()
+        self._runs_done = asyncio.Event()
+        self._runs_done.set()
+
+    @property
+    def has_active_run(self) -> bool:
+        return bool(self._active_runs)
+
+    def run_started(self, run_id: str) -> None:
+        self._active_runs.add(run_id)
+        self._deferred_runs.discard(run_id)
+        self._runs_done.clear()
+
+    def run_deferred(self, run_id: str) -> None:
+        """Marks an active run as left waiting for tool outputs."""
+        if run_id in self._active_runs:
+            self._deferred_runs.add(run_id)
+            self._fail_deferred_writes()
+
+    def run_finished(self, run_id: str) -> None:
+        self._active_runs.discard(run_id)
+        self._deferred_runs.discard(run_id)
+        if not self._active_runs:
+            self._runs_done.set()
+
+    async def write(
+        self, role: str, content: str | None, files: list[OpenAiFileSpec] = None
+    ) -> None:
+        if self._deferred_runs:
+            # a deferred run that expired upstream no longer holds the thread
+            if await self._has_upstream_active_run():
+                raise self._deferred_error()
+            self._release_runs()
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append(_PendingWrite(role, content, files, [future]))
+
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.get_running_loop().create_task(self._drain())
+
+        await future
+
+    async def _drain(self) -> None:
+        while self._queue:
+            await self._wait_for_runs()
+            if not self._queue:
+                # failed while waiting, by a deferred run
+                break
+
+            write = self._take_next()
+            try:
+                await self._send(write)
+            except Exception as ex:
+                for future in write.futures:
+                    if not future.done():
+                        future.set_exception(ex)
+            else:
+                for future in write.futures:
+                    if not future.done():
+                        future.set_result(None)
+
+    def _fail_deferred_writes(self) -> None:
+        error = self._deferred_error()
+        for write in self._queue:
+            for future in write.futures:
+                if not future.done():
+                    future.set_exception(error)
+        self._queue.clear()
+
+    def _deferred_error(self) -> RunAwaitingToolOutputs:
+        return RunAwaitingToolOutputs(self._thread_id, next(iter(self._deferred_runs)))
+
+    def _take_next(self) -> _PendingWrite:
+        write = self._queue.pop(0)
+        if not write.can_coalesce:
+            return write
+
+        contents = [write.content]
+        while self._queue and self._queue[0].can_coalesce:
+            queued = self._queue.pop(0)
+            contents.append(queued.content)
+            write.futures.extend(queued.futures)
+
+        write.content = "\n\n".join(contents)
+        return write
+
+    async def _send(self, write: _PendingWrite) -> None:
+        for attempt in range(1, _MAX_WRITE_ATTEMPTS + 1):
+            try:
+                await client.create_message(
+                    self._api_key,
+                    self._thread_id,
+                    write.role,
+                    write.content,
+                    files=write.files,
+                )
+                return
+            except HTTPRequestError as ex:
+                if ex.status != HTTPStatus.BAD_REQUEST or attempt == _MAX_WRITE_ATTEMPTS:
+                    raise
+                # only a run started outside this process is worth waiting for
+                if not await self._has_upstream_active_run():
+                    raise
+                logging.info(f"Waiting for active run to write to {self._thread_id}")
+                await self._wait_for_upstream_run()
+
+    async def _wait_for_runs(self) -> None:
+        while not self._runs_done.is_set():
+            try:
+                await asyncio.wait_for(self._runs_done.wait(), _RUN_CHECK_INTERVAL)
+            except TimeoutError:
+                # runs abandoned by their callers must not block writes forever
+                if not await self._has_upstream_active_run():
+                    self._release_runs()
+
+    def _release_runs(self) -> None:
+        self._active_runs.clear()
+        self._deferred_runs.clear()
+        self._runs_done.set()
+
+    async def _wait_for_upstream_run(self) -> None:
+        while await self._has_upstream_active_run():
+            await asyncio.sleep(_UPSTREAM_CHECK_INTERVAL)
+
+    async def _has_upstream_active_run(self) -> bool:
+        runs = await client.list_runs(self._api_key, self._thread_id, limit=1)
+        return bool(runs) and runs[0].status in ACTIVE_RUN_STATUSES
+
+
+_writers: weakref.WeakValueDictionary[str, SessionWriter] = (
+    weakref.WeakValueDictionary()
+)
+
+
+def get_session_writer(api_key: str, thread_id: str) -> SessionWriter:
+    """Returns the writer shared by every session object of `thread_id`."""
+    writer = _writers.get(thread_id)
+    if writer is None:
+        writer = SessionWriter(api_key, thread_id)
+        _writers[thread_id] = writer
+    return writer
@@ -0,0 +1,180 @@
+"""Runs AssignmentSpecs read as JSONL from a file or stdin.
+
+    python -m bluemarz.run specs.jsonl -o results.jsonl -c 32 --checkpoint run.ckpt
+
+Every input line is run with `Assignment.from_spec` and `run_until_breakpoint`
+and produces one output line with its line number and result or error.
+Completed line numbers are appended to the checkpoint file after their output
+is written, so running again with the same checkpoint skips them and runs the
+failed lines again. A resumed run appends to the output, where a line run again
+then has several records: the last record of a line is its outcome.
+"""
+
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+import importlib
+import math
+import sys
+import time
+from typing import IO, Awaitable, Callable, Iterable
+
+import orjson
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.models import AssignmentRunResult, AssignmentSpec
+
+
+@dataclass
+class RunStats:
+    completed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed: float = 0
+    latencies: list[float] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return (self.completed + self.failed) / self.elapsed if self.elapsed else 0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    def summary(self) -> str:
+        return (
+            f"completed={self.completed} failed={self.failed} skipped={self.skipped} "
+            f"elapsed={self.elapsed:.2f}s throughput={self.throughput:.2f}/s "
+            f"p50={self.percentile(50):.3f}s p90={self.percentile(90):.3f}s "
+            f"p99={self.percentile(99):.3f}s max={self.percentile(100):.3f}s"
+        )
+
+
+async def run_assignment(spec: AssignmentSpec) -> AssignmentRunResult:
+    assignment = await Assignment.from_spec(spec)
+    return await assignment.run_until_breakpoint()
+
+
+def read_checkpoint(path: str | None) -> set[int]:
+    if not path:
+        return set()
+    try:
+        with open(path) as f:
+            return {int(line) for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+async def run_specs(
+    lines: Iterable[str | bytes],
+    output: IO[bytes],
+    concurrency: int = 8,
+    checkpoint: IO[str] | None = None,
+    done: set[int] | None = None,
+    execute: Callable[[AssignmentSpec], Awaitable[AssignmentRunResult]] = run_assignment,
+) -> RunStats:
+    """Runs the specs of `lines` with at most `concurrency` at a time.
+
+    Input is read only as fast as slots free up, so large files are streamed,
+    and in a worker thread, so slow reads do not block the event loop. Lines
+    numbered in `done` are skipped.
+    """
+    stats = RunStats()
+    done = done or set()
+    slots = asyncio.Semaphore(concurrency)
+    tasks: set[asyncio.Task] = set()
+    start = time.perf_counter()
+
+    async def run_line(number: int, line: str | bytes) -> None:
+        line_start = time.perf_counter()
+        record: dict = {"line": number}
+        completed = False
+        try:
+            result = await execute(AssignmentSpec.model_validate_json(line))
+            record["result"] = result.model_dump(mode="json", by_alias=True)
+            stats.completed += 1
+            completed = True
+        except Exception as ex:
+            record["error"] = f"{type(ex).__name__}: {ex}"
+            stats.failed += 1
+        finally:
+            slots.release()
+        stats.latencies.append(time.perf_counter() - line_start)
+
+        output.write(orjson.dumps(record) + b"\n")
+        output.flush()
+        if checkpoint is not None and completed:
+            checkpoint.write(f"{number}\n")
+            checkpoint.flush()
+
+    source = iter(lines)
+    number = 0
+    while (line := await asyncio.to_thread(next, source, None)) is not None:
+        number += 1
+        if number in done:
+            stats.skipped += 1
+            continue
+        if not line.strip():
+            continue
+
+        await slots.acquire()
+        task = asyncio.create_task(run_line(number, line))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    await asyncio.gather(*tasks)
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m bluemarz.run",
+        description="Run AssignmentSpecs from a JSONL file or stdin.",
+    )
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file, - for stdout")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--checkpoint", help="file of completed line numbers")
+    parser.add_argument(
+        "-m",
+        "--module",
+        action="append",
+        default=[],
+        help="module to import before running, e.g. to register agents and tools",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    for module in args.module:
+        importlib.import_module(module)
+
+    done = read_checkpoint(args.checkpoint)
+    source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    # resumed runs append to the results written before
+    output = (
+        sys.stdout.buffer
+        if args.output == "-"
+        else open(args.output, "ab" if done else "wb")
+    )
+    checkpoint = open(args.checkpoint, "a") if args.checkpoint else None
+
+    try:
+        stats = asyncio.run(
+            run_specs(source, output, args.concurrency, checkpoint, done)
+        )
+    finally:
+        for f in (source, output, checkpoint):
+            if f is not None and f not in (sys.stdin.buffer, sys.stdout.buffer):
+                f.close()
+
+    print(stats.summary(), file=sys.stderr)
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
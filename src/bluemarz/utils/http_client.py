@@ -1,10 +1,25 @@
+from contextlib import asynccontextmanager, contextmanager
 from http import HTTPMethod, HTTPStatus
-from typing import Any, AsyncIterable, Iterable
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator
 import httpx
 
+from bluemarz.utils import metrics, tracing
+
 _sync_client: httpx.Client = httpx.Client(timeout=60)
 _async_client: httpx.AsyncClient = httpx.AsyncClient(timeout=60)
 
+_requests = metrics.get_metrics_registry().counter(
+    "bluemarz_http_requests_total",
+    "HTTP requests by endpoint and status, error when no response was received",
+    ["method", "endpoint", "status"],
+)
+_request_duration = metrics.get_metrics_registry().histogram(
+    "bluemarz_http_request_duration_seconds",
+    "HTTP request duration, until the body of streamed responses is read",
+    ["method", "endpoint"],
+)
+
 
 class HTTPRequestError(Exception):
     def __init__(
@@ -66,6 +81,9 @@ class HTTPClient:
         async def asend(self) -> httpx.Response:
             return await self._client.asend(self._request)
 
+        def astream(self):
+            return self._client.astream(self._request)
+
     @property
     def client(self) -> httpx.Client:
         return _sync_client
@@ -105,20 +123,80 @@ class HTTPClient:
         )
 
     def send(self, req: httpx.Request) -> httpx.Response:
-        try:
-            response = self.client.send(req)
-            response.raise_for_status()
-            return response
-        except httpx.HTTPError as ex:
-            raise _convert_exception(req, ex)
+        with _observe_request(req) as observation:
+            try:
+                response = self.client.send(req)
+                observation.set_response(response)
+                response.raise_for_status()
+                return response
+            except httpx.HTTPError as ex:
+                raise _convert_exception(req, ex)
 
     async def asend(self, req: httpx.Request) -> httpx.Response:
+        with _observe_request(req) as observation:
+            try:
+                response = await self.aclient.send(req)
+                observation.set_response(response)
+                response.raise_for_status()
+                return response
+            except httpx.HTTPError as ex:
+                raise _convert_exception(req, ex)
+
+    @asynccontextmanager
+    async def astream(self, req: httpx.Request) -> AsyncIterator[httpx.Response]:
+        """Sends `req` and yields the response before its body is read."""
+        with _observe_request(req) as observation:
+            try:
+                response = await self.aclient.send(req, stream=True)
+            except httpx.HTTPError as ex:
+                raise _convert_exception(req, ex)
+
+            observation.set_response(response)
+            try:
+                if response.is_error:
+                    await response.aread()
+                    try:
+                        response.raise_for_status()
+                    except httpx.HTTPError as ex:
+                        raise _convert_exception(req, ex)
+                yield response
+            finally:
+                await response.aclose()
+
+
+class _RequestObservation:
+    def __init__(self, span: tracing.Span) -> None:
+        self.span = span
+        self.status = "error"
+
+    def set_response(self, response: httpx.Response) -> None:
+        self.status = str(response.status_code)
+        self.span.set_attribute("http.status_code", response.status_code)
+
+
+@contextmanager
+def _observe_request(req: httpx.Request) -> Iterator[_RequestObservation]:
+    """Traces and measures the block that sends `req`."""
+    endpoint = metrics.endpoint_label(req.url.path)
+    start = time.perf_counter()
+    # the path only, query strings may hold user data
+    with tracing.span(
+        "http.request",
+        tracing.SpanKind.CLIENT,
+        **{
+            "http.method": req.method,
+            "http.host": req.url.host,
+            "http.path": req.url.path,
+        },
+    ) as span:
+        observation = _RequestObservation(span)
         try:
-            response = await self.aclient.send(req)
-            response.raise_for_status()
-            return response
-        except httpx.HTTPError as ex:
-            raise _convert_exception(req, ex)
+            yield observation
+        finally:
+            _requests.inc(method=req.method, endpoint=endpoint, status=observation.status)
+            _request_duration.observe(
+                time.perf_counter() - start, method=req.method, endpoint=endpoint
+            )
 
 
 def _join_dicts_none_safe(d1: dict | None, d2: dict | None):
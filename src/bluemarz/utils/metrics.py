@@ -0,0 +1,281 @@
+"""In-process counters, gauges and histograms in the Prometheus text format.
+
+    from bluemarz.utils.metrics import generate_latest
+    body = generate_latest()  # serve as text/plain; version=0.0.4
+
+Metrics are created once, at import time of the modules they measure, in the
+default registry. Metrics measured by several modules are created here.
+"""
+
+from abc import ABC, abstractmethod
+import bisect
+import math
+import re
+import threading
+from typing import Iterable
+
+CONTENT_TYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+)
+
+
+class Metric(ABC):
+    type: str
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names: tuple[str, ...] = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if labels.keys() != set(self.label_names):
+            raise ValueError(
+                f"Metric {self.name} takes labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def expose(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {_escape_help(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        pass
+
+    def _labels(self, key: tuple[str, ...], extra: str | None = None) -> str:
+        pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(self.label_names, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{self._labels(k)} {_format(v)}" for k, v in values]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+        if not self.label_names:
+            self._values[()] = 0
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{self._labels(k)} {_format(v)}" for k, v in values]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        # per label set: count of each bucket and of +Inf, then the sum
+        self._values: dict[tuple[str, ...], tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def get_count(self, **labels: str) -> int:
+        counts, _ = self._values.get(self._key(labels)) or ([0], 0)
+        return sum(counts)
+
+    def get_sum(self, **labels: str) -> float:
+        _, total = self._values.get(self._key(labels)) or ([0], 0)
+        return total
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = [(k, list(counts), total) for k, (counts, total) in self._values.items()]
+
+        lines: list[str] = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip([*self.buckets, math.inf], counts):
+                cumulative += count
+                le = f'le="{_format(bound)}"'
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(
+        self, name: str, documentation: str, labels: Iterable[str] = ()
+    ) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labels)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, labels, buckets=buckets
+        )
+
+    def get(self, name: str) -> Metric | None:
+        return self._metrics.get(name)
+
+    def expose(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(line + "\n" for m in metrics for line in m.expose())
+
+    def _get_or_create(self, cls: type[Metric], name, documentation, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labels, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.label_names != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered differently")
+            return metric
+
+
+_registry = MetricsRegistry()
+
+CACHE_REQUESTS: Counter = _registry.counter(
+    "bluemarz_cache_requests_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+)
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+def generate_latest(registry: MetricsRegistry | None = None) -> str:
+    """Returns every metric of the registry in the Prometheus text format."""
+    return (registry or _registry).expose()
+
+
+OTHER_ENDPOINT: str = "other"
+# the OpenAI routes requested by bluemarz.lib.openai.client, literal routes
+# before the routes they would match as ids
+_ENDPOINTS: tuple[str, ...] = (
+    "/v1/assistants",
+    "/v1/assistants/{id}",
+    "/v1/batches",
+    "/v1/batches/{id}",
+    "/v1/batches/{id}/cancel",
+    "/v1/chat/completions",
+    "/v1/files",
+    "/v1/files/{id}",
+    "/v1/files/{id}/content",
+    "/v1/threads",
+    "/v1/threads/runs",
+    "/v1/threads/{id}",
+    "/v1/threads/{id}/messages",
+    "/v1/threads/{id}/messages/{id}",
+    "/v1/threads/{id}/runs",
+    "/v1/threads/{id}/runs/{id}",
+    "/v1/threads/{id}/runs/{id}/cancel",
+    "/v1/threads/{id}/runs/{id}/steps",
+    "/v1/threads/{id}/runs/{id}/steps/{id}",
+    "/v1/threads/{id}/runs/{id}/submit_tool_outputs",
+    "/v1/vector_stores",
+    "/v1/vector_stores/{id}",
+    "/v1/vector_stores/{id}/file_batches",
+    "/v1/vector_stores/{id}/file_batches/{id}",
+    "/v1/vector_stores/{id}/file_batches/{id}/cancel",
+    "/v1/vector_stores/{id}/files",
+    "/v1/vector_stores/{id}/files/{id}",
+)
+_ENDPOINT_PATTERNS: list[tuple[str, re.Pattern]] = [
+    (e, re.compile(re.escape(e).replace(re.escape("{id}"), "[^/]+") + "$"))
+    for e in _ENDPOINTS
+]
+
+
+def endpoint_label(path: str) -> str:
+    """Returns the known route of a url path, e.g. /v1/threads/thread_abc/runs ->
+    /v1/threads/{id}/runs, and OTHER_ENDPOINT for any other path, so labels stay few.
+    """
+    for endpoint, pattern in _ENDPOINT_PATTERNS:
+        if pattern.match(path):
+            return endpoint
+    return OTHER_ENDPOINT
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,302 @@
+"""Spans around assignment builds, runs, polls, tool calls and HTTP requests.
+
+Tracing is off until an exporter is set with `set_span_exporter`; until then
+`span` yields a shared span that records nothing. Spans started while another
+span is current, in the same task or in tasks created from it, are its
+children.
+"""
+
+from abc import ABC, abstractmethod
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import Enum, IntEnum
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any
+
+import httpx
+import orjson
+
+
+class SpanKind(IntEnum):
+    # values of the OTLP enum
+    INTERNAL = 1
+    CLIENT = 3
+
+
+class SpanStatus(str, Enum):
+    UNSET = "unset"
+    OK = "ok"
+    ERROR = "error"
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str = ""
+    span_id: str = ""
+    parent_id: str | None = None
+    kind: SpanKind = SpanKind.INTERNAL
+    start_time: int = 0
+    end_time: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: SpanStatus = SpanStatus.UNSET
+    status_message: str | None = None
+    is_recording: bool = True
+
+    @property
+    def duration(self) -> float | None:
+        """Seconds between start and end, None while the span is open."""
+        if self.end_time is None:
+            return None
+        return (self.end_time - self.start_time) / 1e9
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.is_recording and value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, ex: BaseException) -> None:
+        if self.is_recording:
+            self.status = SpanStatus.ERROR
+            self.status_message = f"{type(ex).__name__}: {ex}"
+
+
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, spans: Sequence[Span]) -> None:
+        """Receives spans as they end. Must not block the event loop."""
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+
+class NoOpSpanExporter(SpanExporter):
+    def export(self, spans: Sequence[Span]) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps ended spans in memory, for tests."""
+
+    def __init__(self):
+        self._spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[Span]) -> None:
+        with self._lock:
+            self._spans.extend(spans)
+
+    def get_finished_spans(self, name: str | None = None) -> list[Span]:
+        with self._lock:
+            return [s for s in self._spans if name is None or s.name == name]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class OtlpSpanExporter(SpanExporter):
+    """Exports spans as OTLP/JSON trace requests, sent by `send`."""
+
+    def __init__(self, service_name: str = "bluemarz"):
+        self.service_name = service_name
+
+    @abstractmethod
+    def send(self, payload: dict[str, Any]) -> None:
+        pass
+
+    def export(self, spans: Sequence[Span]) -> None:
+        self.send(self.to_otlp(spans))
+
+    def to_otlp(self, spans: Sequence[Span]) -> dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _to_otlp_attributes(
+                            {"service.name": self.service_name}
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "bluemarz"},
+                            "spans": [_to_otlp_span(s) for s in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+
+class OtlpHttpSpanExporter(OtlpSpanExporter):
+    """Posts spans to an OTLP/HTTP collector, e.g. http://localhost:4318/v1/traces.
+
+    Spans are queued and sent in batches from a background thread, so ending a
+    span never waits on the collector. Spans are dropped while the queue is full
+    and after `shutdown`.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        headers: dict[str, str] | None = None,
+        service_name: str = "bluemarz",
+        max_batch_size: int = 512,
+        flush_interval: float = 5,
+        max_queue_size: int = 8192,
+    ):
+        super().__init__(service_name)
+        self.endpoint = endpoint
+        self._headers = {"Content-Type": "application/json"} | (headers or {})
+        self._max_batch_size = max_batch_size
+        self._flush_interval = flush_interval
+        # not the traced http client, its requests would be traced too
+        self._client = httpx.Client(timeout=10)
+        self._queue: queue.Queue[Span | None] = queue.Queue(max_queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def export(self, spans: Sequence[Span]) -> None:
+        if self._closed:
+            return
+        for span in spans:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                logging.warning("Span queue is full, dropping span")
+
+    def send(self, payload: dict[str, Any]) -> None:
+        response = self._client.post(
+            self.endpoint, content=orjson.dumps(payload), headers=self._headers
+        )
+        response.raise_for_status()
+
+    def shutdown(self, timeout: float | None = 30) -> None:
+        """Sends the queued spans, waiting at most `timeout` seconds for them."""
+        self._closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # the worker stops on its own once the queue is drained
+            pass
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logging.warning(f"Span exporter did not finish sending in {timeout}s")
+        else:
+            self._client.close()
+
+    def _work(self) -> None:
+        stopped = False
+        while not stopped:
+            batch: list[Span] = []
+            flush_at = time.monotonic() + self._flush_interval
+            while len(batch) < self._max_batch_size:
+                # once closed, no spans are added and an empty queue is the end
+                timeout = 0 if self._closed else max(0, flush_at - time.monotonic())
+                try:
+                    span = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    stopped = self._closed
+                    break
+                if span is None:
+                    stopped = True
+                    break
+                batch.append(span)
+
+            if batch:
+                try:
+                    super().export(batch)
+                except Exception as ex:
+                    logging.warning(f"Could not export {len(batch)} spans: {ex}")
+
+
+_NON_RECORDING_SPAN = Span("", is_recording=False)
+_current_span: ContextVar[Span | None] = ContextVar("bluemarz_span", default=None)
+_exporter: SpanExporter | None = None
+
+
+def set_span_exporter(exporter: SpanExporter | None) -> None:
+    global _exporter
+    _exporter = exporter
+
+
+def get_span_exporter() -> SpanExporter | None:
+    return _exporter
+
+
+def get_current_span() -> Span:
+    return _current_span.get() or _NON_RECORDING_SPAN
+
+
+@contextmanager
+def span(
+    name: str, kind: SpanKind = SpanKind.INTERNAL, **attributes: Any
+) -> Iterator[Span]:
+    """Runs the block in a span, which ends with an error status if it raises."""
+    exporter = _exporter
+    if exporter is None:
+        yield _NON_RECORDING_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name,
+        trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if parent else None,
+        kind=kind,
+        start_time=time.time_ns(),
+        attributes={k: v for k, v in attributes.items() if v is not None},
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as ex:
+        current.set_error(ex)
+        raise
+    finally:
+        current.end_time = time.time_ns()
+        _current_span.reset(token)
+        try:
+            exporter.export([current])
+        except Exception as ex:
+            logging.warning(f"Could not export span {name}: {ex}")
+
+
+def _to_otlp_span(span: Span) -> dict[str, Any]:
+    otlp_span: dict[str, Any] = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": int(span.kind),
+        "startTimeUnixNano": str(span.start_time),
+        "endTimeUnixNano": str(span.end_time or span.start_time),
+        "attributes": _to_otlp_attributes(span.attributes),
+        "status": {"code": {SpanStatus.OK: 1, SpanStatus.ERROR: 2}.get(span.status, 0)},
+    }
+    if span.parent_id:
+        otlp_span["parentSpanId"] = span.parent_id
+    if span.status_message:
+        otlp_span["status"]["message"] = span.status_message
+    return otlp_span
+
+
+def _to_otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [{"key": k, "value": _to_otlp_value(v)} for k, v in attributes.items()]
+
+
+def _to_otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
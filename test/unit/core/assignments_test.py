@@ -0,0 +1,283 @@
+import asyncio
+import time
+
+import httpx
+import orjson
+import pytest
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.class_registry import sync_tool_executor
+from bluemarz.core.exceptions import InvalidDefinition
+from bluemarz.core.interfaces import SyncToolExecutor
+from bluemarz.core.models import (
+    AgentSpec,
+    AssignmentSpec,
+    AsyncToolMode,
+    RunResultType,
+    PartialAssignmentRunResult,
+    PartialResultReason,
+    SessionMessage,
+    SessionSpec,
+    ToolCall,
+    ToolCallResult,
+    ToolSpec,
+)
+from bluemarz.lib.openai.components import (
+    OpenAiAssistant,
+    OpenAiAssistantNativeSession,
+)
+from bluemarz.lib.openai.session_writer import RunAwaitingToolOutputs
+from bluemarz.utils import http_client
+from bluemarz.utils.http_client import HTTPRequestError
+
+
+@sync_tool_executor
+class AssignmentsTestLookup(SyncToolExecutor):
+    @classmethod
+    def tool_name(cls) -> str:
+        return "assignments_test_lookup"
+
+    @classmethod
+    def execute_call(cls, tool_call: ToolCall) -> ToolCallResult:
+        return ToolCallResult(tool_call=tool_call, text="found")
+
+
+def _run(status: str, **kwargs) -> dict:
+    return {"id": "run_1", "assistant_id": "asst", "thread_id": "thread",
+            "status": status, "model": "m", "tools": [], "response_format": "auto",
+            "tool_choice": "auto", "parallel_tool_calls": True, **kwargs}
+
+
+def _mock(monkeypatch, run: dict, create_delay: float = 0) -> list[str]:
+    cancelled: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.startswith("/v1/assistants/"):
+            return httpx.Response(200, json={"id": "asst", "model": "m"})
+        if path.endswith("/cancel"):
+            cancelled.append(path.split("/")[-2])
+            return httpx.Response(200, json=_run("cancelling"))
+        if request.method == "POST":
+            await asyncio.sleep(create_delay)
+        return httpx.Response(200, json=run)
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return cancelled
+
+
+async def _assignment(tools: list[ToolSpec] = ()) -> Assignment:
+    agent = await OpenAiAssistant.restore(
+        AgentSpec(id="asst", api_key="key", type="OpenAiAssistant",
+                  session_type="OpenAiAssistantNativeSession", tools=list(tools))
+    )
+    session = await OpenAiAssistantNativeSession.restore(
+        SessionSpec(id="thread", api_key="key", type="OpenAiAssistantNativeSession")
+    )
+    return Assignment(agent, session)
+
+
+def _run_with_deadline(timeout: float, **kwargs) -> PartialAssignmentRunResult:
+    async def scenario():
+        assignment = await _assignment()
+        deadline = asyncio.get_running_loop().time() + timeout
+        return await assignment.run_until_breakpoint(deadline, **kwargs)
+
+    return asyncio.run(scenario())
+
+
+def test_deadline_while_polling_cancels_the_run_once(monkeypatch):
+    cancelled = _mock(monkeypatch, _run("in_progress"))
+
+    result = _run_with_deadline(0.1)
+
+    assert result.reason == PartialResultReason.DEADLINE_EXCEEDED
+    assert cancelled == ["run_1"]
+
+
+def test_deadline_while_creating_the_run_still_cancels_it(monkeypatch):
+    cancelled = _mock(monkeypatch, _run("queued"), create_delay=0.2)
+
+    result = _run_with_deadline(0.05)
+
+    assert result.reason == PartialResultReason.DEADLINE_EXCEEDED
+    assert cancelled == ["run_1"]
+
+
+def test_max_tool_rounds_cancels_the_run(monkeypatch):
+    required_action = {"type": "submit_tool_outputs", "submit_tool_outputs": {
+        "tool_calls": [{"id": "call_1", "type": "function", "function": {
+            "name": "assignments_test_lookup", "arguments": "{}"}}]}}
+    cancelled = _mock(
+        monkeypatch, _run("requires_action", required_action=required_action)
+    )
+
+    async def scenario():
+        assignment = await _assignment(
+            [ToolSpec(tool_type="sync", name="assignments_test_lookup", description="l")]
+        )
+        return await assignment.run_until_breakpoint(max_tool_rounds=0)
+
+    result = asyncio.run(scenario())
+
+    assert result.reason == PartialResultReason.MAX_TOOL_ROUNDS
+    assert result.last_run_result.tool_calls[0].id == "call_1"
+    assert cancelled == ["run_1"]
+
+
+def test_cancelling_the_task_cancels_the_run_once(monkeypatch):
+    cancelled = _mock(monkeypatch, _run("in_progress"))
+
+    async def scenario():
+        assignment = await _assignment()
+        task = asyncio.create_task(assignment.run_until_breakpoint())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # cancelling again is a no-op
+        assignment.run_id = "run_1"
+        await assignment.cancel()
+
+    asyncio.run(scenario())
+
+    assert cancelled == ["run_1"]
+
+
+def _mock_thread_api(
+    monkeypatch,
+    run: dict,
+    assistant_status: int = 200,
+    delay: float = 0,
+    thread_delay: float | None = None,
+) -> list[tuple[str, str, dict | None]]:
+    thread_delay = delay if thread_delay is None else thread_delay
+    requests: list[tuple[str, str, dict | None]] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix("/v1")
+        body = orjson.loads(request.content) if request.content else None
+        requests.append((request.method, path, body))
+        if path == "/assistants/asst":
+            await asyncio.sleep(delay)
+            return httpx.Response(assistant_status, json={"id": "asst", "model": "m"})
+        if path in ("/threads", "/threads/thread_new"):
+            await asyncio.sleep(thread_delay if path == "/threads" else 0)
+            return httpx.Response(200, json={"id": "thread_new"})
+        if path == "/threads/thread_new/messages" and request.method == "GET":
+            return httpx.Response(200, json={"data": [{"id": "msg_1", "role": "assistant",
+                "content": [{"type": "text", "text": {"value": "done", "annotations": []}}]}]})
+        if path == "/threads/thread_new/messages":
+            return httpx.Response(200, json={"id": "msg", "role": "user", "content": []})
+        if path == "/threads/thread_new/runs" and request.method == "GET":
+            return httpx.Response(200, json={"data": [run]})
+        if path.endswith("/submit_tool_outputs"):
+            run.update(status="completed", required_action=None)
+        return httpx.Response(200, json=run)
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return requests
+
+
+def _spec(**kwargs) -> AssignmentSpec:
+    kwargs.setdefault(
+        "session", SessionSpec(api_key="key", type="OpenAiAssistantNativeSession")
+    )
+    return AssignmentSpec(
+        agent=AgentSpec(id="asst", api_key="key", type="OpenAiAssistant",
+                        session_type="OpenAiAssistantNativeSession"),
+        **kwargs,
+    )
+
+
+def test_agent_and_session_are_built_concurrently(monkeypatch):
+    requests = _mock_thread_api(monkeypatch, _run("completed"), delay=0.2)
+
+    start = time.perf_counter()
+    assignment = asyncio.run(Assignment.from_spec(_spec(query="hello")))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.35
+    assert set(assignment.build_timings) == {
+        "agent", "session", "messages", "validate", "total"
+    }
+    assert assignment.build_timings["agent"] >= 0.2
+    assert ("POST", "/threads/thread_new/messages") in [r[:2] for r in requests]
+
+
+def test_failed_agent_build_deletes_the_new_session(monkeypatch):
+    # the agent fails while the thread is still being created
+    requests = _mock_thread_api(
+        monkeypatch, _run("completed"), assistant_status=404, thread_delay=0.05
+    )
+
+    with pytest.raises(HTTPRequestError):
+        asyncio.run(Assignment.from_spec(_spec(query="hello")))
+
+    assert requests[-1][:2] == ("DELETE", "/threads/thread_new")
+
+
+def test_cancelled_or_invalid_build_deletes_the_new_session(monkeypatch):
+    requests = _mock_thread_api(monkeypatch, _run("completed"), thread_delay=0.05)
+
+    # cancelled while the thread is being created
+    with pytest.raises(TimeoutError):
+        asyncio.run(asyncio.wait_for(Assignment.from_spec(_spec(query="hello")), 0.01))
+    assert requests[-1][:2] == ("DELETE", "/threads/thread_new")
+
+    # the session key does not match the agent key
+    requests.clear()
+    session = SessionSpec(api_key="other", type="OpenAiAssistantNativeSession")
+    with pytest.raises(InvalidDefinition, match="same api key"):
+        asyncio.run(Assignment.from_spec(_spec(query="hello", session=session)))
+    assert requests[-1][:2] == ("DELETE", "/threads/thread_new")
+
+
+def test_deferred_run_is_resumed_with_tool_outputs(monkeypatch):
+    required_action = {"type": "submit_tool_outputs", "submit_tool_outputs": {
+        "tool_calls": [{"id": "call_1", "type": "function", "function": {
+            "name": "assignments_test_async", "arguments": "{}"}}]}}
+    run = _run("requires_action", required_action=required_action)
+    requests = _mock_thread_api(monkeypatch, run)
+    tools = [ToolSpec(tool_type="async", name="assignments_test_async", description="a")]
+
+    async def scenario():
+        spec = _spec(query="hello", async_tool_mode=AsyncToolMode.DEFER)
+        spec.agent.tools = tools
+        assignment = await Assignment.from_spec(spec)
+        deferred = await assignment.run_until_breakpoint()
+        assert deferred.pending_tool_call_ids == ["call_1"]
+        with pytest.raises(RunAwaitingToolOutputs):
+            await assignment.session.add_message(
+                SessionMessage(role="user", text="too early")
+            )
+
+        resume = dict(session=SessionSpec(id="thread_new", api_key="key",
+                                          type="OpenAiAssistantNativeSession"),
+                      run_id="run_1", async_tool_mode=AsyncToolMode.DEFER)
+        with pytest.raises(InvalidDefinition, match="resuming run run_1"):
+            await Assignment.from_spec(_spec(query="hello", **resume))
+
+        requests.clear()
+        resumed = await Assignment.from_spec(_spec(**resume))
+        resumed.agent.add_tools_from_spec(tools)
+        await resumed.submit_tool_calls([ToolCallResult(
+            tool_call=deferred.last_run_result.tool_calls[0], text="found")])
+        return await resumed.run_until_breakpoint()
+
+    result = asyncio.run(scenario())
+
+    assert result.last_run_result.result_type == RunResultType.MESSAGE_RESPONSE
+    assert [m.text for m in result.last_run_result.messages] == ["done"]
+    # resuming adds no message to the locked thread
+    assert ("POST", "/threads/thread_new/messages") not in [r[:2] for r in requests]
@@ -0,0 +1,42 @@
+from bluemarz.core.parameters import ParameterTemplate
+
+
+def test_render_replaces_top_level_and_nested_placeholders():
+    source = {
+        "user": "$parameters.user",
+        "headers": {"auth": "$parameters.token", "static": "value"},
+        "ids": ["$parameters.first", {"id": "$parameters.second"}],
+    }
+    template = ParameterTemplate.compile(source)
+
+    result = template.render(
+        {"user": "u", "token": "t", "first": 1, "second": 2}
+    )
+
+    assert result == {
+        "user": "u",
+        "headers": {"auth": "t", "static": "value"},
+        "ids": [1, {"id": 2}],
+    }
+    assert source["headers"]["auth"] == "$parameters.token"
+    assert source["ids"][1]["id"] == "$parameters.second"
+
+
+def test_render_keeps_unknown_placeholders():
+    template = ParameterTemplate.compile({"user": "$parameters.missing"})
+
+    assert template.render({}) == {"user": "$parameters.missing"}
+
+
+def test_render_without_placeholders_returns_source():
+    source = {"user": "u"}
+    template = ParameterTemplate.compile(source)
+
+    assert not template.has_placeholders
+    assert template.render({"user": "other"}) is source
+
+
+def test_merge_lays_rendered_parameters_over_super_parameters():
+    template = ParameterTemplate.compile({"name": "$parameters.user", "a": 1})
+
+    assert template.merge({"user": "u", "a": 0}) == {"user": "u", "name": "u", "a": 1}
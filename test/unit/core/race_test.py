@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+import orjson
+import pytest
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.interfaces import Agent, Session
+from bluemarz.core.models import AgentSpec, AssignmentSpec, SessionMessage
+from bluemarz.core.race import RaceAssignment
+from bluemarz.lib.openai import chat
+from bluemarz.utils import http_client
+
+
+@pytest.fixture
+def store(monkeypatch) -> chat.InMemoryChatSessionStore:
+    store = chat.InMemoryChatSessionStore()
+    monkeypatch.setattr(chat, "_chat_session_store", store)
+    return store
+
+
+def _mock_models(monkeypatch, delays: dict[str, float]) -> list[str]:
+    started: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        model = orjson.loads(request.content)["model"]
+        started.append(model)
+        await asyncio.sleep(delays[model])
+        chunk = {"id": f"c_{model}", "model": model,
+                 "choices": [{"delta": {"content": f"answer from {model}"}}]}
+        return httpx.Response(
+            200, content=b"data: " + orjson.dumps(chunk) + b"\n\ndata: [DONE]\n\n"
+        )
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return started
+
+
+async def _build(models: list[str]) -> tuple[list[Agent], Session]:
+    assignments = [
+        await Assignment.from_spec(
+            AssignmentSpec(
+                agent=AgentSpec(
+                    id=model, api_key="key", type="OpenAiChatAgent",
+                    session_type="OpenAiChatSession", model=model,
+                ),
+            )
+        )
+        for model in models
+    ]
+    session = assignments[0].session
+    for assignment in assignments[1:]:
+        await assignment.session.delete_session()
+    await session.add_message(SessionMessage(role="user", text="question"))
+    return [a.agent for a in assignments], session
+
+
+def test_first_answer_wins_and_every_fork_is_deleted(monkeypatch, store):
+    started = _mock_models(monkeypatch, {"fast": 0, "slow": 5, "late": 0})
+    forked: list[str] = []
+
+    async def scenario():
+        agents, session = await _build(["fast", "slow", "late"])
+        fork = session.fork
+
+        async def counted_fork():
+            forked.append(session.spec.id)
+            return await fork()
+
+        monkeypatch.setattr(session, "fork", counted_fork)
+        race = RaceAssignment(agents, session, hedge_delay=[0, 0, 5])
+        return session, await race.run_until_breakpoint()
+
+    session, result = asyncio.run(scenario())
+
+    assert result.winner_agent_id == "fast" and result.accepted
+    # the slow run was cancelled and the late agent was never forked or started
+    assert sorted(started) == ["fast", "slow"] and len(forked) == 2
+    assert list(store._sessions) == [session.spec.id]
+    assert store.get_messages(session.spec.id)[-1]["content"] == "answer from fast"
+
+
+def test_first_result_is_returned_when_none_is_accepted(monkeypatch, store):
+    _mock_models(monkeypatch, {"fast": 0, "slow": 0.05})
+
+    async def scenario():
+        agents, session = await _build(["fast", "slow"])
+        race = RaceAssignment(agents, session, accept=lambda r: False, keep_forks=True)
+        return session, await race.run_until_breakpoint()
+
+    session, result = asyncio.run(scenario())
+
+    assert result.winner_agent_id == "fast" and not result.accepted
+    assert len(store._sessions) == 3
+    assert [m["role"] for m in store.get_messages(session.spec.id)] == ["user"]
@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+import orjson
+
+from bluemarz.core.models import AssignmentSpec
+from bluemarz.core.registry_loader import UrlRegistryLoader
+
+
+def _spec_json(id: str, query: str = None) -> dict:
+    return {
+        "agent": {"id": id, "type": "MockAgent", "sessionType": "MockSession"},
+        "query": query,
+    }
+
+
+def test_loader_revalidates_only_changed_specs_and_honors_etag():
+    documents = [
+        {"a": _spec_json("a"), "b": _spec_json("b")},
+        {"a": _spec_json("a"), "b": _spec_json("b", "changed")},
+    ]
+    requests: list[httpx.Request] = []
+    current = {"version": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        version = str(current["version"])
+        if request.headers.get("If-None-Match") == version:
+            return httpx.Response(304)
+        return httpx.Response(
+            200, content=orjson.dumps(documents[current["version"]]), headers={"ETag": version}
+        )
+
+    async def scenario():
+        loader = UrlRegistryLoader[AssignmentSpec](AssignmentSpec, "http://test/specs")
+        loader._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        assert await loader.load()
+        first_a = loader.registry.get_by_id("a")
+        first_b = loader.registry.get_by_id("b")
+
+        assert not await loader.load()
+        current["version"] = 1
+        assert await loader.load()
+        await loader.stop()
+        return loader, first_a, first_b
+
+    loader, first_a, first_b = asyncio.run(scenario())
+
+    assert requests[1].headers["If-None-Match"] == "0"
+    assert loader.registry.get_by_id("a") is first_a
+    assert loader.registry.get_by_id("b") is not first_b
+    assert loader.registry.get_by_id("b").query == "changed"
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from bluemarz.core.models import AgentSpec
+from bluemarz.core.scheduler import AssignmentScheduler, Priority
+
+
+class _Agent:
+    def __init__(self, api_key: str):
+        self.spec = AgentSpec(
+            id="agent", api_key=api_key, type="MockAgent", session_type="MockSession"
+        )
+
+
+class _Assignment:
+    def __init__(self, name: str, api_key: str = "key"):
+        self.name = name
+        self.agent = _Agent(api_key)
+
+
+def test_scheduler_bounds_in_flight_and_orders_by_priority_and_tenant():
+    started: list[str] = []
+
+    async def run(assignment: _Assignment) -> str:
+        started.append(assignment.name)
+        await asyncio.sleep(0.01)
+        return assignment.name
+
+    async def scenario():
+        scheduler = AssignmentScheduler(max_in_flight_per_key=1)
+        handles = [
+            scheduler.submit(_Assignment("first"), Priority.BATCH, "a", run),
+            scheduler.submit(_Assignment("batch"), Priority.BATCH, "a", run),
+            scheduler.submit(_Assignment("a1"), Priority.INTERACTIVE, "a", run),
+            scheduler.submit(_Assignment("a2"), Priority.INTERACTIVE, "a", run),
+            scheduler.submit(_Assignment("b1"), Priority.INTERACTIVE, "b", run),
+        ]
+        assert scheduler.in_flight("key") == 1
+        assert scheduler.queued() == 4
+
+        results = [await h for h in handles]
+        stats = scheduler.queue_time_stats(Priority.INTERACTIVE)
+        return results, stats
+
+    results, stats = asyncio.run(scenario())
+
+    assert started == ["first", "a1", "b1", "a2", "batch"]
+    assert results == ["first", "batch", "a1", "a2", "b1"]
+    assert stats.count == 3 and stats.max > 0
+
+
+def test_scheduler_keys_are_independent_and_queue_is_bounded():
+    async def run(assignment: _Assignment) -> str:
+        await asyncio.sleep(0.01)
+        return assignment.name
+
+    async def scenario():
+        scheduler = AssignmentScheduler(max_in_flight_per_key=1, max_queued=1)
+        first = scheduler.submit(_Assignment("k1", "key1"), run=run)
+        second = scheduler.submit(_Assignment("k2", "key2"), run=run)
+        queued = scheduler.submit(_Assignment("k1-queued", "key1"), run=run)
+
+        assert scheduler.in_flight() == 2
+        with pytest.raises(asyncio.QueueFull):
+            scheduler.submit(_Assignment("rejected", "key1"), run=run)
+
+        queued.cancel()
+        await asyncio.sleep(0)
+        # the cancelled handle leaves the queue and frees its slot
+        assert scheduler.queued() == 0 and scheduler.queued("key1") == 0
+        accepted = scheduler.submit(_Assignment("accepted", "key1"), run=run)
+        assert scheduler.queued() == 1
+        assert await accepted == "accepted"
+        return await first, await second, queued
+
+    first, second, queued = asyncio.run(scenario())
+
+    assert (first, second) == ("k1", "k2")
+    assert queued.done()
@@ -0,0 +1,41 @@
+import pytest
+
+from bluemarz.core.exceptions import InvalidDefinition
+from bluemarz.core.snapshot import (
+    AssignmentSnapshot,
+    parameters_digest,
+    set_snapshot_secret,
+)
+
+
+def _snapshot() -> AssignmentSnapshot:
+    return AssignmentSnapshot(
+        agent_id="asst_1",
+        session_id="thread_1",
+        template_id="template",
+        run_id="run_1",
+        pending_tool_call_ids=["call_1"],
+        last_tools_submitted=["echo"],
+        parameters_digest=parameters_digest({"b": 1, "a": 2}),
+    )
+
+
+def test_snapshot_round_trip_and_signature():
+    set_snapshot_secret("secret")
+    try:
+        token = _snapshot().encode()
+        assert AssignmentSnapshot.decode(token) == _snapshot()
+        assert parameters_digest({"a": 2, "b": 1}) == _snapshot().parameters_digest
+
+        tampered = token[:-3] + ("A" if token[-3] != "A" else "B") + token[-2:]
+        with pytest.raises(InvalidDefinition, match="signature"):
+            AssignmentSnapshot.decode(tampered)
+
+        set_snapshot_secret("other")
+        with pytest.raises(InvalidDefinition, match="signature"):
+            AssignmentSnapshot.decode(token)
+    finally:
+        set_snapshot_secret(None)
+
+    with pytest.raises(InvalidDefinition, match="secret"):
+        _snapshot().encode()
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from bluemarz.core.models import AgentSpec, AssignmentSpec
+from bluemarz.core.spec_registry import (
+    AsyncSpecRegistry,
+    AsyncSpecRegistryAdapter,
+    InMemmoryRegistry,
+    SqliteSpecRegistry,
+    aget_assignment_by_id,
+    get_assignment_by_id,
+    set_assignment_registry,
+)
+
+
+def _spec(id: str) -> AssignmentSpec:
+    return AssignmentSpec(
+        agent=AgentSpec(id=id, type="MockAgent", session_type="MockSession"),
+        parameters={"key": id},
+    )
+
+
+def test_in_memmory_registry_defaults_to_empty_dict():
+    registry = InMemmoryRegistry[AssignmentSpec]()
+    registry.save_by_id("a", _spec("a"))
+
+    assert registry.get_by_id("a").agent.id == "a"
+
+
+def test_sqlite_registry_round_trip(tmp_path):
+    path = tmp_path / "specs.db"
+    registry = SqliteSpecRegistry[AssignmentSpec](AssignmentSpec, path)
+    registry.save_by_id("a", _spec("a"))
+    registry.close()
+
+    reopened = SqliteSpecRegistry[AssignmentSpec](AssignmentSpec, path)
+    assert reopened.get_by_id("a") == _spec("a")
+
+
+def test_sqlite_registry_missing_id_raises_key_error():
+    registry = SqliteSpecRegistry[AssignmentSpec](AssignmentSpec)
+
+    with pytest.raises(KeyError):
+        registry.get_by_id("missing")
+
+
+def test_sqlite_registry_bulk_operations():
+    registry = SqliteSpecRegistry[AssignmentSpec](AssignmentSpec, cache_size=2)
+    registry.save_many({str(i): _spec(str(i)) for i in range(10)})
+
+    result = registry.get_many(["1", "5", "9", "missing"])
+
+    assert len(registry) == 10
+    assert set(result) == {"1", "5", "9"}
+    assert result["5"].parameters == {"key": "5"}
+
+
+def test_sqlite_registry_cache_is_bounded():
+    registry = SqliteSpecRegistry[AssignmentSpec](AssignmentSpec, cache_size=2)
+    registry.save_many({str(i): _spec(str(i)) for i in range(5)})
+
+    first = registry.get_by_id("4")
+    assert registry.get_by_id("4") is first
+    registry.get_many(["0", "1"])
+
+    assert len(registry._cache) == 2
+    assert registry.get_by_id("4") is not first
+
+
+def test_async_adapter_batches_concurrent_lookups(mocker):
+    registry = SqliteSpecRegistry[AssignmentSpec](AssignmentSpec, cache_size=0)
+    registry.save_many({str(i): _spec(str(i)) for i in range(3)})
+    get_many = mocker.spy(registry, "get_many")
+    adapter = AsyncSpecRegistryAdapter[AssignmentSpec](registry)
+
+    async def lookup():
+        return await asyncio.gather(
+            *[adapter.aget_by_id(id) for id in ["0", "1", "2", "1"]]
+        )
+
+    specs = asyncio.run(lookup())
+
+    assert [s.agent.id for s in specs] == ["0", "1", "2", "1"]
+    get_many.assert_called_once()
+    assert adapter._loads == set()
+
+
+def test_async_adapter_missing_id_raises_key_error():
+    adapter = AsyncSpecRegistryAdapter[AssignmentSpec](InMemmoryRegistry())
+
+    with pytest.raises(KeyError):
+        asyncio.run(adapter.aget_by_id("missing"))
+
+
+class _AsyncOnlyRegistry(AsyncSpecRegistry[AssignmentSpec]):
+    def __init__(self):
+        self._specs = {"a": _spec("a")}
+
+    async def aget_by_id(self, id: str) -> AssignmentSpec:
+        return self._specs[id]
+
+    async def aget_many(self, ids):
+        return {id: self._specs[id] for id in ids if id in self._specs}
+
+    async def asave_by_id(self, id: str, spec: AssignmentSpec) -> None:
+        self._specs[id] = spec
+
+
+def test_async_only_registry_serves_async_lookups_only():
+    set_assignment_registry(_AsyncOnlyRegistry())
+    try:
+        assert asyncio.run(aget_assignment_by_id("a")).agent.id == "a"
+        with pytest.raises(Exception, match="registry not set"):
+            get_assignment_by_id("a")
+        with pytest.raises(TypeError):
+            set_assignment_registry({"a": _spec("a")})
+    finally:
+        set_assignment_registry(InMemmoryRegistry())
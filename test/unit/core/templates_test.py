@@ -0,0 +1,76 @@
+from bluemarz.core.models import AgentSpec, AssignmentSpec, SessionSpec, ToolSpec
+from bluemarz.core.templates import AssignmentTemplate
+
+
+def _spec() -> AssignmentSpec:
+    return AssignmentSpec(
+        agent=AgentSpec(
+            id="agent",
+            api_key="key",
+            type="MockAgent",
+            session_type="NativeSession",
+            tools=[ToolSpec(tool_type="sync", name="base", description="base")],
+            parameters={"user": "$parameters.user"},
+        ),
+        additional_tools=[
+            ToolSpec(
+                tool_type="sync",
+                name="extra",
+                description="extra",
+                parameters={"user": "$parameters.user"},
+            )
+        ],
+        parameters={"user": "default"},
+    )
+
+
+def test_compile_does_not_modify_source_spec():
+    spec = _spec()
+    template = AssignmentTemplate.compile(spec)
+
+    for _ in range(3):
+        template.agent_spec({"user": "other"})
+        template.session_spec()
+
+    assert spec == _spec()
+    assert [t.name for t in template.agent_spec().tools] == ["base", "extra"]
+
+
+def test_agent_spec_resolves_parameters_with_overlay():
+    template = AssignmentTemplate.compile(_spec())
+
+    assert template.agent_spec().parameters == {"user": "default"}
+    assert template.agent_spec({"user": "other"}).tools[1].parameters == {
+        "user": "other"
+    }
+
+
+def test_specs_of_one_template_do_not_share_mutable_state():
+    template = AssignmentTemplate.compile(_spec())
+
+    first, second = template.agent_spec(), template.agent_spec()
+    first.tools.append(ToolSpec(tool_type="sync", name="added", description="a"))
+    first.tools[0].parameters["user"] = "changed"
+    first.parameters["user"] = "changed"
+    template.session_spec().parameters["user"] = "changed"
+    template.parameters()["user"] = "changed"
+
+    for spec in (second, template.agent_spec()):
+        assert [t.name for t in spec.tools] == ["base", "extra"]
+        assert spec.tools[0].parameters == {"user": "default"}
+        assert spec.parameters == {"user": "default"}
+    assert template.session_spec().parameters == {"user": "default"}
+    assert template.parameters() == {"user": "default"}
+
+
+def test_native_session_spec_inherits_agent_settings():
+    template = AssignmentTemplate.compile(_spec())
+    request_session = SessionSpec(id="thread")
+
+    session = template.session_spec(request_session, {"user": "other"})
+
+    assert session.id == "thread"
+    assert session.api_key == "key"
+    assert session.type == "MockAgentNativeSession"
+    assert session.parameters == {"user": "other"}
+    assert request_session.type is None
@@ -0,0 +1,255 @@
+import asyncio
+
+import httpx
+import orjson
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.class_registry import sync_tool_executor
+from bluemarz.core.interfaces import AsyncTool, SyncToolExecutor
+from bluemarz.core.models import (
+    AgentSpec,
+    AssignmentSpec,
+    PartialAssignmentRunResult,
+    PartialResultReason,
+    ToolCall,
+    ToolCallResult,
+    ToolSpec,
+)
+from bluemarz.core.snapshot import set_snapshot_secret
+from bluemarz.core.spec_registry import InMemmoryRegistry, set_assignment_registry
+from bluemarz.core.tool_runtime import AsyncToolRuntime, ToolJobQueue
+from bluemarz.core.usage import UsageAggregator, set_usage_aggregator
+from bluemarz.lib.openai.chat import InMemoryChatSessionStore, set_chat_session_store
+from bluemarz.utils import http_client
+
+
+def _tool_call(id: str) -> ToolCall:
+    return ToolCall(
+        id=id,
+        tool=ToolSpec(tool_type="async", name="lookup", description="lookup"),
+        arguments={"q": id},
+    )
+
+
+def test_job_queue_survives_restart_and_releases_ready_groups(tmp_path):
+    path = tmp_path / "jobs.db"
+    queue = ToolJobQueue(path)
+    queue.add_group("g1", "token", {"p": 1}, [_tool_call("c1"), _tool_call("c2")])
+
+    first = queue.claim_job()
+    second = queue.claim_job()
+    assert (first.tool_call.id, second.tool_call.id) == ("c1", "c2")
+    assert first.tool_call.tool.name == "lookup" and first.attempts == 1
+    assert queue.claim_job() is None
+
+    queue.complete_job(first.id, "one")
+    queue.retry_job(second.id, delay=3600)
+    assert queue.claim_job() is None
+    assert queue.claim_ready_group() is None
+    queue.close()
+
+    # a crash leaves running jobs claimed, recovery releases them
+    queue = ToolJobQueue(path)
+    queue.retry_job(second.id, delay=0)
+    retried = queue.claim_job()
+    assert retried.attempts == 2
+    queue.recover()
+    retried = queue.claim_job()
+    queue.complete_job(retried.id, "two")
+
+    group = queue.claim_ready_group()
+    assert group.id == "g1" and group.parameters == {"p": 1}
+    assert queue.claim_ready_group() is None
+    assert [r.text for r in queue.get_results("g1")] == ["one", "two"]
+
+    queue.finish_group("g1", "finished", "{}")
+    assert queue.get_group_status("g1") == ("finished", "{}")
+    assert queue.pending() == 0
+    queue.close()
+
+
+class _Lookup(AsyncTool):
+    def __init__(self):
+        self.calls = 0
+
+    @classmethod
+    def tool_name(cls) -> str:
+        return "runtime_lookup"
+
+    @property
+    def spec(self) -> ToolSpec:
+        return ToolSpec(tool_type="async", name="runtime_lookup", description="l")
+
+    async def call(self, tool_call: ToolCall) -> ToolCallResult:
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionError("flaky")
+        return ToolCallResult(tool_call=tool_call, text=f"result {self.calls}")
+
+
+@sync_tool_executor
+class RuntimeSyncLookup(SyncToolExecutor):
+    @classmethod
+    def tool_name(cls) -> str:
+        return "runtime_sync_lookup"
+
+    @classmethod
+    def execute_call(cls, tool_call: ToolCall) -> ToolCallResult:
+        return ToolCallResult(tool_call=tool_call, text="sync result")
+
+
+def _mock_model(
+    monkeypatch, tool_rounds: int, tools: tuple[str, ...] = ("runtime_lookup",)
+) -> list[list[dict]]:
+    # asks for the tools until it has `tool_rounds` outputs each, then answers
+    requests: list[list[dict]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        messages = orjson.loads(request.content)["messages"]
+        requests.append(messages)
+        outputs = sum(1 for m in messages if m["role"] == "tool") // len(tools)
+        if outputs >= tool_rounds:
+            delta = {"content": f"done after {outputs}"}
+        else:
+            delta = {"tool_calls": [
+                {"index": i, "id": f"call_{outputs}_{i}",
+                 "function": {"name": name, "arguments": "{}"}}
+                for i, name in enumerate(tools)
+            ]}
+        chunk = {"id": f"c{len(messages)}", "model": "m", "choices": [{"delta": delta}]}
+        return httpx.Response(
+            200, content=b"data: " + orjson.dumps(chunk) + b"\n\ndata: [DONE]\n\n"
+        )
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    set_chat_session_store(InMemoryChatSessionStore())
+    return requests
+
+
+def _save_spec(id: str, tools: tuple[str, ...] = ("runtime_lookup",), **kwargs) -> None:
+    registry = InMemmoryRegistry()
+    set_assignment_registry(registry)
+    registry.save_by_id(
+        id,
+        AssignmentSpec(
+            agent=AgentSpec(
+                id="runtime", api_key="key", type="OpenAiChatAgent",
+                session_type="OpenAiChatSession", model="m",
+                tools=[
+                    ToolSpec(
+                        tool_type="sync" if name == "runtime_sync_lookup" else "async",
+                        name=name,
+                        description="l",
+                    )
+                    for name in tools
+                ],
+            ),
+            query="Look it up",
+            **kwargs,
+        ),
+    )
+
+
+def test_runtime_retries_resumes_and_follows_continued_groups(monkeypatch):
+    _mock_model(monkeypatch, tool_rounds=2)
+    _save_spec("runtime_spec")
+    set_snapshot_secret("secret")
+    lookup = _Lookup()
+    queue = ToolJobQueue()
+    runtime = AsyncToolRuntime(queue, workers=2, retry_delay=0, poll_interval=0.05)
+    runtime.register(lookup)
+    # shares the queue without running it, as another process would
+    observer = AsyncToolRuntime(queue, poll_interval=0.05)
+
+    async def scenario():
+        assignment = await Assignment.from_registry("runtime_spec")
+        group_id = await runtime.run(assignment)
+        runtime.start()
+        try:
+            return group_id, await asyncio.wait_for(
+                asyncio.gather(runtime.wait(group_id), observer.wait(group_id)), 5
+            )
+        finally:
+            await runtime.stop()
+
+    try:
+        group_id, (result, observed) = asyncio.run(scenario())
+    finally:
+        set_snapshot_secret(None)
+
+    assert isinstance(group_id, str)
+    assert result.last_run_result.messages[0].text == "done after 2"
+    assert observed == result
+    # the first call failed once and was retried
+    assert lookup.calls == 3
+    status, next_group = queue.get_group_status(group_id)
+    assert status == "continued" and queue.get_group_status(next_group)[0] == "finished"
+    assert runtime._waiters == {} and queue.pending() == 0
+
+
+def test_runtime_returns_partial_results_without_enqueueing(monkeypatch):
+    _mock_model(monkeypatch, tool_rounds=1)
+    _save_spec("runtime_budget", tenant="spent")
+    set_usage_aggregator(UsageAggregator({"spent": 0}))
+    queue = ToolJobQueue()
+    runtime = AsyncToolRuntime(queue)
+
+    async def scenario():
+        assignment = await Assignment.from_registry("runtime_budget")
+        return await runtime.run(assignment)
+
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        set_usage_aggregator(None)
+
+    assert isinstance(result, PartialAssignmentRunResult)
+    assert result.reason == PartialResultReason.BUDGET_EXCEEDED
+    assert result.last_run_result is None and queue.pending() == 0
+
+
+def test_runtime_runs_sync_calls_of_mixed_rounds_and_survives_failing_callbacks(
+    monkeypatch,
+):
+    tools = ("runtime_lookup", "runtime_sync_lookup")
+    requests = _mock_model(monkeypatch, tool_rounds=1, tools=tools)
+    _save_spec("runtime_mixed", tools=tools)
+    set_snapshot_secret("secret")
+    lookup = _Lookup()
+    lookup.calls = 1
+    handled: list[str] = []
+
+    async def on_result(group_id: str, result) -> None:
+        handled.append(group_id)
+        raise RuntimeError("callback failed")
+
+    queue = ToolJobQueue()
+    runtime = AsyncToolRuntime(queue, poll_interval=0.05, on_result=on_result)
+    runtime.register(lookup)
+
+    async def scenario():
+        runtime.start()
+        try:
+            # the second group still resumes after the first callback raised
+            results = []
+            for _ in range(2):
+                assignment = await Assignment.from_registry("runtime_mixed")
+                group_id = await runtime.run(assignment)
+                results.append(await asyncio.wait_for(runtime.wait(group_id), 5))
+            return results
+        finally:
+            await runtime.stop()
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        set_snapshot_secret(None)
+
+    assert [r.last_run_result.messages[0].text for r in results] == ["done after 1"] * 2
+    assert len(handled) == 2
+    outputs = {m["tool_call_id"]: m["content"] for m in requests[-1] if m["role"] == "tool"}
+    assert outputs == {"call_0_0": "result 3", "call_0_1": "sync result"}
@@ -0,0 +1,122 @@
+import asyncio
+
+import httpx
+import orjson
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.class_registry import sync_tool_executor
+from bluemarz.core.interfaces import SyncToolExecutor
+from bluemarz.core.models import (
+    AgentSpec,
+    AssignmentSpec,
+    PartialAssignmentRunResult,
+    PartialResultReason,
+    TokenUsage,
+    ToolCall,
+    ToolCallResult,
+    ToolSpec,
+)
+from bluemarz.core.usage import UsageAggregator, set_usage_aggregator
+from bluemarz.lib.openai.chat import InMemoryChatSessionStore, set_chat_session_store
+from bluemarz.utils import http_client
+
+
+@sync_tool_executor
+class UsageTestLookup(SyncToolExecutor):
+    @classmethod
+    def tool_name(cls) -> str:
+        return "usage_test_lookup"
+
+    @classmethod
+    def execute_call(cls, tool_call: ToolCall) -> ToolCallResult:
+        return ToolCallResult(tool_call=tool_call, text="found")
+
+
+def _mock_tool_calling_model(monkeypatch) -> list[dict]:
+    bodies: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(orjson.loads(request.content))
+        id = f"c{len(bodies)}"
+        chunks = [
+            {"id": id, "model": "m", "choices": [{"delta": {"tool_calls": [
+                {"index": 0, "id": f"call_{id}", "function": {
+                    "name": "usage_test_lookup", "arguments": "{}"}}
+            ]}, "finish_reason": "tool_calls"}]},
+            {"id": id, "model": "m", "choices": [],
+             "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}},
+        ]
+        content = b"".join(b"data: " + orjson.dumps(c) + b"\n\n" for c in chunks)
+        return httpx.Response(200, content=content + b"data: [DONE]\n\n")
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    set_chat_session_store(InMemoryChatSessionStore())
+    return bodies
+
+
+def _spec(**kwargs) -> AssignmentSpec:
+    return AssignmentSpec(
+        agent=AgentSpec(
+            id="usage", api_key="key", type="OpenAiChatAgent",
+            session_type="OpenAiChatSession", model="m",
+            tools=[ToolSpec(tool_type="sync", name="usage_test_lookup", description="l")],
+        ),
+        query="Look it up",
+        **kwargs,
+    )
+
+
+def test_assignment_budget_stops_tool_rounds_and_sums_usage(monkeypatch):
+    bodies = _mock_tool_calling_model(monkeypatch)
+    aggregator = UsageAggregator()
+    set_usage_aggregator(aggregator)
+
+    async def scenario():
+        assignment = await Assignment.from_spec(
+            _spec(tenant="acme", max_total_tokens=20)
+        )
+        return await assignment.run_until_breakpoint()
+
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        set_usage_aggregator(None)
+
+    assert isinstance(result, PartialAssignmentRunResult)
+    assert result.reason == PartialResultReason.BUDGET_EXCEEDED
+    # the second round crossed the budget, its tool outputs were not sent
+    assert len(bodies) == 2
+    assert result.last_run_result.usage == TokenUsage(
+        prompt_tokens=10, completion_tokens=5, total_tokens=15
+    )
+    assert result.usage == TokenUsage(
+        prompt_tokens=20, completion_tokens=10, total_tokens=30
+    )
+    assert aggregator.by_agent()["usage"].total_tokens == 30
+    assert aggregator.by_model()["m"].total_tokens == 30
+    assert aggregator.by_tenant()["acme"] == result.usage
+
+
+def test_tenant_budget_blocks_new_assignments(monkeypatch):
+    bodies = _mock_tool_calling_model(monkeypatch)
+    aggregator = UsageAggregator({"acme": 15})
+    aggregator.record("other", "m", "acme", TokenUsage(total_tokens=15))
+    set_usage_aggregator(aggregator)
+
+    async def scenario():
+        blocked = await Assignment.from_spec(_spec(tenant="acme"))
+        return await blocked.run_until_breakpoint()
+
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        set_usage_aggregator(None)
+
+    assert result.reason == PartialResultReason.BUDGET_EXCEEDED
+    assert result.last_run_result is None and result.usage is None
+    assert bodies == []
+    assert aggregator.is_over_budget("acme") and not aggregator.is_over_budget("b")
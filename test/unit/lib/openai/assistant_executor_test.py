@@ -0,0 +1,144 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import orjson
+import pytest
+
+from bluemarz.core.models import ContextBudget, RunResultType
+from bluemarz.lib.openai import message_store
+from bluemarz.lib.openai.components import OpenAiAssistantAndThreadExecutor
+from bluemarz.lib.openai.models import OpenAiAssistantSpec, OpenAiThreadSpec
+from bluemarz.utils import http_client
+
+
+def _run(status: str, **kwargs) -> dict:
+    return {
+        "id": "run_1", "assistant_id": "asst", "thread_id": "thread",
+        "status": status, "model": "m", "tools": [], "response_format": "auto",
+        "tool_choice": "auto", "parallel_tool_calls": True,
+        "usage": {"prompt_tokens": 90, "completion_tokens": 10, "total_tokens": 100},
+        **kwargs,
+    }
+
+
+def _message(role: str, text: str) -> dict:
+    return {"id": f"msg_{text}", "role": role, "status": "completed",
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}]}
+
+
+def _execute(monkeypatch, run: dict, messages: list[dict], answer: dict | None = None):
+    bodies: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/messages"):
+            asc = request.url.params.get("order") == "asc"
+            data = messages[::-1] if asc else messages
+            return httpx.Response(200, json={"data": data})
+        bodies.append(orjson.loads(request.content))
+        if answer is not None:
+            # the run adds its answer to the thread
+            messages.insert(0, answer)
+        return httpx.Response(200, json=run)
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+    async def get_openai_assistant():
+        return OpenAiAssistantSpec(id="asst", model="m")
+
+    budget = ContextBudget(last_messages=3, max_prompt_tokens=100, max_completion_tokens=10)
+    agent = SimpleNamespace(
+        api_key="key", spec=SimpleNamespace(context_budget=budget),
+        tools=[], get_openai_assistant=get_openai_assistant,
+    )
+    writer = SimpleNamespace(run_started=lambda id: None, run_finished=lambda id: None)
+    session = SimpleNamespace(
+        spec=SimpleNamespace(context_budget=ContextBudget(last_messages=2)),
+        openai_thread=OpenAiThreadSpec(id="thread"), writer=writer,
+    )
+    result = asyncio.run(OpenAiAssistantAndThreadExecutor.execute(agent, session))
+    return result, bodies[0]
+
+
+def test_run_is_created_with_the_limits_of_the_resolved_budget(monkeypatch):
+    result, body = _execute(
+        monkeypatch,
+        _run("incomplete", incomplete_details={"reason": "max_completion_tokens"}),
+        [_message("assistant", "partial"), _message("user", "question")],
+    )
+
+    assert body["truncation_strategy"] == {"type": "last_messages", "last_messages": 2}
+    assert (body["max_prompt_tokens"], body["max_completion_tokens"]) == (100, 10)
+    assert result.result_type == RunResultType.MESSAGE_RESPONSE
+    assert [m.text for m in result.messages] == ["partial"]
+    assert result.context.prompt_tokens == 90 and result.context.budget.last_messages == 2
+
+
+def test_context_report_compares_the_stored_history_with_the_truncated_one(
+    monkeypatch,
+):
+    monkeypatch.setattr(
+        message_store, "_message_store", message_store.InMemoryMessageStore()
+    )
+    history = [_message("user", "question"), _message("assistant", "first answer"),
+               _message("user", "first question with a longer text")]
+
+    result, _ = _execute(
+        monkeypatch, _run("completed"), history, answer=_message("assistant", "answer")
+    )
+
+    assert [m.text for m in result.messages] == ["answer"]
+    context = result.context
+    assert (context.messages_before, context.messages_after) == (3, 2)
+    assert context.estimated_tokens_before > context.estimated_tokens_after > 0
+    assert context.prompt_tokens == 90
+
+
+def test_context_report_without_message_store_leaves_history_unset(monkeypatch):
+    result, _ = _execute(monkeypatch, _run("completed"), [_message("assistant", "a")])
+
+    assert result.context.prompt_tokens == 90
+    assert result.context.messages_before is None
+    assert result.context.estimated_tokens_after is None
+
+
+def test_incomplete_run_without_answer_raises(monkeypatch):
+    with pytest.raises(Exception, match="hit its context budget before answering"):
+        _execute(
+            monkeypatch,
+            _run("incomplete", incomplete_details={"reason": "max_prompt_tokens"}),
+            [_message("user", "question")],
+        )
+
+
+def test_run_usage_sums_the_steps_of_every_page(monkeypatch):
+    def step(id: str) -> dict:
+        return {"id": id, "created_at": 1, "run_id": "run_1", "assistant_id": "asst",
+                "thread_id": "thread", "type": "tool_calls", "status": "completed",
+                "step_details": {"type": "tool_calls", "tool_calls": []},
+                "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11}}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        after = request.url.params.get("after")
+        if after is None:
+            return httpx.Response(200, json={"data": [step("s1"), step("s2")], "has_more": True})
+        assert after == "s2"
+        return httpx.Response(200, json={"data": [step("s3")], "has_more": False})
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    agent = SimpleNamespace(api_key="key")
+    session = SimpleNamespace(openai_thread=OpenAiThreadSpec(id="thread"))
+
+    usage = asyncio.run(
+        OpenAiAssistantAndThreadExecutor.get_run_usage(agent, session, "run_1")
+    )
+
+    assert (usage.prompt_tokens, usage.total_tokens) == (30, 33)
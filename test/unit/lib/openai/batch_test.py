@@ -0,0 +1,134 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+import orjson
+
+from bluemarz.core.models import AgentSpec, AssignmentSpec, RunResultType, ToolSpec
+from bluemarz.lib.openai import client
+from bluemarz.lib.openai.batch import BatchAssignmentRunner
+
+
+class _MockBatchApi(BaseHTTPRequestHandler):
+    files: dict[str, bytes] = {}
+    batches: dict[str, dict] = {}
+    polls: int = 0
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _reply(self, body: dict | bytes) -> None:
+        content = body if isinstance(body, bytes) else orjson.dumps(body)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/files":
+            # the jsonl is the only part starting with a json object
+            content = next(p for p in body.split(b"\r\n\r\n")[1:] if p.startswith(b"{"))
+            content = content.rsplit(b"\r\n--", 1)[0]
+            id = f"file-{len(self.files)}"
+            self.files[id] = content
+            self._reply(
+                {"id": id, "bytes": len(content), "created_at": 0,
+                 "filename": "assignments.jsonl", "purpose": "batch"}
+            )
+        elif self.path == "/batches":
+            request = orjson.loads(body)
+            id = f"batch-{len(self.batches)}"
+            self.batches[id] = {
+                "id": id, "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"],
+                "completion_window": request["completion_window"],
+                "status": "in_progress",
+            }
+            self._reply(self.batches[id])
+
+    def do_GET(self) -> None:
+        if self.path.startswith("/batches/"):
+            batch = self.batches[self.path.split("/")[2]]
+            _MockBatchApi.polls += 1
+            batch["status"] = "completed"
+            batch["output_file_id"] = self._complete(batch["input_file_id"])
+            self._reply(batch)
+        elif self.path.endswith("/content"):
+            self._reply(self.files[self.path.split("/")[2]])
+
+    def _complete(self, input_file_id: str) -> str:
+        lines = []
+        for line in self.files[input_file_id].splitlines():
+            request = orjson.loads(line)
+            question = request["body"]["messages"][-1]["content"]
+            if question == "weather?":
+                message = {"role": "assistant", "tool_calls": [{
+                    "id": "call_1", "type": "function",
+                    "function": {"name": "weather", "arguments": "{\"city\": \"Rio\"}"},
+                }]}
+            else:
+                message = {"role": "assistant", "content": question.upper()}
+            lines.append(orjson.dumps({
+                "id": "req", "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": {
+                    "id": "chatcmpl-" + request["custom_id"],
+                    "model": request["body"]["model"],
+                    "choices": [{"message": message}],
+                }},
+            }))
+        id = f"file-{len(self.files)}"
+        self.files[id] = b"\n".join(lines)
+        return id
+
+
+def _spec(query: str) -> AssignmentSpec:
+    return AssignmentSpec(
+        agent=AgentSpec(
+            id="asst_1", api_key="key", type="OpenAiAssistant",
+            session_type="NativeSession", model="gpt-4o-mini", prompt="Be brief",
+            tools=[ToolSpec(tool_type="async", name="weather", description="weather")],
+        ),
+        query=query,
+    )
+
+
+def test_batch_runner_round_trips_through_mock_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockBatchApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = client._client.base_url
+    client.set_base_url(f"http://127.0.0.1:{server.server_port}")
+
+    async def scenario():
+        runner = BatchAssignmentRunner(poll_interval=0, max_batch_requests=2)
+        specs = [_spec("hello"), _spec("weather?"), ("last", _spec("bye"))]
+        results = [r async for r in runner.run(specs)]
+
+        # default ids repeat across submits, each keeps the tools of its spec
+        without_tools = _spec("hello")
+        without_tools.agent = without_tools.agent.model_copy(update={"tools": []})
+        first = await runner.submit([_spec("weather?")])
+        await runner.submit([without_tools])
+        job = await runner.wait(first[0])
+        resubmitted = [r async for r in runner.results(job)]
+        return results, resubmitted
+
+    try:
+        results, resubmitted = asyncio.run(scenario())
+        results = {r.custom_id: r for r in results}
+    finally:
+        client.set_base_url(base_url)
+        server.shutdown()
+
+    assert len(_MockBatchApi.batches) == 4
+    request = orjson.loads(_MockBatchApi.files["file-0"].splitlines()[0])
+    assert request["body"]["messages"][0] == {"role": "system", "content": "Be brief"}
+    assert request["body"]["tools"][0]["function"]["name"] == "weather"
+
+    assert results["0"].result.last_run_result.messages[0].text == "HELLO"
+    tool_call = results["1"].result.last_run_result.tool_calls[0]
+    assert results["1"].result.last_run_result.result_type == RunResultType.TOOL_CALL
+    assert tool_call.tool.name == "weather" and tool_call.arguments == {"city": "Rio"}
+    assert results["last"].result.session_id == "last"
+    assert resubmitted[0].custom_id == "0"
+    assert resubmitted[0].result.last_run_result.tool_calls[0].tool.name == "weather"
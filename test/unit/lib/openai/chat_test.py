@@ -0,0 +1,133 @@
+import asyncio
+
+import httpx
+import orjson
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.class_registry import sync_tool_executor
+from bluemarz.core.interfaces import SyncToolExecutor
+from bluemarz.core.models import (
+    AgentSpec,
+    AssignmentSpec,
+    ContextBudget,
+    RunResultType,
+    ToolCall,
+    ToolCallResult,
+    ToolSpec,
+)
+from bluemarz.lib.openai.chat import (
+    InMemoryChatSessionStore,
+    _fit_to_budget,
+    set_chat_session_store,
+)
+from bluemarz.utils import http_client
+
+
+@sync_tool_executor
+class ChatTestClock(SyncToolExecutor):
+    @classmethod
+    def tool_name(cls) -> str:
+        return "chat_test_clock"
+
+    @classmethod
+    def execute_call(cls, tool_call: ToolCall) -> ToolCallResult:
+        return ToolCallResult(tool_call=tool_call, text="12:00")
+
+
+def _sse(*chunks: dict) -> bytes:
+    return b"".join(b"data: " + orjson.dumps(c) + b"\n\n" for c in chunks) + b"data: [DONE]\n\n"
+
+
+def test_chat_executor_runs_tool_loop_over_streamed_completions(monkeypatch):
+    bodies: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = orjson.loads(request.content)
+        bodies.append(body)
+        if len(bodies) == 1:
+            content = _sse(
+                {"id": "c1", "model": "m", "choices": [{"delta": {"tool_calls": [
+                    {"index": 0, "id": "call_1", "function": {"name": "chat_test_clock", "arguments": ""}}
+                ]}}]},
+                {"id": "c1", "model": "m", "choices": [{"delta": {"tool_calls": [
+                    {"index": 0, "function": {"arguments": "{}"}}
+                ]}, "finish_reason": "tool_calls"}]},
+            )
+        else:
+            content = _sse(
+                {"id": "c2", "model": "m", "choices": [{"delta": {"content": "It is "}}]},
+                {"id": "c2", "model": "m", "choices": [{"delta": {"content": "noon"}}]},
+                {"id": "c2", "model": "m", "choices": [],
+                 "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}},
+            )
+        return httpx.Response(200, content=content)
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    store = InMemoryChatSessionStore()
+    set_chat_session_store(store)
+
+    spec = AssignmentSpec(
+        agent=AgentSpec(
+            id="chat", api_key="key", type="OpenAiChatAgent",
+            session_type="OpenAiChatSession", model="m", prompt="Be brief",
+            tools=[ToolSpec(tool_type="sync", name="chat_test_clock", description="time")],
+        ),
+        query="What time is it?",
+    )
+
+    async def scenario():
+        assignment = await Assignment.from_spec(spec)
+        return assignment, await assignment.run_until_breakpoint()
+
+    assignment, result = asyncio.run(scenario())
+
+    assert result.last_run_result.result_type == RunResultType.MESSAGE_RESPONSE
+    assert result.last_run_result.messages[0].text == "It is noon"
+    assert bodies[0]["stream"] and bodies[0]["messages"][0]["role"] == "system"
+    assert bodies[0]["tools"][0]["function"]["name"] == "chat_test_clock"
+    assert [m["role"] for m in store.get_messages(result.session_id)] == [
+        "user", "assistant", "tool", "assistant"
+    ]
+    assert bodies[1]["messages"][-1] == {
+        "role": "tool", "tool_call_id": "call_1", "content": "12:00"
+    }
+
+
+def test_context_budget_resolution_and_history_fitting():
+    budget = ContextBudget.resolve(
+        ContextBudget(last_messages=10, max_completion_tokens=100),
+        ContextBudget(last_messages=3),
+    )
+    assert (budget.last_messages, budget.max_completion_tokens) == (3, 100)
+    assert ContextBudget.resolve(None, budget) is budget
+
+    history = [
+        {"role": "user", "content": "a" * 400},
+        {"role": "assistant", "tool_calls": [{"id": "c", "type": "function",
+            "function": {"name": "f", "arguments": "{}"}}]},
+        {"role": "tool", "tool_call_id": "c", "content": "b" * 400},
+        {"role": "assistant", "content": "ok"},
+        {"role": "user", "content": "next"},
+    ]
+    # the last 3 messages would start with an orphan tool output
+    assert _fit_to_budget(history, budget) == history[3:]
+    assert _fit_to_budget(history, ContextBudget(max_prompt_tokens=50)) == history[3:]
+    assert _fit_to_budget(history, ContextBudget(max_prompt_tokens=1)) == history[4:]
+    assert _fit_to_budget(history, ContextBudget(max_prompt_tokens=10_000)) == history
+
+    # outputs of the pending parallel calls are kept with the call that asked for them
+    history[3:] = [
+        {"role": "assistant", "tool_calls": [
+            {"id": id, "type": "function", "function": {"name": "f", "arguments": "{}"}}
+            for id in ("d", "e")
+        ]},
+        {"role": "tool", "tool_call_id": "d", "content": "1"},
+        {"role": "tool", "tool_call_id": "e", "content": "2"},
+    ]
+    assert _fit_to_budget(history, ContextBudget(last_messages=1)) == history[3:]
+    assert _fit_to_budget(history, ContextBudget(last_messages=2)) == history[3:]
+    assert _fit_to_budget(history, ContextBudget(max_prompt_tokens=1)) == history[3:]
@@ -0,0 +1,72 @@
+import asyncio
+import sqlite3
+
+import httpx
+
+from bluemarz.lib.openai.message_store import (
+    InMemoryMessageStore,
+    SqliteMessageStore,
+    StoredMessage,
+    sync_thread_messages,
+)
+from bluemarz.utils import http_client
+
+
+def _message(id: str) -> dict:
+    return {"id": id, "role": "user", "content": id, "status": "completed"}
+
+
+def test_concurrent_syncs_of_a_thread_store_each_message_once(monkeypatch):
+    messages = [_message(f"msg_{i}") for i in range(3)]
+    listed_after: list[str | None] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        after = request.url.params.get("after")
+        listed_after.append(after)
+        # yields to the other sync while this one is between cursor and append
+        await asyncio.sleep(0.01)
+        start = next((i + 1 for i, m in enumerate(messages) if m["id"] == after), 0)
+        return httpx.Response(200, json={"data": messages[start:], "has_more": False})
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    store = InMemoryMessageStore()
+
+    async def scenario():
+        return await asyncio.gather(
+            sync_thread_messages(store, "key", "thread"),
+            sync_thread_messages(store, "key", "thread"),
+        )
+
+    first, second = asyncio.run(scenario())
+
+    assert [m.id for m in first] == ["msg_0", "msg_1", "msg_2"] and second == []
+    assert listed_after == [None, "msg_2"]
+    assert [m.id for m in store.get_messages("thread")] == ["msg_0", "msg_1", "msg_2"]
+
+
+def test_append_skips_messages_already_stored():
+    for store in (InMemoryMessageStore(), SqliteMessageStore()):
+        store.append("thread", [StoredMessage("a", "user", "1", (), 1)])
+        store.append(
+            "thread",
+            [StoredMessage("a", "user", "1", (), 1), StoredMessage("b", "user", "2", (), 2)],
+        )
+
+        assert [m.id for m in store.get_messages("thread")] == ["a", "b"]
+        assert store.get_cursor("thread") == "b"
+
+
+def test_sqlite_append_dedupes_more_ids_than_a_statement_takes():
+    store = SqliteMessageStore()
+    # the default limit of sqlite builds, some raise it
+    store._connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    messages = [StoredMessage(f"m{i}", "user", None) for i in range(2500)]
+    store.append("thread", messages[:10])
+
+    store.append("thread", messages)
+
+    assert [m.id for m in store.get_messages("thread")] == [m.id for m in messages]
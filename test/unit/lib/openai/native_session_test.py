@@ -0,0 +1,49 @@
+import asyncio
+
+import httpx
+import orjson
+
+from bluemarz.core.models import MessageRole, SessionMessage, SessionSpec
+from bluemarz.lib.openai import client
+from bluemarz.lib.openai.components import OpenAiAssistantNativeSession
+from bluemarz.utils import http_client
+
+
+def test_messages_beyond_the_creation_limit_are_written_together(monkeypatch):
+    created: list[dict] = []
+    posted: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = orjson.loads(request.content)
+        if request.url.path == "/v1/threads":
+            created.append(body)
+            return httpx.Response(200, json={"id": "thread"})
+        posted.append(body)
+        return httpx.Response(200, json={"id": "msg", "role": "user", "content": []})
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    overflow = client.MAX_THREAD_MESSAGES
+    roles = {overflow + 2: MessageRole.AGENT}
+    messages = [
+        SessionMessage(role=roles.get(i, MessageRole.USER), text=str(i))
+        for i in range(overflow + 8)
+    ]
+
+    session = asyncio.run(
+        OpenAiAssistantNativeSession.from_spec(
+            SessionSpec(api_key="key", type="OpenAiAssistantNativeSession",
+                        messages=messages)
+        )
+    )
+
+    assert session.spec.id == "thread"
+    assert len(created[0]["messages"]) == overflow
+    assert [(p["role"], p["content"]) for p in posted] == [
+        ("user", f"{overflow}\n\n{overflow + 1}"),
+        ("assistant", str(overflow + 2)),
+        ("user", "\n\n".join(str(i) for i in range(overflow + 3, overflow + 8))),
+    ]
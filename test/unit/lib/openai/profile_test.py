@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import orjson
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.class_registry import sync_tool_executor
+from bluemarz.core.interfaces import SyncToolExecutor
+from bluemarz.core.models import (
+    AgentSpec,
+    AssignmentProfile,
+    AssignmentSpec,
+    ProfileEntryType,
+    ToolCall,
+    ToolCallResult,
+    ToolSpec,
+)
+from bluemarz.lib.openai.chat import InMemoryChatSessionStore, set_chat_session_store
+from bluemarz.lib.openai.components import OpenAiAssistantAndThreadExecutor
+from bluemarz.utils import http_client
+
+
+@sync_tool_executor
+class ProfileTestLookup(SyncToolExecutor):
+    @classmethod
+    def tool_name(cls) -> str:
+        return "profile_test_lookup"
+
+    @classmethod
+    def execute_call(cls, tool_call: ToolCall) -> ToolCallResult:
+        return ToolCallResult(tool_call=tool_call, text="found")
+
+
+def _step(id: str, created_at: int, completed_at: int | None, details: dict) -> dict:
+    return {
+        "id": id, "created_at": created_at, "completed_at": completed_at,
+        "run_id": "run_1", "assistant_id": "asst", "thread_id": "thread",
+        "type": details["type"], "status": "completed" if completed_at else "in_progress",
+        "step_details": details, "usage": None,
+    }
+
+
+def _mock(monkeypatch, handler) -> None:
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+
+def test_run_profile_from_run_and_step_timestamps(monkeypatch):
+    run = {
+        "id": "run_1", "assistant_id": "asst", "thread_id": "thread",
+        "status": "completed", "created_at": 100, "started_at": 103, "model": "m",
+        "tools": [], "response_format": "auto", "tool_choice": "auto",
+        "parallel_tool_calls": True,
+    }
+    steps = [
+        _step("step_2", 106, 110, {"type": "message_creation",
+                                   "message_creation": {"message_id": "msg"}}),
+        _step("step_1", 103, 105, {"type": "tool_calls", "tool_calls": [
+            {"id": "fs", "type": "file_search", "file_search": {}}]}),
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/steps"):
+            # one step per page, paged in creation order
+            assert request.url.params["order"] == "asc"
+            after = request.url.params.get("after")
+            page = steps[1:] if after is None else steps[:1]
+            return httpx.Response(200, json={"data": page, "has_more": after is None})
+        return httpx.Response(200, json=run)
+
+    _mock(monkeypatch, handler)
+    agent = SimpleNamespace(api_key="key")
+    session = SimpleNamespace(openai_thread=SimpleNamespace(id="thread"))
+
+    entries = asyncio.run(
+        OpenAiAssistantAndThreadExecutor.get_run_profile(agent, session, "run_1")
+    )
+
+    assert [(e.entry_type, e.name, e.duration) for e in entries] == [
+        (ProfileEntryType.QUEUED, None, 3),
+        (ProfileEntryType.RUN_STEP, "tool_calls:file_search", 2),
+        (ProfileEntryType.RUN_STEP, "message_creation", 4),
+    ]
+    durations = AssignmentProfile(entries=entries).durations()
+    assert durations["runStep"] == 6 and durations["queued"] == 3
+
+
+def test_profiling_records_local_timeline_of_tool_rounds(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        messages = orjson.loads(request.content)["messages"]
+        if messages[-1]["role"] == "tool":
+            delta = {"content": "found it"}
+        else:
+            delta = {"tool_calls": [{"index": 0, "id": "call_1", "function": {
+                "name": "profile_test_lookup", "arguments": "{}"}}]}
+        chunk = {"id": f"c{len(messages)}", "model": "m", "choices": [{"delta": delta}]}
+        return httpx.Response(
+            200, content=b"data: " + orjson.dumps(chunk) + b"\n\ndata: [DONE]\n\n"
+        )
+
+    _mock(monkeypatch, handler)
+    set_chat_session_store(InMemoryChatSessionStore())
+    spec = AssignmentSpec(
+        agent=AgentSpec(
+            id="profile", api_key="key", type="OpenAiChatAgent",
+            session_type="OpenAiChatSession", model="m",
+            tools=[ToolSpec(tool_type="sync", name="profile_test_lookup", description="l")],
+        ),
+        query="Look it up",
+        profile=True,
+    )
+
+    async def scenario():
+        assignment = await Assignment.from_spec(spec)
+        return await assignment.run_until_breakpoint()
+
+    result = asyncio.run(scenario())
+
+    assert [e.entry_type for e in result.profile.entries] == [
+        ProfileEntryType.RUN_WAIT,
+        ProfileEntryType.TOOL_CALL,
+        ProfileEntryType.SUBMIT,
+        ProfileEntryType.RUN_WAIT,
+    ]
+    tool_entry = result.profile.entries[1]
+    assert tool_entry.name == "profile_test_lookup" and tool_entry.status == "completed"
+    assert result.profile.run_ids == ["c1", "c3"]
+    assert "toolCall:profile_test_lookup" in result.profile.durations()
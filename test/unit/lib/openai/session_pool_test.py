@@ -0,0 +1,78 @@
+import asyncio
+
+import httpx
+
+from bluemarz.lib.openai.session_pool import SessionPool
+from bluemarz.utils import http_client, metrics
+
+
+def _mock(monkeypatch) -> list[str]:
+    deleted: list[str] = []
+    created = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal created
+        if request.method == "DELETE":
+            deleted.append(request.url.path.split("/")[-1])
+            return httpx.Response(200, json={"id": deleted[-1], "deleted": True})
+        created += 1
+        return httpx.Response(200, json={"id": f"thread_{created}"})
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return deleted
+
+
+def test_pool_hands_out_warm_threads_and_collects_expired_ones(monkeypatch):
+    deleted = _mock(monkeypatch)
+    requests = metrics.get_metrics_registry().get("bluemarz_cache_requests_total")
+    before = (
+        requests.get(cache="session_pool", result="hit"),
+        requests.get(cache="session_pool", result="miss"),
+    )
+
+    async def scenario():
+        pool = SessionPool(size=2)
+        # empty pool: created on demand while the pool fills
+        missed = await pool.acquire("key")
+        await asyncio.sleep(0.01)
+        assert pool.available("key") == 2
+
+        hit = await pool.acquire("key")
+        await asyncio.sleep(0.01)
+        assert pool.available("key") == 2 and pool.available("other") == 0
+
+        pool._max_idle = 0
+        await asyncio.sleep(0.001)
+        assert await pool.collect() == 2
+        assert pool.available("key") == 0
+        await pool.close()
+        return missed, hit
+
+    missed, hit = asyncio.run(scenario())
+
+    assert (missed.id, hit.id) == ("thread_1", "thread_2")
+    assert sorted(deleted) == ["thread_3", "thread_4"]
+    after = (
+        requests.get(cache="session_pool", result="hit"),
+        requests.get(cache="session_pool", result="miss"),
+    )
+    assert [a - b for a, b in zip(after, before)] == [1, 1]
+
+
+def test_close_deletes_pooled_threads(monkeypatch):
+    deleted = _mock(monkeypatch)
+
+    async def scenario():
+        pool = SessionPool(size=1)
+        pool.warm("key")
+        await asyncio.sleep(0.01)
+        await pool.close()
+        return pool
+
+    pool = asyncio.run(scenario())
+
+    assert deleted == ["thread_1"] and pool.available("key") == 0
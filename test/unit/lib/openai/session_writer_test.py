@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+import orjson
+import pytest
+
+from bluemarz.lib.openai import session_writer
+from bluemarz.lib.openai.session_writer import RunAwaitingToolOutputs, SessionWriter
+from bluemarz.utils import http_client
+from bluemarz.utils.http_client import HTTPRequestError
+
+
+def _run(status: str) -> dict:
+    return {"id": "run_up", "assistant_id": "asst", "thread_id": "thread",
+            "status": status, "model": "m", "tools": [], "response_format": "auto",
+            "tool_choice": "auto", "parallel_tool_calls": True}
+
+
+def _mock(monkeypatch, post_statuses: list[int], run_statuses: list[str]) -> list[dict]:
+    posted: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, json={"data": [_run(run_statuses.pop(0))]})
+        posted.append(orjson.loads(request.content))
+        status = post_statuses.pop(0) if post_statuses else 200
+        if status != 200:
+            return httpx.Response(status, json={"error": {"message": "rejected"}})
+        return httpx.Response(200, json={"id": "msg", "role": "user", "content": []})
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(session_writer, "_UPSTREAM_CHECK_INTERVAL", 0)
+    return posted
+
+
+def test_writes_wait_for_runs_keep_order_and_merge_user_text(monkeypatch):
+    posted = _mock(monkeypatch, [], [])
+
+    async def scenario():
+        writer = SessionWriter("key", "thread")
+        writer.run_started("run_1")
+        writes = [
+            asyncio.create_task(writer.write(role, text))
+            for role, text in [("user", "a"), ("user", "b"), ("assistant", "c"), ("user", "d")]
+        ]
+        await asyncio.sleep(0)
+        assert posted == [] and not any(w.done() for w in writes)
+        writer.run_finished("run_1")
+        await asyncio.gather(*writes)
+
+    asyncio.run(scenario())
+
+    assert [(p["role"], p["content"]) for p in posted] == [
+        ("user", "a\n\nb"), ("assistant", "c"), ("user", "d")
+    ]
+
+
+def test_rejected_write_waits_only_for_an_upstream_run(monkeypatch):
+    posted = _mock(monkeypatch, [400], ["in_progress", "completed"])
+    asyncio.run(SessionWriter("key", "thread").write("user", "a"))
+    assert len(posted) == 2
+
+    posted = _mock(monkeypatch, [400], ["completed"])
+    with pytest.raises(HTTPRequestError):
+        asyncio.run(SessionWriter("key", "thread").write("user", "a"))
+    assert len(posted) == 1
+
+
+def test_deferred_run_fails_writes_until_its_outputs_are_submitted(monkeypatch):
+    posted = _mock(monkeypatch, [], ["requires_action", "requires_action"])
+
+    async def scenario():
+        writer = SessionWriter("key", "thread")
+        writer.run_started("run_1")
+        queued = asyncio.create_task(writer.write("user", "queued"))
+        await asyncio.sleep(0)
+        writer.run_deferred("run_1")
+        with pytest.raises(RunAwaitingToolOutputs):
+            await queued
+        with pytest.raises(RunAwaitingToolOutputs, match="run run_1"):
+            await writer.write("user", "late")
+
+        # submitting the outputs resumes the run, which then ends
+        writer.run_started("run_1")
+        writer.run_finished("run_1")
+        await writer.write("user", "after")
+
+    asyncio.run(scenario())
+
+    assert [p["content"] for p in posted] == ["after"]
+
+
+def test_expired_deferred_run_releases_the_thread(monkeypatch):
+    posted = _mock(monkeypatch, [], ["expired"])
+
+    async def scenario():
+        writer = SessionWriter("key", "thread")
+        writer.run_started("run_1")
+        writer.run_deferred("run_1")
+        await writer.write("user", "after")
+        assert not writer.has_active_run
+
+    asyncio.run(scenario())
+
+    assert [p["content"] for p in posted] == ["after"]
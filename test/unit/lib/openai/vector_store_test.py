@@ -0,0 +1,82 @@
+import asyncio
+
+import httpx
+import orjson
+
+from bluemarz.core.models import SessionFile, SessionSpec
+from bluemarz.lib.openai import components
+from bluemarz.lib.openai.components import OpenAiAssistantNativeSession
+from bluemarz.utils import http_client
+
+
+def _batch(status: str) -> dict:
+    counts = {"in_progress": 0, "completed": 0, "cancelled": 0, "failed": 0, "total": 1}
+    return {"id": "batch_1", "created_at": 1, "vector_store_id": "vs_1",
+            "status": status, "file_counts": counts}
+
+
+def _mock(monkeypatch, batch_statuses: list[str]) -> list[tuple[str, str, dict | None]]:
+    requests: list[tuple[str, str, dict | None]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix("/v1")
+        body = orjson.loads(request.content) if request.content else None
+        requests.append((request.method, path, body))
+        if path == "/threads/thread":
+            resources = body.get("tool_resources") if body else None
+            return httpx.Response(200, json={"id": "thread", "tool_resources": resources})
+        if path == "/vector_stores":
+            counts = {"in_progress": 0, "completed": 0, "cancelled": 0, "failed": 0, "total": 0}
+            return httpx.Response(200, json={
+                "id": "vs_1", "created_at": 1, "usage_bytes": 0, "status": "completed",
+                "file_counts": counts, "expires_after": body["expires_after"]})
+        if path.startswith("/files/"):
+            return httpx.Response(200, json={"id": "file_1", "bytes": 1, "created_at": 1,
+                                             "filename": "a.txt", "purpose": "assistants"})
+        if path.endswith("/cancel"):
+            return httpx.Response(200, json=_batch("cancelling"))
+        return httpx.Response(200, json=_batch(batch_statuses.pop(0)))
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(components, "_FILE_BATCH_POLL_INTERVAL", 0)
+    return requests
+
+
+def _add_file(monkeypatch) -> list:
+    async def scenario():
+        session = await OpenAiAssistantNativeSession.restore(
+            SessionSpec(id="thread", api_key="key", type="OpenAiAssistantNativeSession")
+        )
+        results = await session.add_files([SessionFile(id="file_1")])
+        # the store is attached once and reused
+        assert await session.get_vector_store_id() == "vs_1"
+        return results
+
+    return asyncio.run(scenario())
+
+
+def test_thread_vector_store_expires_and_indexes_files(monkeypatch):
+    requests = _mock(monkeypatch, ["in_progress", "in_progress", "completed"])
+
+    results = _add_file(monkeypatch)
+
+    assert [(r.ok, r.file_id) for r in results] == [(True, "file_1")]
+    created = next(body for method, path, body in requests if path == "/vector_stores")
+    assert created["expires_after"] == {"anchor": "last_active_at", "days": 7}
+    modified = [body for method, path, body in requests
+                if method == "POST" and path == "/threads/thread"]
+    assert modified == [{"tool_resources": {"file_search": {"vector_store_ids": ["vs_1"]}}}]
+
+
+def test_file_batch_is_cancelled_after_its_deadline(monkeypatch):
+    requests = _mock(monkeypatch, ["in_progress"] * 10_000)
+    monkeypatch.setattr(components, "_FILE_BATCH_TIMEOUT", 0.01)
+
+    results = _add_file(monkeypatch)
+
+    assert [(r.ok, r.file_id) for r in results] == [(False, "file_1")]
+    assert requests[-1][:2] == ("POST", "/vector_stores/vs_1/file_batches/batch_1/cancel")
@@ -0,0 +1,91 @@
+import asyncio
+import io
+
+import orjson
+
+from bluemarz.core.models import (
+    AssignmentRunResult,
+    AssignmentSpec,
+    MessageRole,
+    RunResult,
+    RunResultType,
+    SessionMessage,
+)
+from bluemarz.run import RunStats, read_checkpoint, run_specs
+
+
+def _line(query: str) -> bytes:
+    return orjson.dumps(
+        {
+            "agent": {"id": "a", "type": "MockAgent", "sessionType": "MockSession"},
+            "query": query,
+        }
+    )
+
+
+async def _execute(spec: AssignmentSpec) -> AssignmentRunResult:
+    await asyncio.sleep(0.01)
+    if spec.query == "fail":
+        raise ValueError("boom")
+    return AssignmentRunResult(
+        session_id=spec.query,
+        last_run_result=RunResult(
+            run_id="run",
+            result_type=RunResultType.MESSAGE_RESPONSE,
+            messages=[SessionMessage(role=MessageRole.AGENT, text=spec.query)],
+        ),
+    )
+
+
+def test_run_specs_bounds_concurrency_and_resumes_from_checkpoint(tmp_path):
+    lines = [_line("one"), _line("fail"), b"", _line("three"), _line("four")]
+    checkpoint_path = tmp_path / "run.ckpt"
+    running = {"now": 0, "max": 0}
+
+    async def execute(spec: AssignmentSpec) -> AssignmentRunResult:
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        try:
+            return await _execute(spec)
+        finally:
+            running["now"] -= 1
+
+    output = io.BytesIO()
+    with open(checkpoint_path, "a") as checkpoint:
+        stats = asyncio.run(
+            run_specs(lines[:4], output, 2, checkpoint, execute=execute)
+        )
+
+    records = [orjson.loads(line) for line in output.getvalue().splitlines()]
+    assert running["max"] == 2
+    assert (stats.completed, stats.failed) == (2, 1)
+    assert {r["line"] for r in records} == {1, 2, 4}
+    assert "boom" in next(r["error"] for r in records if r["line"] == 2)
+
+    done = read_checkpoint(checkpoint_path)
+    first_run = len(output.getvalue().splitlines())
+
+    async def execute_again(spec: AssignmentSpec) -> AssignmentRunResult:
+        # the failed line succeeds when it runs again
+        if spec.query == "fail":
+            spec = spec.model_copy(update={"query": "two"})
+        return await _execute(spec)
+
+    # resumed runs append to the output of the first
+    stats = asyncio.run(run_specs(lines, output, 2, done=done, execute=execute_again))
+    records = [orjson.loads(line) for line in output.getvalue().splitlines()]
+    # the failed line is not checkpointed and runs again
+    assert stats.skipped == 2
+    assert sorted(r["line"] for r in records[first_run:]) == [2, 5]
+
+    # the last record of a line is its outcome
+    outcomes = {r["line"]: r for r in records}
+    assert sorted(outcomes) == [1, 2, 4, 5]
+    assert all("result" in r for r in outcomes.values())
+    assert outcomes[5]["result"]["lastRunResult"]["messages"][0]["text"] == "four"
+
+
+def test_run_stats_percentiles():
+    stats = RunStats(completed=4, elapsed=2, latencies=[0.4, 0.1, 0.3, 0.2])
+    assert stats.throughput == 2
+    assert (stats.percentile(50), stats.percentile(99)) == (0.2, 0.4)
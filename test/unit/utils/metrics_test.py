@@ -0,0 +1,134 @@
+import asyncio
+
+import httpx
+import orjson
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.class_registry import sync_tool_executor
+from bluemarz.core.interfaces import SyncToolExecutor
+from bluemarz.core.models import AgentSpec, AssignmentSpec, ToolCall, ToolCallResult, ToolSpec
+from bluemarz.lib.openai.chat import InMemoryChatSessionStore, set_chat_session_store
+from bluemarz.utils import http_client, metrics
+
+
+@sync_tool_executor
+class MetricsTestLookup(SyncToolExecutor):
+    calls = 0
+
+    @classmethod
+    def tool_name(cls) -> str:
+        return "metrics_test_lookup"
+
+    @classmethod
+    def execute_call(cls, tool_call: ToolCall) -> ToolCallResult:
+        cls.calls += 1
+        if cls.calls == 1:
+            raise ValueError("lookup failed")
+        return ToolCallResult(tool_call=tool_call, text="found")
+
+
+def test_text_exposition_of_counters_gauges_and_histograms():
+    registry = metrics.MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ["path"])
+    requests.inc(path='/a"b')
+    requests.inc(2, path='/a"b')
+    registry.gauge("in_flight", "In flight").inc()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    latency.observe(0.1)
+    latency.observe(0.5)
+    latency.observe(3)
+
+    assert registry.counter("requests_total", "Requests", ["path"]) is requests
+    assert metrics.generate_latest(registry) == (
+        "# HELP requests_total Requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{path="/a\\"b"} 3\n'
+        "# HELP in_flight In flight\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 1\n"
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1"} 2\n'
+        'latency_seconds_bucket{le="+Inf"} 3\n'
+        "latency_seconds_sum 3.6\n"
+        "latency_seconds_count 3\n"
+    )
+    assert (
+        metrics.endpoint_label("/v1/threads/thread_abc123XYZ789/runs/run_0123456789")
+        == "/v1/threads/{id}/runs/{id}"
+    )
+    assert (
+        metrics.endpoint_label("/v1/threads/runs"),
+        metrics.endpoint_label("/v1/threads/t/runs/r/submit_tool_outputs"),
+        metrics.endpoint_label("/v1/threads/x/submit_tool_outputs"),
+        metrics.endpoint_label("/v1/unknown/route"),
+    ) == (
+        "/v1/threads/runs",
+        "/v1/threads/{id}/runs/{id}/submit_tool_outputs",
+        metrics.OTHER_ENDPOINT,
+        metrics.OTHER_ENDPOINT,
+    )
+
+
+def test_assignment_run_records_requests_tools_and_results(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        messages = orjson.loads(request.content)["messages"]
+        if messages[-1]["role"] == "tool":
+            delta = {"content": "found it"}
+        else:
+            delta = {"tool_calls": [{"index": 0, "id": f"call_{len(messages)}",
+                "function": {"name": "metrics_test_lookup", "arguments": "{}"}}]}
+        chunk = {"id": f"c{len(messages)}", "model": "m", "choices": [{"delta": delta}]}
+        return httpx.Response(
+            200, content=b"data: " + orjson.dumps(chunk) + b"\n\ndata: [DONE]\n\n"
+        )
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    set_chat_session_store(InMemoryChatSessionStore())
+    registry = metrics.get_metrics_registry()
+    requests = registry.get("bluemarz_http_requests_total")
+    tool_errors = registry.get("bluemarz_tool_call_errors_total")
+    tool_duration = registry.get("bluemarz_tool_call_duration_seconds")
+    assignments = registry.get("bluemarz_assignments_total")
+    labels = {"method": "POST", "endpoint": "/v1/chat/completions", "status": "200"}
+    before = (
+        requests.get(**labels),
+        tool_errors.get(tool="metrics_test_lookup"),
+        assignments.get(result="pending"),
+        assignments.get(result="completed"),
+    )
+    spec = AssignmentSpec(
+        agent=AgentSpec(
+            id="measured", api_key="key", type="OpenAiChatAgent",
+            session_type="OpenAiChatSession", model="m",
+            tools=[ToolSpec(tool_type="sync", name="metrics_test_lookup", description="l")],
+        ),
+        query="Look it up",
+    )
+
+    async def scenario():
+        # the first tool call fails and leaves its call pending, the second completes
+        for _ in range(2):
+            assignment = await Assignment.from_spec(spec)
+            await assignment.run_until_breakpoint()
+
+    asyncio.run(scenario())
+
+    after = (
+        requests.get(**labels),
+        tool_errors.get(tool="metrics_test_lookup"),
+        assignments.get(result="pending"),
+        assignments.get(result="completed"),
+    )
+    assert [a - b for a, b in zip(after, before)] == [3, 1, 1, 1]
+    assert tool_duration.get_count(tool="metrics_test_lookup") == 2
+    assert registry.get("bluemarz_assignments_in_flight").get() == 0
+
+    text = metrics.generate_latest()
+    assert 'bluemarz_http_requests_total{method="POST",endpoint="/v1/chat/completions",status="200"}' in text
+    assert "# TYPE bluemarz_assignment_build_seconds histogram" in text
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+import httpx
+import orjson
+
+from bluemarz.core.assignments import Assignment
+from bluemarz.core.class_registry import sync_tool_executor
+from bluemarz.core.interfaces import SyncToolExecutor
+from bluemarz.core.models import AgentSpec, AssignmentSpec, ToolCall, ToolCallResult, ToolSpec
+from bluemarz.lib.openai.chat import InMemoryChatSessionStore, set_chat_session_store
+from bluemarz.utils import http_client, tracing
+
+
+@sync_tool_executor
+class TracingTestLookup(SyncToolExecutor):
+    @classmethod
+    def tool_name(cls) -> str:
+        return "tracing_test_lookup"
+
+    @classmethod
+    def execute_call(cls, tool_call: ToolCall) -> ToolCallResult:
+        return ToolCallResult(tool_call=tool_call, text="found")
+
+
+class CapturingOtlpExporter(tracing.OtlpSpanExporter):
+    def __init__(self):
+        super().__init__("test")
+        self.payloads: list[dict] = []
+
+    def send(self, payload: dict) -> None:
+        self.payloads.append(payload)
+
+
+def test_assignment_spans_nest_and_carry_attributes(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        messages = orjson.loads(request.content)["messages"]
+        if messages[-1]["role"] == "tool":
+            delta = {"content": "found it"}
+        else:
+            delta = {"tool_calls": [{"index": 0, "id": "call_1", "function": {
+                "name": "tracing_test_lookup", "arguments": "{}"}}]}
+        chunk = {"id": f"c{len(messages)}", "model": "m", "choices": [{"delta": delta}]}
+        return httpx.Response(
+            200, content=b"data: " + orjson.dumps(chunk) + b"\n\ndata: [DONE]\n\n"
+        )
+
+    monkeypatch.setattr(
+        http_client,
+        "_async_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    set_chat_session_store(InMemoryChatSessionStore())
+    exporter = tracing.InMemorySpanExporter()
+    tracing.set_span_exporter(exporter)
+    spec = AssignmentSpec(
+        agent=AgentSpec(
+            id="traced", api_key="key", type="OpenAiChatAgent",
+            session_type="OpenAiChatSession", model="m",
+            tools=[ToolSpec(tool_type="sync", name="tracing_test_lookup", description="l")],
+        ),
+        query="Look it up",
+    )
+
+    async def scenario():
+        assignment = await Assignment.from_spec(spec)
+        return await assignment.run_until_breakpoint()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        tracing.set_span_exporter(None)
+
+    build = exporter.get_finished_spans("assignment.build")[0]
+    assert build.attributes["agent.id"] == "traced" and build.parent_id is None
+
+    run = exporter.get_finished_spans("assignment.run")[0]
+    assert run.attributes["run.id"] == "c3" and run.duration > 0
+
+    run_onces = exporter.get_finished_spans("assignment.run_once")
+    assert [s.attributes["run.id"] for s in run_onces] == ["c1", "c3"]
+    assert all(s.parent_id == run.span_id and s.trace_id == run.trace_id for s in run_onces)
+
+    requests = exporter.get_finished_spans("http.request")
+    assert {r.parent_id for r in requests} == {s.span_id for s in run_onces}
+    assert requests[0].attributes["http.status_code"] == 200
+    assert requests[0].attributes["http.path"] == "/v1/chat/completions"
+
+    tool = exporter.get_finished_spans("tool.call")[0]
+    assert tool.parent_id == run.span_id
+    assert tool.attributes["tool.name"] == "tracing_test_lookup"
+
+
+def test_spans_are_not_recorded_without_exporter_and_export_as_otlp():
+    with tracing.span("off", key="value") as span:
+        assert not span.is_recording and span.attributes == {}
+
+    exporter = CapturingOtlpExporter()
+    tracing.set_span_exporter(exporter)
+    try:
+        with tracing.span("parent", **{"agent.id": "a"}):
+            try:
+                with tracing.span("child", attempt=2):
+                    raise ValueError("boom")
+            except ValueError:
+                pass
+    finally:
+        tracing.set_span_exporter(None)
+
+    child = exporter.payloads[0]["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    parent = exporter.payloads[1]["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert child["parentSpanId"] == parent["spanId"]
+    assert child["traceId"] == parent["traceId"] and len(child["traceId"]) == 32
+    assert child["status"] == {"code": 2, "message": "ValueError: boom"}
+    assert child["attributes"] == [{"key": "attempt", "value": {"intValue": "2"}}]
+    assert parent["attributes"] == [{"key": "agent.id", "value": {"stringValue": "a"}}]
+
+
+def test_http_exporter_shutdown_does_not_block_on_a_full_queue():
+    sending = threading.Event()
+    release = threading.Event()
+    sent: list[str] = []
+
+    class BlockingExporter(tracing.OtlpHttpSpanExporter):
+        def send(self, payload: dict) -> None:
+            sending.set()
+            release.wait()
+            sent.extend(
+                s["name"] for s in payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+            )
+
+    exporter = BlockingExporter("http://collector", max_batch_size=1, max_queue_size=1)
+    exporter.export([tracing.Span("first")])
+    assert sending.wait(1)
+    # fills the queue, the third span is dropped
+    exporter.export([tracing.Span("second"), tracing.Span("third")])
+
+    exporter.shutdown(timeout=0.05)
+    assert exporter._thread.is_alive()
+    exporter.export([tracing.Span("late")])
+
+    release.set()
+    exporter._thread.join(1)
+    assert not exporter._thread.is_alive()
+    assert sent == ["first", "second"]